@@ -3,178 +3,226 @@ Flask Web Application - HFMD Diagnosis System
 Hệ thống chẩn đoán bệnh Tay-Chân-Miệng với 2 giai đoạn
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, current_app, g, render_template, request, jsonify, stream_with_context
 from flask_cors import CORS
+from functools import wraps
+from typing import Callable, Optional
 import sys
 import os
-import json
+import time
 
 # Thêm backend vào path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
 
-from simple_inference import SimpleInferenceEngine
+import api_views
+from api_views import ViewResult
+from data_store import JsonPayload
+from engine_registry import EngineRegistry, get_default_registry
+from request_latency import LatencyMiddleware, LatencyTracker, install_dump_signal
+from ndjson_stream import grade_rows, iter_ndjson
 
 # Get base directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
 
-app = Flask(__name__, 
-            template_folder=os.path.join(BASE_DIR, 'templates'),
-            static_folder=os.path.join(BASE_DIR, 'static'))
-CORS(app)
+# Số bệnh nhân giả lập gửi qua HTTP khi warm-up (mỗi route)
+HTTP_WARMUP_CASES = 8
 
-# Khởi tạo 2 inference engines
-diagnosis_engine = SimpleInferenceEngine(os.path.join(BASE_DIR, 'data', 'diagnosis_rules.json'))
-classification_engine = SimpleInferenceEngine(os.path.join(BASE_DIR, 'data', 'classification_level_rules.json'))
 
-@app.route('/')
-def index():
-    """Trang chủ"""
-    return render_template('index.html')
-
-@app.route('/api/diagnose', methods=['POST'])
-def diagnose():
+def create_app(registry: Optional[EngineRegistry] = None, warm_up: Optional[bool] = None,
+               latency: Optional[bool] = None) -> Flask:
     """
-    API endpoint giai đoạn 1: Chẩn đoán lâm sàng
-    Kiểm tra bệnh nhân có HFMD không
+    App factory
+    
+    Args:
+        registry: Engines và dữ liệu dùng chung (None: registry mặc định của process)
+        warm_up: Chạy chẩn đoán giả lập trước khi sẵn sàng
+                 (None: theo biến môi trường HFMD_WARMUP, mặc định bật)
+        latency: Bọc app bằng LatencyMiddleware (p50/p90/p99 theo route tại
+                 /api/admin/latency, dump ra file khi nhận SIGUSR1)
+                 (None: theo biến môi trường HFMD_LATENCY, mặc định bật)
+    
+    Returns:
+        Flask app; /readyz trả 200 khi warm-up xong
     """
-    try:
-        data = request.json
-        
-        if not data:
-            return jsonify({
-                'success': False,
-                'error': 'Không có dữ liệu đầu vào'
-            }), 400
-        
-        # Chẩn đoán bằng diagnosis engine
-        result = diagnosis_engine.diagnose(data)
-        
-        return jsonify(result)
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    if registry is None:
+        registry = get_default_registry(DATA_DIR)
+    if warm_up is None:
+        warm_up = os.environ.get('HFMD_WARMUP', '1') != '0'
+    if latency is None:
+        latency = os.environ.get('HFMD_LATENCY', '1') != '0'
+    
+    app = Flask(__name__, 
+                template_folder=os.path.join(BASE_DIR, 'templates'),
+                static_folder=os.path.join(BASE_DIR, 'static'))
+    CORS(app)
+    app.extensions['hfmd_registry'] = registry
+    
+    for rule, view, methods in ROUTES:
+        app.add_url_rule(rule, view_func=view, methods=methods)
+    
+    # Đo thời gian theo route chỉ khi bật metrics (tắt: không có hook nào)
+    if registry.metrics is not None:
+        app.before_request(_start_timer)
+        app.after_request(_observe_request)
+    if latency:
+        app.before_request(_record_url_rule)
+    
+    if warm_up:
+        registry.warm_up(extra=lambda cases: _warm_up_http(app, cases))
+    elif not registry.ready:
+        registry.skip_warm_up()
+    
+    # Bọc sau warm-up để số liệu chỉ gồm traffic thật
+    if latency:
+        tracker = LatencyTracker()
+        app.extensions['hfmd_latency'] = tracker
+        app.wsgi_app = LatencyMiddleware(app.wsgi_app, tracker, _url_rule_of)
+        install_dump_signal(tracker)  # Gunicorn worker: cài lại trong post_worker_init
+    
+    return app
 
-@app.route('/api/classify', methods=['POST'])
-def classify():
-    """
-    API endpoint giai đoạn 2: Phân độ bệnh
-    Chỉ chạy khi has_hfmd = TRUE
-    """
-    try:
-        data = request.json
-        
-        if not data:
-            return jsonify({
-                'success': False,
-                'error': 'Không có dữ liệu đầu vào'
-            }), 400
-        
-        # Phân độ bằng classification engine
-        result = classification_engine.diagnose(data)
-        
-        return jsonify(result)
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
 
-@app.route('/api/diagnosis-questions', methods=['GET'])
-def get_diagnosis_questions():
+def _warm_up_http(app: Flask, cases):
+    """Gửi vài request giả lập qua toàn bộ stack Flask (routing, JSON, response)"""
+    client = app.test_client()
+    for case in cases[:HTTP_WARMUP_CASES]:
+        client.post('/api/diagnose', json=case)
+        client.post('/api/classify', json=case)
+    client.post('/api/classify/batch', json=cases[:HTTP_WARMUP_CASES])
+    client.get('/api/diagnosis-questions')
+    client.post('/api/treatment', json={'disease_level': '1'})
+
+
+def _start_timer():
+    g.hfmd_request_start = time.perf_counter()
+
+
+def _observe_request(response):
     """
-    API lấy danh sách câu hỏi chẩn đoán
+    Ghi thời gian xử lý request theo route (mẫu URL, không phải URL thật)
+    Với response streaming đây là thời gian tới byte đầu tiên.
     """
-    try:
-        with open(os.path.join(BASE_DIR, 'data', 'diagnosis_rules.json'), 'r', encoding='utf-8') as f:
-            rules = json.load(f)
-            
-        questions = rules.get('clinical_questions', {})
-        
-        return jsonify({
-            'success': True,
-            'questions': questions
-        })
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    start = g.pop('hfmd_request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        get_registry().metrics.observe_request(
+            route, request.method, response.status_code, time.perf_counter() - start
+        )
+    return response
+
+
+def _record_url_rule():
+    """Ghi mẫu route đã khớp vào environ để LatencyMiddleware đọc sau khi request kết thúc"""
+    if request.url_rule is not None:
+        request.environ['hfmd.url_rule'] = request.url_rule.rule
+
+
+def _url_rule_of(environ) -> Optional[str]:
+    return environ.get('hfmd.url_rule')
+
 
-@app.route('/api/treatment', methods=['POST'])
-def get_treatment():
+def get_registry() -> EngineRegistry:
+    """Registry của app đang xử lý request"""
+    return current_app.extensions['hfmd_registry']
+
+def payload_response(payload: JsonPayload):
     """
-    API endpoint: Lấy gợi ý điều trị theo độ bệnh
+    Trả response JSON đã encode sẵn
+    
+    - 304 Not Modified nếu client gửi If-None-Match trùng ETag
+    - Bản gzip dựng sẵn nếu client chấp nhận gzip
     """
-    try:
-        data = request.json
-        
-        if not data:
-            return jsonify({
-                'success': False,
-                'error': 'Không có dữ liệu đầu vào'
-            }), 400
-        
-        disease_level = data.get('disease_level')
-        
-        if not disease_level:
-            return jsonify({
-                'success': False,
-                'error': 'Thiếu thông tin độ bệnh'
-            }), 400
-        
-        # Đọc file treatment.json
-        with open(os.path.join(BASE_DIR, 'data', 'treatment.json'), 'r', encoding='utf-8') as f:
-            treatment_data = json.load(f)
-        
-        # Tìm treatment rule theo disease_level
-        treatment_rule = None
-        for rule in treatment_data.get('treatment_rules', []):
-            if rule.get('disease_level') == disease_level:
-                treatment_rule = rule
-                break
-        
-        if not treatment_rule:
-            return jsonify({
-                'success': False,
-                'error': f'Không tìm thấy phác đồ điều trị cho độ {disease_level}'
-            }), 404
-        
-        return jsonify({
-            'success': True,
-            'treatment': treatment_rule
-        })
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    use_gzip = payload.gzip_body is not None and 'gzip' in request.accept_encodings
+    etag = f"{payload.etag}-gzip" if use_gzip else payload.etag
+    
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(
+            payload.gzip_body if use_gzip else payload.body,
+            mimetype='application/json'
+        )
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'  # Luôn hỏi lại server, nhận 304 nếu không đổi
+    if payload.gzip_body is not None:
+        response.vary.add('Accept-Encoding')
+    return response
+
+def to_response(result: ViewResult):
+    """Chuyển kết quả của api_views thành response Flask"""
+    if isinstance(result.body, JsonPayload):
+        return payload_response(result.body)
+    if isinstance(result.body, str):
+        response = current_app.response_class(result.body, status=result.status,
+                                              content_type=result.content_type)
+    else:
+        response = jsonify(result.body)
+        response.status_code = result.status
+    if result.conditional:
+        response.add_etag()
+    if result.cache_control:
+        response.headers['Cache-Control'] = result.cache_control
+    return response.make_conditional(request) if result.conditional else response
+
+def flask_view(view: Callable) -> Callable:
+    """View Flask cho một view của api_views (giữ tên endpoint)"""
+    @wraps(view)
+    def handle():
+        return to_response(view(get_registry(), request))
+    return handle
+
+def index():
+    """Trang chủ"""
+    return render_template('index.html')
 
-@app.route('/api/stats', methods=['GET'])
-def get_stats():
+def grade_stream():
     """
-    API lấy thống kê knowledge base
+    API endpoint chấm hàng loạt dạng NDJSON theo luồng (gateway monitor đầu giường)
+    Body: mỗi dòng một bệnh nhân; trả về mỗi dòng một kết quả (chẩn đoán, rồi phân độ
+    nếu has_hfmd) ngay khi chấm xong, trong lúc client vẫn đang gửi body
+    
+    Query: summary=1 chỉ trả kết luận; id_field=<field> chép định danh bệnh nhân sang kết quả
     """
-    try:
-        diag_stats = diagnosis_engine.get_stats()
-        class_stats = classification_engine.get_stats()
-        
-        return jsonify({
-            'success': True,
-            'stats': {
-                'diagnosis': diag_stats,
-                'classification': class_stats
-            }
-        })
-    except Exception as e:
+    lines = grade_rows(
+        get_registry().grade,
+        iter_ndjson(request.stream.readline),
+        id_field=request.args.get('id_field'),
+        summary=request.args.get('summary') == '1'
+    )
+    response = current_app.response_class(stream_with_context(lines), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'  # Không để reverse proxy gom response
+    return response
+
+def get_latency():
+    """p50/p90/p99 của wall time, CPU time và kích thước response theo route (1m/5m/15m)"""
+    tracker = current_app.extensions.get('hfmd_latency')
+    if tracker is None:
         return jsonify({
             'success': False,
-            'error': str(e)
-        }), 500
+            'error': 'Đo latency đang tắt (HFMD_LATENCY=0)'
+        }), 404
+    response = jsonify({'success': True, 'latency': tracker.snapshot()})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+# Bảng routes (đăng ký trong create_app): routes API chung trong api_views.API_ROUTES
+ROUTES = [
+    ('/', index, ['GET']),
+    ('/api/grade/stream', grade_stream, ['POST']),
+    ('/api/admin/latency', get_latency, ['GET']),
+] + [(rule, flask_view(view), methods) for rule, view, methods in api_views.API_ROUTES]
+
+# App mặc định (python app.py, gunicorn app:app); production: xem gunicorn.conf.py
+app = create_app()
+registry = app.extensions['hfmd_registry']
+diagnosis_engine = registry.diagnosis_engine
+classification_engine = registry.classification_engine
+data_store = registry.data_store
 
 if __name__ == '__main__':
     print("=" * 60)
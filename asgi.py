@@ -0,0 +1,379 @@
+"""
+ASGI Application - HFMD Diagnosis System (bản async)
+Phục vụ các API chẩn đoán trên event loop: client chậm (upload form qua Wi-Fi yếu)
+chỉ giữ một coroutine chờ body, không giữ worker thread
+
+    pip install -r requirements-asgi.txt
+    uvicorn asgi:app --workers 2
+
+Dùng chung engines/DataStore (get_default_registry) và các view (api_views) với app.py,
+file này chỉ lo phần giao thức ASGI nên JSON trả về giống hệt bản Flask. Giao diện web ('/') vẫn do WSGI app (app.py) phục vụ.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from urllib.parse import parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from werkzeug.exceptions import BadRequest, UnsupportedMediaType
+from werkzeug.http import generate_etag, parse_accept_header, parse_etags, quote_etag
+
+# Thêm backend vào path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import api_views
+from api_views import ViewResult
+from data_store import JsonPayload, dumps_json
+from engine_registry import EngineRegistry, get_default_registry
+from ndjson_stream import NDJSONDecoder, grade_row
+
+# Get base directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+
+# Giới hạn kích thước body của một request (byte)
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+CORS_ALLOW_METHODS = 'DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT'
+
+Headers = List[Tuple[bytes, bytes]]
+Response = Tuple[int, bytes, Headers]
+
+
+# ============================================================================
+# REQUEST / RESPONSE
+# ============================================================================
+
+class ASGIRequest:
+    """Request HTTP đã đọc đủ body"""
+
+    __slots__ = ('method', 'path', 'args', 'headers', 'body')
+
+    def __init__(self, scope: Dict, body: bytes):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+        self.headers = {}
+        for name, value in scope['headers']:
+            key = name.decode('latin-1').lower()
+            value = value.decode('latin-1')
+            self.headers[key] = f"{self.headers[key]}, {value}" if key in self.headers else value
+        self.body = body
+
+    def header(self, name: str, default: str = '') -> str:
+        return self.headers.get(name, default)
+
+    @property
+    def json(self):
+        """Body dạng JSON, lỗi giống request.json của Flask"""
+        mimetype = self.header('content-type').split(';', 1)[0].strip().lower()
+        if not (mimetype == 'application/json'
+                or (mimetype.startswith('application/') and mimetype.endswith('+json'))):
+            raise UnsupportedMediaType(
+                "Did not attempt to load JSON data because the request"
+                " Content-Type was not 'application/json'."
+            )
+        try:
+            return json.loads(self.body)
+        except ValueError as e:
+            raise BadRequest() from e
+
+    def accepts_gzip(self) -> bool:
+        return 'gzip' in parse_accept_header(self.header('accept-encoding') or None)
+
+    def if_none_match(self, etag: str) -> bool:
+        return parse_etags(self.header('if-none-match') or None).contains(etag)
+
+
+def json_response(obj, status: int = 200) -> Response:
+    """Response JSON (cùng cách encode với jsonify của Flask)"""
+    return status, dumps_json(obj), [(b'content-type', b'application/json')]
+
+
+def payload_response(request: ASGIRequest, payload: JsonPayload) -> Response:
+    """
+    Trả response JSON đã encode sẵn (như payload_response của app.py)
+
+    - 304 Not Modified nếu client gửi If-None-Match trùng ETag
+    - Bản gzip dựng sẵn nếu client chấp nhận gzip
+    """
+    use_gzip = payload.gzip_body is not None and request.accepts_gzip()
+    etag = f"{payload.etag}-gzip" if use_gzip else payload.etag
+
+    headers = [(b'etag', quote_etag(etag).encode('latin-1')), (b'cache-control', b'no-cache')]
+    if payload.gzip_body is not None:
+        headers.append((b'vary', b'Accept-Encoding'))
+
+    if request.if_none_match(etag):
+        return 304, b'', headers
+
+    headers.insert(0, (b'content-type', b'application/json'))
+    if use_gzip:
+        headers.append((b'content-encoding', b'gzip'))
+    return 200, payload.gzip_body if use_gzip else payload.body, headers
+
+
+def error_response(error: str, status: int) -> Response:
+    return json_response({'success': False, 'error': error}, status)
+
+
+def to_response(request: ASGIRequest, result: ViewResult) -> Response:
+    """Chuyển kết quả của api_views thành response ASGI (như to_response của app.py)"""
+    if isinstance(result.body, JsonPayload):
+        return payload_response(request, result.body)
+    if isinstance(result.body, str):
+        status, body, headers = (result.status, result.body.encode('utf-8'),
+                                 [(b'content-type', result.content_type.encode('latin-1'))])
+    else:
+        status, body, headers = json_response(result.body, result.status)
+    if result.conditional:
+        etag = generate_etag(body)
+        headers.append((b'etag', quote_etag(etag).encode('latin-1')))
+    if result.cache_control:
+        headers.append((b'cache-control', result.cache_control.encode('latin-1')))
+    if result.conditional and request.if_none_match(etag):
+        return 304, b'', headers[1:]
+    return status, body, headers
+
+
+# ============================================================================
+# ASGI APP
+# ============================================================================
+
+class DiagnosisASGIApp:
+    """
+    ASGI app cho các API chẩn đoán
+
+    Chẩn đoán một bệnh nhân chỉ tốn vài chục µs nên chạy thẳng trên event loop;
+    phân độ hàng loạt chạy trong thread pool để không chặn các kết nối khác.
+    """
+
+    def __init__(self, registry: EngineRegistry, warm_up: bool = True,
+                 executor: Optional[ThreadPoolExecutor] = None,
+                 max_body_size: int = MAX_BODY_SIZE):
+        """
+        Args:
+            registry: Engines và dữ liệu dùng chung
+            warm_up: Warm-up khi server khởi động (lifespan startup)
+            executor: Thread pool cho việc nặng CPU (None: tạo mới theo HFMD_ASGI_THREADS)
+            max_body_size: Kích thước body tối đa (byte), vượt quá trả 413
+        """
+        self.registry = registry
+        self.warm_up = warm_up
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=int(os.environ.get('HFMD_ASGI_THREADS', 4)),
+            thread_name_prefix='hfmd-asgi'
+        )
+        self.max_body_size = max_body_size
+        # Routes chung (api_views.API_ROUTES); GET kèm HEAD như Flask
+        self.routes: Dict[str, Tuple[Tuple[str, ...], Callable]] = {
+            rule: (tuple(methods) + (('HEAD',) if 'GET' in methods else ()), view)
+            for rule, view, methods in api_views.API_ROUTES
+        }
+        self.routes['/api/grade/stream'] = (('POST',), self.grade_stream)
+        # Routes tự đọc body và gửi response theo luồng: handler(request, receive, send)
+        self.streaming_routes = {'/api/grade/stream'}
+        # Views nặng CPU chạy trong thread pool để không chặn các kết nối khác
+        self.blocking_views = {api_views.classify_batch}
+
+    async def __call__(self, scope: Dict, receive: Callable, send: Callable):
+        if scope['type'] == 'http':
+            await self.handle_http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self.handle_lifespan(receive, send)
+
+    async def run_in_executor(self, func: Callable, *args):
+        """Chạy việc nặng CPU trong thread pool"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    # ------------------------------------------------------------------------
+    # Lifespan
+    # ------------------------------------------------------------------------
+
+    async def handle_lifespan(self, receive: Callable, send: Callable):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if self.warm_up:
+                    await self.run_in_executor(self.registry.warm_up)
+                elif not self.registry.ready:
+                    self.registry.skip_warm_up()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # ------------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------------
+
+    async def read_body(self, receive: Callable) -> Optional[bytes]:
+        """
+        Đọc body theo từng chunk (await giữa các chunk, không chặn thread)
+
+        Returns:
+            Body, None nếu client ngắt kết nối
+
+        Raises:
+            OverflowError: body vượt quá max_body_size
+        """
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > self.max_body_size:
+                raise OverflowError(size)
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    async def handle_http(self, scope: Dict, receive: Callable, send: Callable):
+        metrics = self.registry.metrics
+        if metrics is None:
+            await self.dispatch(scope, receive, send)
+            return
+
+        # Thời gian theo route (route streaming: tới khi gửi xong byte cuối)
+        start = time.perf_counter()
+        status = await self.dispatch(scope, receive, send)
+        if status is not None:
+            path = scope['path']
+            metrics.observe_request(path if path in self.routes else '<unmatched>',
+                                    scope['method'], status, time.perf_counter() - start)
+
+    async def dispatch(self, scope: Dict, receive: Callable, send: Callable) -> Optional[int]:
+        """Xử lý một request HTTP, trả về status (None nếu client đã ngắt kết nối)"""
+        request = ASGIRequest(scope, b'')
+        route = self.routes.get(request.path)
+
+        if route is None:
+            response = error_response('Not Found', 404)
+        elif request.method == 'OPTIONS':
+            response = self.preflight(request, route[0])
+        elif request.method not in route[0]:
+            response = error_response('Method Not Allowed', 405)
+        elif request.path in self.streaming_routes:
+            return await route[1](request, receive, send)
+        else:
+            try:
+                request.body = await self.read_body(receive)
+            except OverflowError:
+                response = error_response('Request body quá lớn', 413)
+            else:
+                if request.body is None:
+                    return None  # Client đã ngắt kết nối
+                response = to_response(request, await self.call_view(route[1], request))
+
+        status, body, headers = response
+        headers = headers + self.cors_headers(request)
+        if status != 304:
+            headers.append((b'content-length', str(len(body)).encode('latin-1')))
+        if request.method == 'HEAD':
+            body = b''
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+        return status
+
+    def cors_headers(self, request: ASGIRequest) -> Headers:
+        """CORS như Flask-CORS mặc định: cho phép mọi origin"""
+        origin = request.header('origin')
+        if not origin:
+            return [(b'access-control-allow-origin', b'*')]
+        return [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'Origin')]
+
+    def preflight(self, request: ASGIRequest, methods: Tuple[str, ...]) -> Response:
+        headers = [(b'allow', ', '.join(sorted(set(methods) | {'OPTIONS'})).encode('latin-1'))]
+        if request.header('access-control-request-method'):
+            headers.append((b'access-control-allow-methods', CORS_ALLOW_METHODS.encode('latin-1')))
+            requested = request.header('access-control-request-headers')
+            if requested:
+                headers.append((b'access-control-allow-headers', requested.encode('latin-1')))
+        return 200, b'', headers
+
+    # ------------------------------------------------------------------------
+    # Views
+    # ------------------------------------------------------------------------
+
+    async def call_view(self, view: Callable, request: ASGIRequest) -> ViewResult:
+        """Chạy view của api_views (chẩn đoán một bệnh nhân: thẳng trên event loop)"""
+        if view in self.blocking_views:
+            return await self.run_in_executor(view, self.registry, request)
+        return view(self.registry, request)
+
+    async def grade_stream(self, request: ASGIRequest, receive: Callable,
+                           send: Callable) -> Optional[int]:
+        """
+        Chấm hàng loạt NDJSON theo luồng: mỗi chunk body nhận được được parse
+        và chấm ngay (trong thread pool), kết quả gửi về trước khi client gửi xong body
+        """
+        id_field = request.args.get('id_field')
+        summary = request.args.get('summary') == '1'
+        headers = [
+            (b'content-type', b'application/x-ndjson'),
+            (b'cache-control', b'no-store'),
+            (b'x-accel-buffering', b'no'),
+        ] + self.cors_headers(request)
+
+        def grade_chunk(rows):
+            return b''.join(grade_row(self.registry.grade, row, id_field, summary) for row in rows)
+
+        decoder = NDJSONDecoder()
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            more_body = message.get('more_body', False)
+            rows = decoder.feed(message.get('body', b''))
+            if not more_body:
+                rows += decoder.close()
+            if rows:
+                body = await self.run_in_executor(grade_chunk, rows)
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+            if not more_body:
+                break
+        await send({'type': 'http.response.body', 'body': b''})
+        return 200
+
+
+def create_asgi_app(registry: Optional[EngineRegistry] = None,
+                    warm_up: Optional[bool] = None) -> DiagnosisASGIApp:
+    """
+    Tạo ASGI app
+
+    Args:
+        registry: Engines và dữ liệu dùng chung (None: registry mặc định của process,
+                  cùng bộ engines với app.py nếu chạy chung process)
+        warm_up: Warm-up khi server khởi động (None: theo HFMD_WARMUP, mặc định bật)
+    """
+    if registry is None:
+        registry = get_default_registry(DATA_DIR)
+    if warm_up is None:
+        warm_up = os.environ.get('HFMD_WARMUP', '1') != '0'
+    return DiagnosisASGIApp(
+        registry,
+        warm_up=warm_up,
+        max_body_size=int(os.environ.get('HFMD_MAX_BODY_SIZE', MAX_BODY_SIZE))
+    )
+
+
+# App mặc định (uvicorn asgi:app)
+app = create_asgi_app()
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("Cần ASGI server để chạy asgi.py: pip install -r requirements-asgi.txt")
+
+    uvicorn.run('asgi:app', host='0.0.0.0', port=int(os.environ.get('HFMD_ASGI_PORT', 5001)))
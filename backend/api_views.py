@@ -0,0 +1,176 @@
+"""
+API Views - Phần xử lý API dùng chung cho app.py (Flask) và asgi.py (ASGI)
+
+Mỗi view nhận registry và request (chỉ dùng thuộc tính .json, có sẵn ở request của
+Flask và ASGIRequest), trả về ViewResult. Hai app chỉ chuyển ViewResult thành
+response của framework, nên JSON, status và thông báo lỗi luôn giống nhau.
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from engine_registry import EngineRegistry
+from metrics import PROMETHEUS_CONTENT_TYPE
+
+
+@dataclass
+class ViewResult:
+    """
+    Kết quả của một view, độc lập với framework
+
+    body là một trong:
+    - JsonPayload: JSON đã encode sẵn, trả kèm ETag/gzip/304
+    - str: trả nguyên văn với content_type
+    - object JSON còn lại: app encode (jsonify / dumps_json)
+    """
+    body: Any
+    status: int = 200
+    content_type: Optional[str] = None
+    cache_control: Optional[str] = None
+    conditional: bool = False  # ETag theo nội dung đã encode, 304 khi If-None-Match trùng
+
+
+def error(message: str, status: int) -> ViewResult:
+    return ViewResult({'success': False, 'error': message}, status)
+
+
+# ============================================================================
+# VIEWS
+# ============================================================================
+
+def diagnose(registry: EngineRegistry, request) -> ViewResult:
+    """
+    API endpoint giai đoạn 1: Chẩn đoán lâm sàng
+    Kiểm tra bệnh nhân có HFMD không
+    """
+    try:
+        data = request.json
+        if not data:
+            return error('Không có dữ liệu đầu vào', 400)
+
+        return ViewResult(registry.diagnosis_engine.diagnose(data))
+    except Exception as e:
+        return error(str(e), 500)
+
+
+def classify(registry: EngineRegistry, request) -> ViewResult:
+    """
+    API endpoint giai đoạn 2: Phân độ bệnh
+    Chỉ chạy khi has_hfmd = TRUE
+    """
+    try:
+        data = request.json
+        if not data:
+            return error('Không có dữ liệu đầu vào', 400)
+
+        return ViewResult(registry.classification_engine.diagnose(data))
+    except Exception as e:
+        return error(str(e), 500)
+
+
+def classify_batch(registry: EngineRegistry, request) -> ViewResult:
+    """
+    API endpoint phân độ hàng loạt (cả khoa một lần)
+    Nhận list bệnh nhân (hoặc {"records": [...]}), trả kết quả theo đúng thứ tự đầu vào
+    """
+    try:
+        data = request.json
+        records = data.get('records') if isinstance(data, dict) else data
+
+        if not records or not isinstance(records, list):
+            return error('Không có dữ liệu đầu vào', 400)
+        if not all(isinstance(record, dict) for record in records):
+            return error('Mỗi bệnh nhân phải là một object', 400)
+
+        # Phân độ vector hóa bằng classification engine
+        results = registry.classification_engine.diagnose_batch(records)
+        return ViewResult({'success': True, 'total': len(results), 'results': results})
+    except Exception as e:
+        return error(str(e), 500)
+
+
+def get_diagnosis_questions(registry: EngineRegistry, request) -> ViewResult:
+    """API lấy danh sách câu hỏi chẩn đoán"""
+    try:
+        return ViewResult(registry.data_store.get_diagnosis_questions())
+    except Exception as e:
+        return error(str(e), 500)
+
+
+def get_treatment(registry: EngineRegistry, request) -> ViewResult:
+    """API endpoint: Lấy gợi ý điều trị theo độ bệnh"""
+    try:
+        data = request.json
+        if not data:
+            return error('Không có dữ liệu đầu vào', 400)
+
+        disease_level = data.get('disease_level')
+        if not disease_level:
+            return error('Thiếu thông tin độ bệnh', 400)
+
+        # Tra response đã encode sẵn theo disease_level
+        payload = registry.data_store.get_treatment_payload(disease_level)
+        if not payload:
+            return error(f'Không tìm thấy phác đồ điều trị cho độ {disease_level}', 404)
+
+        return ViewResult(payload)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+def get_stats(registry: EngineRegistry, request) -> ViewResult:
+    """API lấy thống kê knowledge base"""
+    try:
+        stats = {}
+        for name, engine in registry.engines.items():
+            stats[name] = engine.get_stats()
+            stats[name]['cache'] = engine.get_cache_stats()
+
+        # Có kèm bộ đếm cache nên không encode sẵn; ETag vẫn cho phép 304 khi không đổi
+        return ViewResult({'success': True, 'stats': stats},
+                          cache_control='no-cache', conditional=True)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+def get_metrics(registry: EngineRegistry, request) -> ViewResult:
+    """Metrics dạng Prometheus text: bộ đếm theo rule, thời gian từng phase và route"""
+    if registry.metrics is None:
+        return error('Metrics đang tắt (HFMD_METRICS=0)', 404)
+    return ViewResult(registry.metrics.render_prometheus(),
+                      content_type=PROMETHEUS_CONTENT_TYPE, cache_control='no-store')
+
+
+def healthz(registry: EngineRegistry, request) -> ViewResult:
+    """Liveness probe: process còn phục vụ request"""
+    return ViewResult({
+        'status': 'ok',
+        'pid': os.getpid(),
+        'uptime_s': round(time.time() - registry.started_at, 3)
+    }, cache_control='no-store')
+
+
+def readyz(registry: EngineRegistry, request) -> ViewResult:
+    """
+    Readiness probe: 200 khi rules đã nạp và warm-up xong, 503 nếu chưa
+    Kèm phiên bản (SHA-256) các tập luật để kiểm tra sau deploy
+    """
+    health = registry.health()
+    return ViewResult(health, status=200 if health['ready'] else 503, cache_control='no-store')
+
+
+# Routes chung của hai app: (URL, view, methods). Trang web, NDJSON streaming và
+# /api/admin/latency phụ thuộc framework nên mỗi app tự đăng ký thêm.
+API_ROUTES = [
+    ('/api/diagnose', diagnose, ['POST']),
+    ('/api/classify', classify, ['POST']),
+    ('/api/classify/batch', classify_batch, ['POST']),
+    ('/api/diagnosis-questions', get_diagnosis_questions, ['GET']),
+    ('/api/treatment', get_treatment, ['POST']),
+    ('/api/stats', get_stats, ['GET']),
+    ('/api/metrics', get_metrics, ['GET']),
+    ('/healthz', healthz, ['GET']),
+    ('/readyz', readyz, ['GET']),
+]
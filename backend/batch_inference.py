@@ -0,0 +1,192 @@
+"""
+Batch Inference - Đánh giá rules vector hóa trên nhiều bệnh nhân
+Dùng cho SimpleInferenceEngine.diagnose_batch (phân độ cả khoa một lần)
+
+Quy trình:
+- ColumnarBatch: chuyển danh sách records thành bảng cột NumPy
+  (một cột cho mỗi field mà rules tham chiếu, kèm mask giá trị thiếu)
+- build_vector_predicate: dựng closure từ node đã chuẩn hóa (rule_compiler),
+  mỗi điều kiện đơn là MỘT phép so sánh trên toàn bộ cột
+- BatchPlan: ma trận match [rule x bệnh nhân] cho toàn bộ batch
+"""
+
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from rule_compiler import NUMERIC_OPERATORS, iter_leaves
+
+# Kiểu giá trị so sánh == / != trực tiếp trên cột object
+_SCALAR_TYPES = (bool, int, float, str)
+
+
+# ============================================================================
+# COLUMNAR BATCH - Bảng cột
+# ============================================================================
+
+class ColumnarBatch:
+    """
+    Bảng cột cho một batch bệnh nhân
+
+    - values[field]: cột object giữ nguyên giá trị gốc
+    - present[field]: mask giá trị khác None
+    - numeric(field): cột float64 + mask giá trị ép float được
+    """
+
+    def __init__(self, records: List[Dict], fields):
+        self.size = len(records)
+        self.values = {}
+        self.present = {}
+        self._numeric = {}
+
+        for field in fields:
+            column = np.empty(self.size, dtype=object)
+            column[:] = [record.get(field) for record in records]
+            self.values[field] = column
+            self.present[field] = np.fromiter(
+                (value is not None for value in column), dtype=bool, count=self.size
+            )
+
+    def numeric(self, field: str):
+        """Cột float64 (NaN khi thiếu) và mask các giá trị float() thành công"""
+        cached = self._numeric.get(field)
+        if cached is not None:
+            return cached
+
+        column = self.values[field]
+        present = self.present[field]
+        numbers = np.full(self.size, np.nan)
+        valid = present.copy()
+
+        try:
+            numbers[present] = column[present].astype(np.float64)
+        except (ValueError, TypeError):
+            # Có giá trị không ép được (chuỗi lạ, list...) → ép từng phần tử
+            for i in np.flatnonzero(present):
+                try:
+                    numbers[i] = float(column[i])
+                except (ValueError, TypeError):
+                    valid[i] = False
+
+        self._numeric[field] = (numbers, valid)
+        return numbers, valid
+
+
+# ============================================================================
+# VECTOR PREDICATE - Dựng closure từ node
+# ============================================================================
+
+def build_vector_predicate(node: tuple) -> Callable[[ColumnarBatch, Dict], np.ndarray]:
+    """
+    Dựng closure predicate(batch, memo) -> mảng bool từ node đã chuẩn hóa
+
+    memo lưu kết quả điều kiện đơn trong một batch, nên điều kiện dùng chung
+    giữa nhiều rules (ví dụ startle_per_30min > 0) chỉ được tính một lần.
+    """
+    kind = node[0]
+
+    if kind == 'true':
+        return lambda batch, memo: np.ones(batch.size, dtype=bool)
+    if kind == 'false':
+        return lambda batch, memo: np.zeros(batch.size, dtype=bool)
+    if kind == 'cmp':
+        return _build_vector_leaf(node)
+
+    children = tuple(build_vector_predicate(child) for child in node[1])
+    combine = np.logical_and if kind == 'all' else np.logical_or
+
+    def group(batch, memo):
+        result = children[0](batch, memo)
+        for predicate in children[1:]:
+            result = combine(result, predicate(batch, memo))
+        return result
+    return group
+
+
+def _build_vector_leaf(node: tuple):
+    """Dựng closure cho điều kiện đơn: một phép so sánh trên cả cột"""
+    _, field, op, expected = node
+
+    if op in NUMERIC_OPERATORS:
+        compare = NUMERIC_OPERATORS[op]
+
+        def evaluate(batch):
+            numbers, valid = batch.numeric(field)
+            return valid & compare(numbers, expected)
+    elif op in ('==', '!='):
+        negate = op == '!='
+
+        def evaluate(batch):
+            column = batch.values[field]
+            if isinstance(expected, _SCALAR_TYPES):
+                equal = np.asarray(column == expected, dtype=bool)
+            else:
+                equal = np.fromiter(
+                    (value == expected for value in column), dtype=bool, count=batch.size
+                )
+            return batch.present[field] & (~equal if negate else equal)
+    else:
+        def evaluate(batch):
+            column = batch.values[field]
+            return np.fromiter(
+                (value is not None and value in expected for value in column),
+                dtype=bool, count=batch.size
+            )
+
+    try:
+        hash(node)
+    except TypeError:
+        # Giá trị so sánh không hash được (list/dict trong ==) → không memo
+        return lambda batch, memo: evaluate(batch)
+
+    def leaf(batch, memo):
+        result = memo.get(node)
+        if result is None:
+            result = evaluate(batch)
+            memo[node] = result
+        return result
+    return leaf
+
+
+# ============================================================================
+# BATCH PLAN - Kế hoạch đánh giá cho một rule set
+# ============================================================================
+
+class BatchPlan:
+    """Các vector predicates đã biên dịch cho toàn bộ rules của một engine"""
+
+    def __init__(self, compiled_rules):
+        self.compiled_rules = compiled_rules
+        self.fields = sorted({
+            leaf[1] for compiled in compiled_rules for leaf in iter_leaves(compiled.node)
+        })
+        self.predicates = [build_vector_predicate(compiled.node) for compiled in compiled_rules]
+
+    def match_matrix(self, records: List[Dict]) -> np.ndarray:
+        """
+        Ma trận match kích thước (số rules, số records)
+
+        matrix[i, j] = True nếu rule thứ i match record thứ j
+        """
+        batch = ColumnarBatch(records, self.fields)
+        matrix = np.zeros((len(self.predicates), batch.size), dtype=bool)
+        memo = {}
+        with np.errstate(invalid='ignore'):
+            for i, predicate in enumerate(self.predicates):
+                matrix[i] = predicate(batch, memo)
+        return matrix
+
+    def matched_rules(self, records: List[Dict]) -> List[List[Dict]]:
+        """Danh sách rule dicts đã match cho từng record, theo thứ tự file rules"""
+        if not records:
+            return []
+
+        matrix = self.match_matrix(records)
+        rules = [compiled.rule for compiled in self.compiled_rules]
+        per_record = [[] for _ in records]
+
+        # nonzero trên ma trận chuyển vị: duyệt theo record, rồi theo thứ tự rule
+        record_indexes, rule_indexes = np.nonzero(matrix.T)
+        for j, i in zip(record_indexes.tolist(), rule_indexes.tolist()):
+            per_record[j].append(rules[i])
+        return per_record
@@ -0,0 +1,420 @@
+"""
+Bulk Grading - Chấm lại hàng loạt hồ sơ bệnh nhân (JSONL/CSV) từ dòng lệnh
+Đọc và ghi theo luồng (generator) nên bộ nhớ không phụ thuộc kích thước file
+
+Quy trình cho mỗi record:
+- Giai đoạn 1: diagnosis_engine (có TCM không)
+- Giai đoạn 2: classification_engine, chỉ khi has_hfmd = TRUE
+  (record được thêm has_hfmd = true như giao diện web gửi lên /api/classify)
+
+Records được chia thành chunk và phân cho process pool; mỗi worker nạp rules
+đã biên dịch (snapshot) một lần khi khởi động. Kết quả ghi ra theo đúng thứ tự
+đầu vào, số chunk đang xử lý được giới hạn để bộ nhớ không tăng theo file.
+
+    python backend/bulk_grading.py cases.jsonl -o results.jsonl
+    python backend/bulk_grading.py cases.csv -o summary.csv --workers 8
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from data_store import dumps_json
+from simple_inference import SimpleInferenceEngine
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+DEFAULT_CHUNK_SIZE = 512
+
+# Cột của output CSV (dạng tóm tắt)
+SUMMARY_FIELDS = ('line', 'id', 'error', 'has_hfmd', 'diagnosis_rule',
+                  'disease_level', 'classification_rules')
+
+# (số dòng trong file, record hoặc None, lỗi đọc hoặc None)
+InputRow = Tuple[int, Optional[Dict], Optional[str]]
+
+
+# ============================================================================
+# ĐỌC INPUT (generator)
+# ============================================================================
+
+def parse_csv_value(value: str):
+    """Ép kiểu ô CSV: '' → None, true/false → bool, số → int/float, còn lại giữ chuỗi"""
+    value = value.strip()
+    if not value:
+        return None
+    lowered = value.lower()
+    if lowered in ('true', 'false'):
+        return lowered == 'true'
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def parse_json_line(line_no: int, line) -> InputRow:
+    """Parse một dòng JSONL (str hoặc bytes) thành record"""
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        return line_no, None, f'JSON không hợp lệ: {e}'
+    if isinstance(record, dict):
+        return line_no, record, None
+    return line_no, None, 'Mỗi bệnh nhân phải là một object'
+
+
+def read_jsonl(stream: Iterable[str]) -> Iterator[InputRow]:
+    """Mỗi dòng một object JSON; dòng trống được bỏ qua"""
+    for line_no, line in enumerate(stream, 1):
+        if line.strip():
+            yield parse_json_line(line_no, line)
+
+
+def read_csv(stream: Iterable[str]) -> Iterator[InputRow]:
+    """Dòng đầu là tên fields; ô trống coi như không có dữ liệu"""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        record = {}
+        for field, value in row.items():
+            if field is None or value is None:
+                continue
+            value = parse_csv_value(value)
+            if value is not None:
+                record[field] = value
+        yield reader.line_num, record, None
+
+
+def read_records(path: str, input_format: Optional[str] = None) -> Iterator[InputRow]:
+    """Đọc records từ file JSONL/CSV ('-': stdin), định dạng đoán theo đuôi file"""
+    input_format = input_format or guess_format(path)
+    reader = read_csv if input_format == 'csv' else read_jsonl
+    if path == '-':
+        yield from reader(io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline=''))
+        return
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        yield from reader(f)
+
+
+def guess_format(path: str) -> str:
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def chunked(rows: Iterator[InputRow], size: int) -> Iterator[List[InputRow]]:
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ============================================================================
+# CHẤM ĐIỂM (chạy trong worker)
+# ============================================================================
+
+def load_engines(data_dir: str) -> Tuple[SimpleInferenceEngine, SimpleInferenceEngine]:
+    """Nạp 2 engines như web app (không cache kết quả: mỗi record chỉ gặp một lần)"""
+    # Thông báo khi nạp rules ra stderr, stdout có thể là output
+    with contextlib.redirect_stdout(sys.stderr):
+        diagnosis_engine = SimpleInferenceEngine(os.path.join(data_dir, 'diagnosis_rules.json'))
+        classification_engine = SimpleInferenceEngine(
+            os.path.join(data_dir, 'classification_level_rules.json'),
+            evaluation_mode='severity'
+        )
+    return diagnosis_engine, classification_engine
+
+
+def _diagnose_all(engine: SimpleInferenceEngine, records: List[Dict]) -> List[Dict]:
+    """diagnose_batch (vector hóa) nếu có NumPy, không thì diagnose từng record"""
+    try:
+        return engine.diagnose_batch(records)
+    except ImportError:
+        return [engine.diagnose(record) for record in records]
+
+
+def grade_records(diagnosis_engine: SimpleInferenceEngine,
+                  classification_engine: SimpleInferenceEngine,
+                  records: List[Dict]) -> List[Tuple[Dict, Optional[Dict]]]:
+    """
+    Chấm 2 giai đoạn cho một nhóm records
+
+    Returns:
+        List (kết quả chẩn đoán, kết quả phân độ hoặc None) theo thứ tự records
+    """
+    diagnoses = _diagnose_all(diagnosis_engine, records)
+    positive = [
+        i for i, diagnosis in enumerate(diagnoses)
+        if diagnosis.get('conclusions', {}).get('has_hfmd') is True
+    ]
+    classifications = [None] * len(records)
+    if positive:
+        results = _diagnose_all(classification_engine,
+                                [dict(records[i], has_hfmd=True) for i in positive])
+        for i, result in zip(positive, results):
+            classifications[i] = result
+    return list(zip(diagnoses, classifications))
+
+
+def grade_record(diagnosis_engine: SimpleInferenceEngine,
+                 classification_engine: SimpleInferenceEngine,
+                 record: Dict) -> Tuple[Dict, Optional[Dict]]:
+    """Chấm 2 giai đoạn cho một record (không vector hóa, như EngineRegistry.grade)"""
+    diagnosis = diagnosis_engine.diagnose(record)
+    if diagnosis.get('conclusions', {}).get('has_hfmd') is not True:
+        return diagnosis, None
+    return diagnosis, classification_engine.diagnose(dict(record, has_hfmd=True))
+
+
+def summarize(line_no: int, record_id, diagnosis: Optional[Dict],
+              classification: Optional[Dict], error: Optional[str] = None) -> Dict:
+    """Một dòng tóm tắt (output CSV / --summary)"""
+    if error is not None:
+        return {'line': line_no, 'id': record_id, 'error': error}
+    best_rule = diagnosis.get('best_rule') or {}
+    summary = {
+        'line': line_no,
+        'id': record_id,
+        'has_hfmd': diagnosis.get('conclusions', {}).get('has_hfmd') is True,
+        'diagnosis_rule': best_rule.get('id'),
+    }
+    if classification is not None:
+        summary['disease_level'] = classification.get('conclusions', {}).get('disease_level')
+        summary['classification_rules'] = [rule['id'] for rule in classification['matched_rules']]
+    return summary
+
+
+def result_row(line_no: int, record_id, diagnosis: Optional[Dict],
+               classification: Optional[Dict], error: Optional[str] = None,
+               summary: bool = False) -> Dict:
+    """Một dòng output: kết quả đầy đủ của 2 giai đoạn, tóm tắt, hoặc lỗi"""
+    if summary:
+        return summarize(line_no, record_id, diagnosis, classification, error)
+    if error is not None:
+        return {'line': line_no, 'id': record_id, 'error': error}
+    return {'line': line_no, 'id': record_id,
+            'diagnosis': diagnosis, 'classification': classification}
+
+
+class Grader:
+    """Engines của một worker + cách định dạng output"""
+
+    def __init__(self, data_dir: str, output_format: str = 'jsonl',
+                 summary: bool = False, id_field: Optional[str] = None):
+        self.diagnosis_engine, self.classification_engine = load_engines(data_dir)
+        self.output_format = output_format
+        self.summary = summary or output_format == 'csv'
+        self.id_field = id_field
+
+    def grade_chunk(self, chunk: List[InputRow]) -> Tuple[List, int]:
+        """
+        Chấm một chunk, trả về các dòng output đã định dạng
+
+        Returns:
+            (dòng output theo thứ tự, số record has_hfmd)
+        """
+        records = [record for _, record, error in chunk if error is None]
+        try:
+            graded = iter([
+                (diagnosis, classification, None)
+                for diagnosis, classification in grade_records(
+                    self.diagnosis_engine, self.classification_engine, records
+                )
+            ])
+        except Exception:
+            # Một record lỗi làm hỏng cả batch: chấm lại từng record,
+            # record lỗi thành một dòng error (như grade_row của /api/grade/stream)
+            graded = map(self.grade_one, records)
+
+        rows = []
+        positives = 0
+        for line_no, record, error in chunk:
+            record_id = record.get(self.id_field) if record and self.id_field else None
+            if error is not None:
+                diagnosis = classification = None
+            else:
+                diagnosis, classification, error = next(graded)
+                positives += classification is not None
+            rows.append(self.format_row(line_no, record_id, diagnosis, classification, error))
+        return rows, positives
+
+    def grade_one(self, record: Dict) -> Tuple[Optional[Dict], Optional[Dict], Optional[str]]:
+        """Chấm một record, lỗi trả về dạng (None, None, thông báo lỗi)"""
+        try:
+            return grade_record(self.diagnosis_engine, self.classification_engine, record) + (None,)
+        except Exception as e:
+            return None, None, str(e)
+
+    def format_row(self, line_no, record_id, diagnosis, classification, error):
+        row = result_row(line_no, record_id, diagnosis, classification, error, self.summary)
+        if self.output_format == 'csv':
+            row['classification_rules'] = ' '.join(row.get('classification_rules') or ())
+            return [row.get(field) for field in SUMMARY_FIELDS]
+        return dumps_json(row)
+
+
+_worker_grader: Optional[Grader] = None
+
+
+def _init_worker(data_dir: str, output_format: str, summary: bool, id_field: Optional[str]):
+    """Khởi tạo worker: nạp rules một lần cho mọi chunk"""
+    global _worker_grader
+    _worker_grader = Grader(data_dir, output_format, summary, id_field)
+
+
+def _grade_chunk(chunk: List[InputRow]) -> Tuple[List, int]:
+    return _worker_grader.grade_chunk(chunk)
+
+
+# ============================================================================
+# PIPELINE
+# ============================================================================
+
+def grade_stream(rows: Iterator[InputRow], data_dir: str = DEFAULT_DATA_DIR,
+                 output_format: str = 'jsonl', summary: bool = False,
+                 id_field: Optional[str] = None, workers: int = 0,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[List, int, int]]:
+    """
+    Chấm theo luồng, giữ thứ tự đầu vào
+
+    Args:
+        rows: Records từ read_records
+        workers: Số process (0 hoặc 1: chấm ngay trong process hiện tại)
+        chunk_size: Số records mỗi chunk gửi cho worker
+
+    Yields:
+        (dòng output của chunk, số records trong chunk, số has_hfmd)
+    """
+    chunks = chunked(rows, chunk_size)
+    init_args = (data_dir, output_format, summary, id_field)
+
+    if workers <= 1:
+        grader = Grader(*init_args)
+        for chunk in chunks:
+            output, positives = grader.grade_chunk(chunk)
+            yield output, len(chunk), positives
+        return
+
+    # Tối đa 2 chunk đang chờ cho mỗi worker: đủ để worker không rảnh,
+    # nhưng không đọc trước cả file vào bộ nhớ
+    max_pending = workers * 2
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=init_args) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append((len(chunk), pool.submit(_grade_chunk, chunk)))
+            if len(pending) >= max_pending:
+                size, future = pending.popleft()
+                output, positives = future.result()
+                yield output, size, positives
+        while pending:
+            size, future = pending.popleft()
+            output, positives = future.result()
+            yield output, size, positives
+
+
+class Progress:
+    """Báo tiến độ và throughput ra stderr"""
+
+    def __init__(self, interval: float = 2.0, stream=sys.stderr):
+        self.interval = interval
+        self.stream = stream
+        self.start = time.perf_counter()
+        self.last_report = self.start
+        self.records = 0
+        self.positives = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    @property
+    def throughput(self) -> float:
+        return self.records / self.elapsed if self.elapsed > 0 else 0.0
+
+    def update(self, records: int, positives: int):
+        self.records += records
+        self.positives += positives
+        now = time.perf_counter()
+        if self.interval and now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def report(self, final: bool = False):
+        prefix = '✓ Xong' if final else '…'
+        print(f"{prefix} {self.records:,} records | {self.positives:,} has_hfmd | "
+              f"{self.elapsed:.1f}s | {self.throughput:,.0f} records/s",
+              file=self.stream, flush=True)
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Chấm lại hàng loạt hồ sơ bệnh nhân (JSONL/CSV)')
+    parser.add_argument('input', help="File JSONL/CSV ('-': stdin)")
+    parser.add_argument('-o', '--output', default='-', help="File kết quả JSONL/CSV ('-': stdout)")
+    parser.add_argument('--input-format', choices=('jsonl', 'csv'), help='Mặc định đoán theo đuôi file')
+    parser.add_argument('--output-format', choices=('jsonl', 'csv'),
+                        help='Mặc định đoán theo đuôi file; CSV luôn ở dạng tóm tắt')
+    parser.add_argument('--summary', action='store_true',
+                        help='Chỉ ghi kết luận (has_hfmd, độ bệnh, rules), không ghi kết quả đầy đủ')
+    parser.add_argument('--id-field', help='Field định danh bệnh nhân chép sang output')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Số process (0 hoặc 1: chạy trong process hiện tại)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='Thư mục chứa file rules JSON')
+    parser.add_argument('--progress-interval', type=float, default=2.0,
+                        help='Số giây giữa 2 lần báo tiến độ (0: tắt)')
+    args = parser.parse_args(argv)
+
+    output_format = args.output_format or guess_format(args.output)
+    rows = read_records(args.input, args.input_format)
+    progress = Progress(args.progress_interval)
+
+    if args.output == '-':
+        out = sys.stdout.buffer
+    else:
+        out = open(args.output, 'wb')
+    text_out = io.TextIOWrapper(out, encoding='utf-8', newline='') if output_format == 'csv' else None
+
+    try:
+        writer = None
+        if text_out is not None:
+            writer = csv.writer(text_out)
+            writer.writerow(SUMMARY_FIELDS)
+
+        for output, size, positives in grade_stream(
+                rows, args.data_dir, output_format, args.summary, args.id_field,
+                args.workers, args.chunk_size):
+            if writer is not None:
+                writer.writerows(output)
+            else:
+                out.write(b''.join(output))
+            progress.update(size, positives)
+    finally:
+        if text_out is not None:
+            text_out.flush()
+            text_out.detach()
+        if out is not sys.stdout.buffer:
+            out.close()
+        else:
+            out.flush()
+
+    progress.report(final=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Data Store - Cache dữ liệu JSON dùng chung cho các API endpoints
+Mỗi file chỉ được đọc và parse lại khi mtime thay đổi
+
+Chứa:
+- JsonPayload: response JSON đã encode sẵn (bytes + ETag + bản gzip tùy chọn)
+- CachedJsonFile: file JSON + dữ liệu dựng sẵn từ nó, tự nạp lại theo mtime
+- DataStore: treatment rules (index theo disease_level) và câu hỏi chẩn đoán
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+# Chỉ gzip payload đủ lớn; payload nhỏ hơn gửi nguyên bản
+GZIP_MIN_SIZE = 1024
+
+
+# ============================================================================
+# JSON PAYLOAD - Response đã encode sẵn
+# ============================================================================
+
+def dumps_json(obj: Any) -> bytes:
+    """Encode JSON giống jsonify của Flask (compact, sort_keys, ASCII)"""
+    return (json.dumps(obj, ensure_ascii=True, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+@dataclass(frozen=True)
+class JsonPayload:
+    """Response JSON đã encode: body, ETag theo nội dung, bản gzip (nếu có)"""
+    body: bytes
+    etag: str
+    gzip_body: Optional[bytes] = None
+
+    @classmethod
+    def from_obj(cls, obj: Any, gzip_min_size: Optional[int] = GZIP_MIN_SIZE) -> 'JsonPayload':
+        """
+        Encode obj một lần
+
+        Args:
+            obj: Dữ liệu JSON
+            gzip_min_size: Kích thước tối thiểu để tạo bản gzip (None: không gzip)
+        """
+        body = dumps_json(obj)
+        etag = hashlib.sha256(body).hexdigest()[:32]
+
+        gzip_body = None
+        if gzip_min_size is not None and len(body) >= gzip_min_size:
+            # mtime=0 để bản gzip ổn định giữa các lần build/worker
+            gzip_body = gzip.compress(body, mtime=0)
+
+        return cls(body=body, etag=etag, gzip_body=gzip_body)
+
+
+# ============================================================================
+# CACHED JSON FILE
+# ============================================================================
+
+
+class CachedJsonFile:
+    """
+    Một file JSON được parse một lần, nạp lại khi mtime (hoặc kích thước) đổi
+
+    build: hàm dựng dữ liệu phục vụ (index, payload...) từ JSON đã parse,
+    chạy một lần mỗi lần nạp file.
+    """
+
+    def __init__(self, path: str, build: Optional[Callable[[Any], Any]] = None):
+        self.path = path
+        self.build = build or (lambda data: data)
+        self._signature = None
+        self._value = None
+        self._lock = threading.Lock()
+
+    def _stat_signature(self):
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self) -> Any:
+        """Lấy dữ liệu đã dựng, đọc lại file nếu nó đã thay đổi"""
+        signature = self._stat_signature()
+        if signature == self._signature:
+            return self._value
+
+        with self._lock:
+            if signature != self._signature:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self._value = self.build(data)
+                self._signature = signature
+        return self._value
+
+    @property
+    def version(self):
+        """Chữ ký (mtime_ns, size) của lần nạp gần nhất"""
+        return self._signature
+
+
+# ============================================================================
+# DATA STORE
+# ============================================================================
+
+@dataclass(frozen=True)
+class TreatmentIndex:
+    """Treatment rules theo disease_level, kèm response đã encode cho từng độ"""
+    rules: Dict[str, Dict]
+    payloads: Dict[str, JsonPayload]
+
+
+class DataStore:
+    """Dữ liệu tĩnh phục vụ API: phác đồ điều trị và câu hỏi chẩn đoán"""
+
+    def __init__(self, data_dir: str, gzip_min_size: Optional[int] = GZIP_MIN_SIZE):
+        """
+        Args:
+            data_dir: Thư mục chứa các file JSON
+            gzip_min_size: Ngưỡng tạo bản gzip cho payload (None: tắt gzip)
+        """
+        self.data_dir = data_dir
+        self.gzip_min_size = gzip_min_size
+        self.treatments = CachedJsonFile(
+            os.path.join(data_dir, 'treatment.json'), self._index_treatments
+        )
+        self.diagnosis_questions = CachedJsonFile(
+            os.path.join(data_dir, 'diagnosis_rules.json'), self._questions_payload
+        )
+
+    def _index_treatments(self, data: Dict) -> TreatmentIndex:
+        """Index treatment rules theo disease_level (giữ rule đầu tiên nếu trùng)"""
+        rules = {}
+        for rule in data.get('treatment_rules', []):
+            rules.setdefault(rule.get('disease_level'), rule)
+
+        payloads = {
+            level: JsonPayload.from_obj({'success': True, 'treatment': rule}, self.gzip_min_size)
+            for level, rule in rules.items()
+        }
+        return TreatmentIndex(rules=rules, payloads=payloads)
+
+    def _questions_payload(self, data: Dict) -> JsonPayload:
+        """Payload trả về cho /api/diagnosis-questions"""
+        return JsonPayload.from_obj({
+            'success': True,
+            'questions': data.get('clinical_questions', {})
+        }, self.gzip_min_size)
+
+    def get_treatment(self, disease_level: str) -> Optional[Dict]:
+        """Lấy phác đồ điều trị theo độ bệnh (None nếu không có)"""
+        try:
+            return self.treatments.get().rules.get(disease_level)
+        except TypeError:
+            # disease_level không hash được (list/dict) → không khớp độ nào
+            return None
+
+    def get_treatment_payload(self, disease_level: str) -> Optional[JsonPayload]:
+        """Response /api/treatment đã encode sẵn cho độ bệnh (None nếu không có)"""
+        try:
+            return self.treatments.get().payloads.get(disease_level)
+        except TypeError:
+            return None
+
+    def get_diagnosis_questions(self) -> JsonPayload:
+        """Response /api/diagnosis-questions đã encode sẵn"""
+        return self.diagnosis_questions.get()
@@ -0,0 +1,279 @@
+"""
+Decision Tree - Biên dịch toàn bộ rules phân độ thành sơ đồ quyết định
+Dùng cho SimpleInferenceEngine (evaluation_mode='tree')
+
+Quy trình:
+- Mỗi nút kiểm tra MỘT field: mọi điều kiện đơn trên field đó được đánh giá một
+  lần, ghép thành chữ ký (bitmask) để chọn nhánh; field đã kiểm tra không xuất hiện
+  lại trên cùng đường đi
+- Sau mỗi nút, cây điều kiện của các rules còn lại được rút gọn (rule thành TRUE →
+  match, FALSE → loại); nhóm độ đầu tiên có match quyết định kết quả nên các nhóm
+  nhẹ hơn bị cắt bỏ (giữ nguyên ngữ nghĩa thứ tự 4 → 3 → 2b → 2a → 1 của chế độ 'severity')
+- Lá ghi độ thắng và các rules đã match của độ đó (theo thứ tự file, dùng cho trace)
+- Trạng thái giống nhau dùng chung một nút (sơ đồ quyết định có rút gọn)
+
+Chữ ký chưa gặp khi biên dịch (giá trị lạ) được dựng thêm nhánh lúc chạy, nên
+kết quả luôn giống hệt đánh giá từng rule.
+
+Sơ đồ có giới hạn số nút (max_nodes, gồm cả nhánh dựng thêm lúc chạy). Vượt giới
+hạn khi biên dịch → sơ đồ bị tắt; khi chạy → nhánh đó không được dựng. Cả hai
+trường hợp match() trả về None để engine đánh giá theo chế độ 'severity'.
+"""
+
+import math
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from rule_compiler import FALSE, TRUE, _make_group, build_predicate, iter_leaves
+
+# Trạng thái: (vị trí nhóm độ, rules chưa quyết định [(index, node rút gọn)], rules đã match)
+State = Tuple[int, Tuple[Tuple[int, tuple], ...], Tuple[int, ...]]
+
+# Số nút tối đa (nút kiểm tra + lá); tập luật phân độ hiện tại cần khoảng 8.100
+DEFAULT_MAX_NODES = 20000
+
+
+class _NodeLimitReached(Exception):
+    """Sơ đồ đã đủ max_nodes, không dựng thêm nút"""
+
+
+class DecisionLeaf:
+    """Kết quả: độ thắng (None nếu không match) và các rules đã match của độ đó"""
+
+    __slots__ = ('degree', 'rule_ids', 'rules')
+    is_leaf = True
+
+    def __init__(self, degree, rules: Sequence[Dict]):
+        self.degree = degree
+        self.rules = tuple(rules)
+        self.rule_ids = tuple(rule.get('id') for rule in rules)
+
+
+class DecisionNode:
+    """Nút kiểm tra một field: chữ ký các điều kiện trên field → nút con"""
+
+    __slots__ = ('field', 'tests', 'children', 'state')
+    is_leaf = False
+
+    def __init__(self, field: str, tests: Tuple, state: State):
+        self.field = field
+        self.tests = tests      # ((bit, predicate), ...)
+        self.children: Dict[int, Any] = {}
+        self.state = state      # Giữ lại để dựng thêm nhánh lúc chạy
+
+
+def _candidate_values(leaf: tuple) -> List[Any]:
+    """Giá trị đại diện cho một điều kiện: ngưỡng và hai số float liền kề, các phần tử..."""
+    _, _, op, value = leaf
+    if isinstance(value, float):
+        return [value, math.nextafter(value, -math.inf), math.nextafter(value, math.inf)]
+    if isinstance(value, tuple):
+        return list(value)
+    return [value]
+
+
+def _substitute(node: tuple, truth: Dict[tuple, bool]) -> tuple:
+    """Thay các điều kiện đơn đã biết giá trị bằng TRUE/FALSE rồi rút gọn"""
+    kind = node[0]
+    if kind == 'cmp':
+        if node in truth:
+            return TRUE if truth[node] else FALSE
+        return node
+    if kind in ('all', 'any'):
+        return _make_group(kind, [_substitute(child, truth) for child in node[1]])
+    return node
+
+
+class DecisionTree:
+    """
+    Sơ đồ quyết định cho các nhóm rules theo độ (severity_buckets của engine)
+
+    Args:
+        severity_buckets: [(degree, (CompiledRule, ...)), ...] theo thứ tự ưu tiên
+        max_nodes: Số nút tối đa (nút kiểm tra + lá)
+    """
+
+    def __init__(self, severity_buckets: Sequence[Tuple[Any, Sequence]],
+                 max_nodes: int = DEFAULT_MAX_NODES):
+        self.degrees = [degree for degree, _ in severity_buckets]
+        self.buckets = [tuple(bucket) for _, bucket in severity_buckets]
+        self.rules = {compiled.index: compiled.rule for bucket in self.buckets for compiled in bucket}
+
+        # Các điều kiện đơn (không trùng) của từng field, mỗi điều kiện một bit
+        leaves: Dict[str, List[tuple]] = {}
+        for bucket in self.buckets:
+            for compiled in bucket:
+                for leaf in iter_leaves(compiled.node):
+                    field_leaves = leaves.setdefault(leaf[1], [])
+                    if leaf not in field_leaves:
+                        field_leaves.append(leaf)
+        self.leaves = leaves
+        self.tests = {
+            field: tuple((1 << i, build_predicate(leaf)) for i, leaf in enumerate(field_leaves))
+            for field, field_leaves in leaves.items()
+        }
+        self.signatures = {field: self._signatures(field) for field in leaves}
+
+        self.max_nodes = max_nodes
+        self.node_count = 0
+        self.leaf_count = 0
+        self.fallbacks = 0  # Số lần cần nhánh mới nhưng sơ đồ đã đủ max_nodes
+        self._memo: Dict[State, Any] = {}
+        self._lock = threading.Lock()
+        self.root = None
+        try:
+            self.root = self._build(self._settle((-1, (), ())))
+        except _NodeLimitReached:
+            self._memo.clear()  # Sơ đồ bị tắt: không giữ các nút đã dựng dở
+
+    # ------------------------------------------------------------------------
+    # Biên dịch
+    # ------------------------------------------------------------------------
+
+    def signature(self, field: str, data: Dict) -> int:
+        """Bitmask các điều kiện trên field mà data thỏa"""
+        signature = 0
+        for bit, test in self.tests[field]:
+            if test(data):
+                signature |= bit
+        return signature
+
+    def _signatures(self, field: str) -> List[int]:
+        """Các chữ ký có thể gặp của field (thiếu giá trị → 0)"""
+        values = [True, False, 'other']
+        for leaf in self.leaves[field]:
+            values.extend(_candidate_values(leaf))
+        signatures = {0}
+        for value in values:
+            signatures.add(self.signature(field, {field: value}))
+        return sorted(signatures)
+
+    def _settle(self, state: State) -> State:
+        """Nhóm hiện tại không còn rule nào có thể match → chuyển sang nhóm kế tiếp"""
+        position, undecided, matched = state
+        while not undecided and not matched and position + 1 < len(self.buckets):
+            position += 1
+            pending, matched_now = [], []
+            for compiled in self.buckets[position]:
+                if compiled.node == TRUE:
+                    matched_now.append(compiled.index)
+                elif compiled.node != FALSE:
+                    pending.append((compiled.index, compiled.node))
+            undecided, matched = tuple(pending), tuple(matched_now)
+        return position, undecided, matched
+
+    def _choose_field(self, undecided) -> str:
+        """Field được nhiều rules chưa quyết định tham chiếu nhất (hòa: theo tên)"""
+        counts: Dict[str, int] = {}
+        for _, node in undecided:
+            for field in {leaf[1] for leaf in iter_leaves(node)}:
+                counts[field] = counts.get(field, 0) + 1
+        return min(counts, key=lambda field: (-counts[field], field))
+
+    def _assign(self, state: State, field: str, signature: int) -> State:
+        """Trạng thái sau khi biết chữ ký của field"""
+        position, undecided, matched = state
+        truth = {
+            leaf: bool(signature & (1 << i)) for i, leaf in enumerate(self.leaves[field])
+        }
+        pending, matched_now = [], list(matched)
+        for index, node in undecided:
+            reduced = _substitute(node, truth)
+            if reduced == TRUE:
+                matched_now.append(index)
+            elif reduced != FALSE:
+                pending.append((index, reduced))
+        return self._settle((position, tuple(pending), tuple(sorted(matched_now))))
+
+    def _reserve(self):
+        if self.node_count + self.leaf_count >= self.max_nodes:
+            raise _NodeLimitReached
+
+    def _build(self, state: State):
+        node = self._memo.get(state)
+        if node is not None:
+            return node
+
+        self._reserve()
+        position, undecided, matched = state
+        if not undecided:
+            degree = self.degrees[position] if matched and position >= 0 else None
+            node = DecisionLeaf(degree, [self.rules[index] for index in matched])
+            self.leaf_count += 1
+            self._memo[state] = node
+            return node
+
+        field = self._choose_field(undecided)
+        node = DecisionNode(field, self.tests[field], state)
+        self.node_count += 1
+        self._memo[state] = node
+        for signature in self.signatures[field]:
+            node.children[signature] = self._build(self._assign(state, field, signature))
+        return node
+
+    def _extend(self, node: DecisionNode, signature: int):
+        """
+        Dựng nhánh cho chữ ký chưa gặp khi biên dịch (None nếu sơ đồ đã đủ max_nodes)
+
+        Nút dựng dở khi chạm giới hạn vẫn nằm trong memo: nhánh còn thiếu của chúng
+        lại đi qua _extend nên kết quả không sai.
+        """
+        with self._lock:
+            child = node.children.get(signature)
+            if child is None:
+                try:
+                    child = self._build(self._assign(node.state, node.field, signature))
+                except _NodeLimitReached:
+                    self.fallbacks += 1
+                    return None
+                node.children[signature] = child
+            return child
+
+    # ------------------------------------------------------------------------
+    # Đánh giá
+    # ------------------------------------------------------------------------
+
+    def evaluate(self, patient_data: Dict) -> Optional[DecisionLeaf]:
+        """
+        Đi từ gốc tới lá: mỗi field trên đường đi được kiểm tra đúng một lần
+
+        Returns:
+            Lá kết quả, None nếu sơ đồ bị tắt hoặc nhánh cần đi vượt max_nodes
+        """
+        node = self.root
+        if node is None:
+            return None
+        while not node.is_leaf:
+            signature = 0
+            if patient_data.get(node.field) is not None:
+                for bit, test in node.tests:
+                    if test(patient_data):
+                        signature |= bit
+            child = node.children.get(signature)
+            if child is None:
+                child = self._extend(node, signature)
+                if child is None:
+                    return None
+            node = child
+        return node
+
+    def match(self, patient_data: Dict) -> Optional[List[Dict]]:
+        """
+        Rules đã match của độ thắng, theo thứ tự file (giống chế độ 'severity')
+
+        None: sơ đồ không trả lời được (xem evaluate), người gọi đánh giá theo 'severity'
+        """
+        leaf = self.evaluate(patient_data)
+        if leaf is None:
+            return None
+        return list(leaf.rules)
+
+    def get_stats(self) -> Dict:
+        return {
+            'enabled': self.root is not None,
+            'nodes': self.node_count,
+            'leaves': self.leaf_count,
+            'max_nodes': self.max_nodes,
+            'fallbacks': self.fallbacks,
+            'fields': len(self.leaves),
+        }
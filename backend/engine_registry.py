@@ -0,0 +1,252 @@
+"""
+Engine Registry - Các engine và dữ liệu dùng chung cho web app (WSGI/ASGI)
+Dựng và biên dịch rules một lần mỗi process, warm-up trước khi nhận traffic
+
+Chứa:
+- synthetic_cases: sinh bệnh nhân giả lập từ các điều kiện trong rules
+- EngineRegistry: diagnosis/classification engines + DataStore + trạng thái warm-up
+- get_default_registry: registry mặc định của process (cấu hình qua biến môi trường)
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from data_store import DataStore
+from metrics import MetricsRegistry, get_default_metrics
+from rule_compiler import iter_leaves
+from simple_inference import SimpleInferenceEngine
+
+# Số bệnh nhân giả lập chạy khi warm-up
+WARMUP_CASES = 64
+
+
+def _candidate_values(field_values: Dict[str, set], leaf: tuple):
+    """Các giá trị đáng thử cho một điều kiện: hai phía ngưỡng, thành viên của 'in'..."""
+    _, field, op, value = leaf
+    values = field_values.setdefault(field, set())
+    if isinstance(value, bool):
+        values.update((True, False))
+    elif isinstance(value, (int, float)):
+        values.update((value - 1, value, value + 1))
+    elif isinstance(value, tuple):
+        values.update(value)
+        values.add(None)
+    else:
+        values.add(value)
+
+
+def synthetic_cases(engines: List[SimpleInferenceEngine], count: int = WARMUP_CASES,
+                    seed: int = 0) -> List[Dict]:
+    """
+    Sinh bệnh nhân giả lập (có seed) từ các fields và ngưỡng trong rules
+
+    Mỗi bệnh nhân có một tập fields ngẫu nhiên (thưa → dày), giá trị lấy quanh
+    các ngưỡng để đi qua cả nhánh match và không match.
+    """
+    field_values: Dict[str, set] = {}
+    for engine in engines:
+        for compiled in engine.compiled_rules:
+            for leaf in iter_leaves(compiled.node):
+                _candidate_values(field_values, leaf)
+
+    rnd = random.Random(seed)
+    fields = sorted(field_values)
+    choices = {field: sorted(field_values[field], key=repr) for field in fields}
+
+    cases = []
+    for i in range(count):
+        if not fields:
+            cases.append({})
+            continue
+        size = 1 + (i * len(fields)) // max(count, 1)
+        cases.append({
+            field: rnd.choice(choices[field])
+            for field in rnd.sample(fields, min(size, len(fields)))
+        })
+    return cases
+
+
+class EngineRegistry:
+    """
+    Engines và dữ liệu dùng chung của web app
+
+    Dựng trong process master (gunicorn preload_app) thì các worker dùng chung
+    rules đã biên dịch (copy-on-write sau fork) và đã warm-up sẵn.
+    """
+
+    def __init__(self, data_dir: str, cache_size: int = 0, cache_ttl: Optional[float] = None,
+                 metrics: Optional[MetricsRegistry] = None, classification_mode: str = 'severity'):
+        """
+        Args:
+            data_dir: Thư mục chứa rules và dữ liệu JSON
+            cache_size: Kích thước LRU cache kết quả match của mỗi engine (0: tắt)
+            cache_ttl: Thời gian sống của entry trong cache (giây)
+            metrics: Bộ đếm theo rule + histogram thời gian (None: tắt)
+            classification_mode: evaluation_mode của engine phân độ ('severity',
+                                 'tree' hoặc 'bitset', cùng kết quả)
+        """
+        self.data_dir = data_dir
+        self.metrics = metrics
+        self.diagnosis_engine = SimpleInferenceEngine(
+            os.path.join(data_dir, 'diagnosis_rules.json'),
+            cache_size=cache_size,
+            cache_ttl=cache_ttl,
+            metrics=metrics,
+            metrics_name='diagnosis'
+        )
+        self.classification_engine = SimpleInferenceEngine(
+            os.path.join(data_dir, 'classification_level_rules.json'),
+            evaluation_mode=classification_mode,  # Dừng sớm ở độ nặng nhất có match
+            cache_size=cache_size,
+            cache_ttl=cache_ttl,
+            metrics=metrics,
+            metrics_name='classification'
+        )
+        # Dữ liệu JSON dùng chung (chỉ đọc lại khi file thay đổi)
+        self.data_store = DataStore(data_dir)
+
+        self.started_at = time.time()
+        self.warmup = {'status': 'pending', 'cases': 0, 'duration_ms': None, 'error': None}
+        self._warmup_lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls, data_dir: str) -> 'EngineRegistry':
+        """
+        Tạo registry với cấu hình cache từ biến môi trường HFMD_RESULT_CACHE_*,
+        chế độ đánh giá phân độ từ HFMD_CLASSIFICATION_MODE (mặc định 'severity'),
+        metrics bật trừ khi HFMD_METRICS=0
+
+        Cache kết quả mặc định tắt (HFMD_RESULT_CACHE_SIZE=0): chỉ bật khi chấp nhận
+        trả lại kết quả đã tính tới HFMD_RESULT_CACHE_TTL giây (mặc định 600).
+        """
+        return cls(
+            data_dir,
+            cache_size=int(os.environ.get('HFMD_RESULT_CACHE_SIZE', 0)),
+            cache_ttl=float(os.environ.get('HFMD_RESULT_CACHE_TTL', 600)),
+            metrics=get_default_metrics(),
+            classification_mode=os.environ.get('HFMD_CLASSIFICATION_MODE', 'severity')
+        )
+
+    @property
+    def engines(self) -> Dict[str, SimpleInferenceEngine]:
+        return {'diagnosis': self.diagnosis_engine, 'classification': self.classification_engine}
+
+    @property
+    def ready(self) -> bool:
+        """Sẵn sàng nhận traffic: warm-up đã xong (hoặc được bỏ qua)"""
+        return self.warmup['status'] in ('done', 'skipped')
+
+    def grade(self, record: Dict) -> Tuple[Dict, Optional[Dict]]:
+        """
+        Chẩn đoán 2 giai đoạn cho một bệnh nhân
+
+        Returns:
+            (kết quả chẩn đoán, kết quả phân độ hoặc None nếu không có TCM)
+        """
+        diagnosis = self.diagnosis_engine.diagnose(record)
+        if diagnosis.get('conclusions', {}).get('has_hfmd') is not True:
+            return diagnosis, None
+        # Như giao diện web: phân độ với has_hfmd = true
+        return diagnosis, self.classification_engine.diagnose(dict(record, has_hfmd=True))
+
+    def rule_sets(self) -> Dict:
+        """Phiên bản (SHA-256) và số rules của từng tập luật đang chạy"""
+        return {
+            name: {
+                'file': os.path.basename(engine.rules_file),
+                'version': engine.rules_version,
+                'rules': len(engine.rules)
+            }
+            for name, engine in self.engines.items()
+        }
+
+    def skip_warm_up(self):
+        """Đánh dấu sẵn sàng mà không warm-up"""
+        self.warmup = {'status': 'skipped', 'cases': 0, 'duration_ms': None, 'error': None}
+
+    def warm_up(self, cases: Optional[List[Dict]] = None,
+                extra: Optional[Callable[[List[Dict]], None]] = None) -> Dict:
+        """
+        Chạy chẩn đoán giả lập qua mọi đường xử lý trước khi nhận traffic
+
+        Gồm diagnose của cả 2 engine, diagnose_batch (dựng vector predicates),
+        phác đồ điều trị và câu hỏi chẩn đoán (nạp và encode sẵn payload).
+        Cache kết quả và metrics được xóa sau warm-up để không giữ dữ liệu giả lập.
+
+        Args:
+            cases: Bệnh nhân giả lập (None: sinh bằng synthetic_cases)
+            extra: Bước warm-up bổ sung nhận cùng danh sách cases (ví dụ gọi HTTP)
+
+        Returns:
+            Trạng thái warm-up
+        """
+        with self._warmup_lock:
+            if self.warmup['status'] == 'done':
+                return self.warmup
+
+            self.warmup = dict(self.warmup, status='running')
+            start = time.perf_counter()
+            try:
+                if cases is None:
+                    cases = synthetic_cases(list(self.engines.values()))
+
+                for case in cases:
+                    self.diagnosis_engine.diagnose(case)
+                    self.classification_engine.diagnose(case)
+                try:
+                    self.classification_engine.diagnose_batch(cases)
+                except ImportError:
+                    pass  # Không có NumPy: /api/classify/batch không dùng được, bỏ qua
+
+                self.data_store.get_diagnosis_questions()
+                for level in ('1', '2a', '2b', '3', '4'):
+                    self.data_store.get_treatment_payload(level)
+                if extra is not None:
+                    extra(cases)
+
+                for engine in self.engines.values():
+                    engine.result_cache.reset()
+                if self.metrics is not None:
+                    self.metrics.reset()
+
+                self.warmup = {
+                    'status': 'done',
+                    'cases': len(cases),
+                    'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+                    'error': None
+                }
+            except Exception as e:
+                self.warmup = {
+                    'status': 'failed',
+                    'cases': 0,
+                    'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+                    'error': str(e)
+                }
+            return self.warmup
+
+    def health(self) -> Dict:
+        """Trạng thái cho /healthz và /readyz"""
+        return {
+            'ready': self.ready,
+            'pid': os.getpid(),
+            'uptime_s': round(time.time() - self.started_at, 3),
+            'rule_sets': self.rule_sets(),
+            'warmup': dict(self.warmup)
+        }
+
+
+_default_registry: Optional[EngineRegistry] = None
+_default_registry_lock = threading.Lock()
+
+
+def get_default_registry(data_dir: str) -> EngineRegistry:
+    """Registry dùng chung trong process (WSGI app, ASGI app... cùng một bộ engines)"""
+    global _default_registry
+    if _default_registry is None:
+        with _default_registry_lock:
+            if _default_registry is None:
+                _default_registry = EngineRegistry.from_environment(data_dir)
+    return _default_registry
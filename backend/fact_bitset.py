@@ -0,0 +1,260 @@
+"""
+Fact Bitset - Mã hóa facts của bệnh nhân thành một số nguyên bitmask
+Dùng cho SimpleInferenceEngine (evaluation_mode='bitset')
+
+Quy trình:
+- FactEncoder: mỗi điều kiện boolean (field == True/False) và mỗi ngưỡng số
+  (field </<=/>/>= số) trong rules được gán một bit; encode(patient_data) trả về
+  bitmask các điều kiện bệnh nhân thỏa
+  - Field boolean: so sánh giá trị với từng điều kiện của field
+  - Field số (ThresholdIndex): các ngưỡng được sắp xếp sẵn, MỘT lần tìm nhị phân
+    cho ra khoảng chứa giá trị, mỗi khoảng có sẵn mask mọi điều kiện thỏa
+    (chi phí không tăng theo số rules dùng field đó)
+- compile_bitset_rule: tách rule thành mask bắt buộc + phần còn lại (None nếu rule
+  chỉ gồm điều kiện có bit: kiểm tra rule = MỘT phép & và so sánh)
+- build_bitset_predicate: dựng closure predicate(mask, patient_data) từ node đã chuẩn hóa
+  - AND các điều kiện có bit → (mask & required) == required
+  - OR các điều kiện có bit → mask & any != 0
+  - Điều kiện còn lại ('in', !=, == giá trị khác bool, nhóm lồng) chỉ được đánh giá
+    sau khi phần bitmask đã qua (AND) hoặc chưa quyết định được (OR)
+"""
+
+import math
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from rule_compiler import NUMERIC_OPERATORS, build_predicate, iter_leaves
+
+BitsetPredicate = Callable[[int, Dict], bool]
+
+# Rule đã biên dịch: (mask bắt buộc, phần còn lại hoặc None nếu mask là đủ)
+BitsetRule = Tuple[int, Optional[BitsetPredicate]]
+
+
+def is_boolean_condition(leaf: tuple) -> bool:
+    """Điều kiện dạng field == True/False"""
+    return leaf[2] == '==' and isinstance(leaf[3], bool)
+
+
+def is_threshold_condition(leaf: tuple) -> bool:
+    """Điều kiện dạng field </<=/>/>= ngưỡng số (ngưỡng NaN luôn sai, không mã hóa)"""
+    return leaf[2] in NUMERIC_OPERATORS and not math.isnan(leaf[3])
+
+
+class ThresholdIndex:
+    """
+    Các ngưỡng số của một field, sắp xếp tăng dần: t0 < t1 < ... < tk-1
+
+    Trục số được chia thành 2k+1 khoảng: (-inf, t0), [t0], (t0, t1), [t1], ...
+    bisect_left(thresholds, x) = i cho biết x nằm trong (ti-1, ti) hoặc bằng ti, nên
+    khoảng của x là 2i (+1 nếu x == ti). masks[khoảng] là mask các điều kiện thỏa.
+    """
+
+    __slots__ = ('thresholds', 'masks')
+
+    def __init__(self, conditions: Iterable[Tuple[str, float, int]]):
+        conditions = list(conditions)   # (operator, ngưỡng, bit)
+        self.thresholds = tuple(sorted({threshold for _, threshold, _ in conditions}))
+        masks = []
+        for i, threshold in enumerate(self.thresholds + (None,)):
+            # Khoảng mở ngay trước ngưỡng i: nhỏ hơn mọi ngưỡng từ i trở đi
+            masks.append(self._mask_between(conditions, i))
+            if threshold is not None:
+                masks.append(self._mask_at(conditions, threshold))
+        self.masks = tuple(masks)
+
+    def _mask_between(self, conditions, i: int) -> int:
+        mask = 0
+        for op, threshold, bit in conditions:
+            below = threshold >= self.thresholds[i] if i < len(self.thresholds) else False
+            if (op in ('<', '<=') and below) or (op in ('>', '>=') and not below):
+                mask |= bit
+        return mask
+
+    @staticmethod
+    def _mask_at(conditions, value: float) -> int:
+        mask = 0
+        for op, threshold, bit in conditions:
+            if NUMERIC_OPERATORS[op](value, threshold):
+                mask |= bit
+        return mask
+
+    def mask(self, value) -> int:
+        """Mask các điều kiện mà giá trị thỏa (ép float như rule_compiler, lỗi/NaN → 0)"""
+        try:
+            value = float(value)
+        except (ValueError, TypeError):
+            return 0
+        if value != value:
+            return 0    # NaN: mọi phép so sánh đều sai
+        thresholds = self.thresholds
+        i = bisect_left(thresholds, value)
+        if i < len(thresholds) and thresholds[i] == value:
+            return self.masks[2 * i + 1]
+        return self.masks[2 * i]
+
+
+class FactEncoder:
+    """
+    Gán bit cho các điều kiện và mã hóa một bệnh nhân thành bitmask
+
+    Bit của điều kiện (field, '==', v) bật khi giá trị khác None và == v, đúng như
+    closure của rule_compiler (nên 1 == True cũng bật bit như khi đánh giá từng rule).
+    Bit của ngưỡng số bật khi float(giá trị) thỏa phép so sánh.
+    """
+
+    def __init__(self, conditions: Iterable[tuple]):
+        self.bits: Dict[tuple, int] = {}
+        by_field: Dict[str, List[Tuple[object, int]]] = {}
+        thresholds: Dict[str, List[Tuple[str, float, int]]] = {}
+        for leaf in conditions:
+            # Điều kiện khác ('in', !=, == giá trị không phải bool) đánh giá scalar, không có bit
+            threshold = is_threshold_condition(leaf)
+            if not (threshold or is_boolean_condition(leaf)) or leaf in self.bits:
+                continue
+            bit = 1 << len(self.bits)
+            self.bits[leaf] = bit
+            if threshold:
+                thresholds.setdefault(leaf[1], []).append((leaf[2], leaf[3], bit))
+            else:
+                by_field.setdefault(leaf[1], []).append((leaf[3], bit))
+        self.by_field = {field: tuple(entries) for field, entries in by_field.items()}
+        self.thresholds = {field: ThresholdIndex(entries) for field, entries in thresholds.items()}
+        self.fields = frozenset(self.by_field) | frozenset(self.thresholds)
+
+    @classmethod
+    def for_rules(cls, compiled_rules) -> 'FactEncoder':
+        """Encoder cho mọi điều kiện boolean và ngưỡng số mà rules tham chiếu (theo thứ tự rules)"""
+        return cls(leaf for compiled in compiled_rules for leaf in iter_leaves(compiled.node))
+
+    def __len__(self) -> int:
+        return len(self.bits)
+
+    def encode(self, patient_data: Dict) -> int:
+        """Bitmask các điều kiện có bit mà patient_data thỏa"""
+        mask = 0
+        by_field, thresholds = self.by_field, self.thresholds
+        for field, value in patient_data.items():
+            if value is None:
+                continue
+            entries = by_field.get(field)
+            if entries is not None:
+                for expected, bit in entries:
+                    if value == expected:
+                        mask |= bit
+            index = thresholds.get(field)
+            if index is not None:
+                mask |= index.mask(value)
+        return mask
+
+
+# ============================================================================
+# PREDICATE - Dựng closure (mask, patient_data) -> bool từ node
+# ============================================================================
+
+def _mask_of(nodes: Iterable[tuple], bits: Dict[tuple, int]) -> int:
+    mask = 0
+    for node in nodes:
+        mask |= bits[node]
+    return mask
+
+
+def _is_masked(node: tuple, bits: Dict[tuple, int]) -> bool:
+    """Điều kiện đơn đã có bit"""
+    if node[0] != 'cmp':
+        return False
+    try:
+        return node in bits
+    except TypeError:
+        return False  # Giá trị so sánh không hash được (list trong ==)
+
+
+def compile_bitset_rule(node: tuple, bits: Dict[tuple, int]) -> BitsetRule:
+    """
+    Tách node của rule thành (required, rest)
+
+    Rule match khi (mask & required) == required và rest (nếu có) đúng; rest chỉ
+    được gọi khi phần mask đã qua. Node FALSE phải được loại trước khi gọi.
+    """
+    if node[0] == 'true':
+        return 0, None
+    if _is_masked(node, bits):
+        return bits[node], None
+    if node[0] != 'all':
+        return 0, build_bitset_predicate(node, bits)
+
+    masked = [child for child in node[1] if _is_masked(child, bits)]
+    others = [child for child in node[1] if not _is_masked(child, bits)]
+    if not others:
+        return _mask_of(masked, bits), None
+    rest = others[0] if len(others) == 1 else ('all', tuple(others))
+    return _mask_of(masked, bits), build_bitset_predicate(rest, bits)
+
+
+def build_bitset_predicate(node: tuple, bits: Dict[tuple, int]) -> BitsetPredicate:
+    """
+    Dựng closure predicate(mask, patient_data) -> bool, ngữ nghĩa như build_predicate
+
+    Args:
+        bits: Bit của các điều kiện đã mã hóa (FactEncoder.bits)
+    """
+    kind = node[0]
+
+    if kind == 'true':
+        return lambda mask, data: True
+    if kind == 'false':
+        return lambda mask, data: False
+    if kind == 'cmp':
+        if _is_masked(node, bits):
+            bit = bits[node]
+            return lambda mask, data: mask & bit != 0
+        scalar = build_predicate(node)
+        return lambda mask, data: scalar(data)
+
+    children = node[1]
+    masked = [child for child in children if _is_masked(child, bits)]
+    # Nhóm con toàn điều kiện có bit: OR trong AND → any mask, AND trong OR → required mask
+    inner = 'any' if kind == 'all' else 'all'
+    grouped = [
+        _mask_of(child[1], bits) for child in children
+        if child[0] == inner and all(_is_masked(c, bits) for c in child[1])
+    ]
+    rest = tuple(
+        build_bitset_predicate(child, bits) for child in children
+        if not _is_masked(child, bits)
+        and not (child[0] == inner and all(_is_masked(c, bits) for c in child[1]))
+    )
+    own_mask = _mask_of(masked, bits)
+
+    if kind == 'all':
+        required, any_masks = own_mask, tuple(grouped)
+        if not any_masks and not rest:
+            return lambda mask, data: mask & required == required
+
+        def all_of(mask, data):
+            if mask & required != required:
+                return False
+            for any_mask in any_masks:
+                if not mask & any_mask:
+                    return False
+            for predicate in rest:
+                if not predicate(mask, data):
+                    return False
+            return True
+        return all_of
+
+    any_mask, required_masks = own_mask, tuple(grouped)
+    if not required_masks and not rest:
+        return lambda mask, data: mask & any_mask != 0
+
+    def any_of(mask, data):
+        if mask & any_mask:
+            return True
+        for required in required_masks:
+            if mask & required == required:
+                return True
+        for predicate in rest:
+            if predicate(mask, data):
+                return True
+        return False
+    return any_of
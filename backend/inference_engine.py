@@ -8,9 +8,11 @@ Thực hiện:
 - Working Memory: Quản lý facts và matched rules
 """
 
-from typing import Dict, List, Optional, Set
-from dataclasses import dataclass, field
-from datetime import datetime
+import threading
+import time
+from typing import Dict, List, Mapping, Optional, Set
+from dataclasses import dataclass
+from types import MappingProxyType
 
 from knowledge_base import (
     Rule,
@@ -19,50 +21,109 @@ from knowledge_base import (
     PatientData,
     DegreeLevel
 )
+from metrics import EVALUATIONS, FIRES, MATCHES
+from rete import ReteNetwork
+import inference_trace as tr
+from inference_trace import TRACE_LEVELS, TraceLog
 
 
 # ============================================================================
 # WORKING MEMORY - Bộ nhớ làm việc
 # ============================================================================
 
-@dataclass
+@dataclass(frozen=True)
+class FactSnapshot:
+    """
+    Ảnh chụp bất biến của working memory (các mapping chỉ đọc)
+    Không bị ảnh hưởng khi working memory tiếp tục ghi hoặc bị clear()
+    """
+    input_facts: Mapping      # Facts đầu vào (không bị derived facts ghi đè)
+    derived_facts: Mapping    # Facts được suy diễn
+    all_facts: Mapping        # Toàn bộ facts (derived ghi đè input)
+
+
 class WorkingMemory:
     """
     Working Memory - Lưu trữ facts và trạng thái suy diễn
     Hỗ trợ tracking derived facts (sự kiện suy diễn)
+    
+    Facts gồm 2 lớp: base (đầu vào) và derived (suy diễn), cùng một mapping
+    gộp chỉ đọc (facts). snapshot() không copy dữ liệu: các lớp bị đánh dấu
+    dùng chung và chỉ được copy khi working memory ghi tiếp (copy-on-write).
     """
-    facts: Dict = field(default_factory=dict)
-    derived_facts: Dict = field(default_factory=dict)  # Facts được suy diễn
-    matched_rules: List[Dict] = field(default_factory=list)
-    fired_rules: Set[str] = field(default_factory=set)
-    fired_intermediate_rules: List[Dict] = field(default_factory=list)  # Track intermediate rules
-    conclusion: Optional[Dict] = None
+    
+    def __init__(self):
+        self.matched_rules: List[Dict] = []
+        self.fired_rules: Set[str] = set()
+        self.fired_intermediate_rules: List[Dict] = []  # Track intermediate rules
+        self.conclusion: Optional[Dict] = None
+        self._new_layers()
+    
+    def _new_layers(self, base: Optional[Dict] = None, derived: Optional[Dict] = None,
+                    merged: Optional[Dict] = None):
+        """Gắn các lớp facts (mặc định rỗng) và các view chỉ đọc tương ứng"""
+        self._base = {} if base is None else base
+        self._derived = {} if derived is None else derived
+        self._merged = {} if merged is None else merged
+        self._shared = False  # True khi các lớp đang được snapshot tham chiếu
+        self.facts: Mapping = MappingProxyType(self._merged)
+        self.base_facts: Mapping = MappingProxyType(self._base)
+        self.derived_facts: Mapping = MappingProxyType(self._derived)
+    
+    def _before_write(self):
+        """Copy-on-write: tách khỏi snapshot trước khi ghi"""
+        if self._shared:
+            self._new_layers(dict(self._base), dict(self._derived), dict(self._merged))
     
     def add_fact(self, key: str, value):
         """Thêm fact vào working memory"""
-        self.facts[key] = value
+        self._before_write()
+        self._base[key] = value
+        if key not in self._derived:
+            self._merged[key] = value
     
     def add_facts(self, facts: Dict):
         """Thêm nhiều facts"""
-        self.facts.update(facts)
+        for key, value in facts.items():
+            self.add_fact(key, value)
     
     def add_derived_fact(self, key: str, value):
         """Thêm derived fact (fact được suy diễn)"""
-        self.derived_facts[key] = value
-        self.facts[key] = value  # Cũng thêm vào facts chung
+        self._before_write()
+        self._derived[key] = value
+        self._merged[key] = value  # Cũng thêm vào facts chung
     
     def add_derived_facts(self, facts: Dict):
         """Thêm nhiều derived facts"""
-        self.derived_facts.update(facts)
-        self.facts.update(facts)
+        self._before_write()
+        self._derived.update(facts)
+        self._merged.update(facts)
     
     def get_fact(self, key: str):
         """Lấy giá trị của fact"""
-        return self.facts.get(key)
+        return self._merged.get(key)
     
     def get_all_facts(self) -> Dict:
-        """Lấy tất cả facts (bao gồm cả derived facts)"""
-        return self.facts.copy()
+        """Lấy bản copy tất cả facts (bao gồm cả derived facts)"""
+        return self._merged.copy()
+    
+    def snapshot(self) -> FactSnapshot:
+        """Ảnh chụp bất biến các lớp facts hiện tại (không copy)"""
+        self._shared = True
+        
+        if self._derived.keys() & self._base.keys():
+            # Derived ghi đè một số input: input_facts chỉ gồm phần không bị ghi đè
+            input_facts = MappingProxyType({
+                k: v for k, v in self._base.items() if k not in self._derived
+            })
+        else:
+            input_facts = self.base_facts
+        
+        return FactSnapshot(
+            input_facts=input_facts,
+            derived_facts=self.derived_facts,
+            all_facts=self.facts
+        )
     
     def record_match(self, rule_result: Dict):
         """Ghi nhận rule đã match"""
@@ -79,12 +140,16 @@ class WorkingMemory:
         self.conclusion = conclusion
     
     def clear(self):
-        """Xóa toàn bộ working memory"""
-        self.facts.clear()
-        self.derived_facts.clear()
-        self.matched_rules.clear()
-        self.fired_rules.clear()
-        self.fired_intermediate_rules.clear()
+        """
+        Xóa toàn bộ working memory
+        
+        Tạo các lớp/list mới thay vì xóa tại chỗ để kết quả của lần chạy
+        trước (đang tham chiếu chúng) không bị thay đổi.
+        """
+        self._new_layers()
+        self.matched_rules = []
+        self.fired_rules = set()
+        self.fired_intermediate_rules = []
         self.conclusion = None
 
 
@@ -152,61 +217,200 @@ class ConflictResolutionStrategy:
 
 
 # ============================================================================
-# INFERENCE ENGINE - Forward Chaining
+# AGENDA - Tìm rules áp dụng được trong mỗi vòng lặp
 # ============================================================================
 
-class InferenceEngine:
+class NaiveAgenda:
+    """
+    Match lại toàn bộ rules với facts hiện tại ở mỗi vòng lặp
+    Cùng giao diện với rete.ReteAgenda (matcher='rete')
     """
-    Inference Engine - Thực hiện suy diễn tiến (Forward Chaining)
     
-    Quy trình:
-    1. Load facts vào working memory
-    2. Match phase: Tìm tất cả rules thỏa mãn
-    3. Conflict resolution: Chọn rule tốt nhất
-    4. Execute: Kích hoạt rule và tạo kết luận
-    5. Return: Trả về kết quả chẩn đoán
+    def __init__(self, knowledge_base: KnowledgeBase):
+        self.kb = knowledge_base
+    
+    def facts_changed(self, changed: Dict, facts: Dict):
+        """Không giữ trạng thái nên không cần cập nhật"""
+        pass
+    
+    def intermediate_rules(self, facts: Dict, fired_rules: Set[str]) -> List[IntermediateRule]:
+        """Intermediate rules match và chưa fire, theo thứ tự knowledge base"""
+        return [
+            rule for rule in self.kb.intermediate_rules
+            if rule.rule_id not in fired_rules and rule.match(facts)
+        ]
+    
+    def conclusion_rules(self, facts: Dict, fired_rules: Set[str]) -> List[Rule]:
+        """Conclusion rules match và chưa fire, theo thứ tự knowledge base"""
+        return [
+            rule for rule in self.kb.rules
+            if rule.rule_id not in fired_rules and rule.match(facts)
+        ]
+
+
+class MeteredAgenda:
+    """
+    Bọc một agenda (naive hoặc rete) để đếm matches theo rule và cộng dồn thời gian match
+
+    Evaluations chỉ đếm được với matcher 'naive' (mỗi rule chưa fire được đánh giá
+    lại mỗi vòng lặp); mạng Rete chia sẻ alpha nodes giữa các rules nên không có
+    "một lần đánh giá rule" để đếm.
     """
+
+    def __init__(self, agenda, knowledge_base: KnowledgeBase, counters, count_evaluations: bool):
+        self.agenda = agenda
+        self.kb = knowledge_base
+        self.counters = counters
+        self.count_evaluations = count_evaluations
+        self.match_seconds = 0.0
+
+    def facts_changed(self, changed: Dict, facts: Dict):
+        self.agenda.facts_changed(changed, facts)
+
+    def _measure(self, rules, match, facts: Dict, fired_rules: Set[str]):
+        start = time.perf_counter()
+        matched = match(facts, fired_rules)
+        self.match_seconds += time.perf_counter() - start
+        if self.count_evaluations:
+            self.counters.add(EVALUATIONS, [
+                rule.rule_id for rule in rules if rule.rule_id not in fired_rules
+            ])
+        self.counters.add(MATCHES, [rule.rule_id for rule in matched])
+        return matched
+
+    def intermediate_rules(self, facts: Dict, fired_rules: Set[str]) -> List[IntermediateRule]:
+        return self._measure(self.kb.intermediate_rules, self.agenda.intermediate_rules,
+                             facts, fired_rules)
+
+    def conclusion_rules(self, facts: Dict, fired_rules: Set[str]) -> List[Rule]:
+        return self._measure(self.kb.rules, self.agenda.conclusion_rules, facts, fired_rules)
+
+
+# ============================================================================
+# EXPLANATION - Giải thích kết quả
+# ============================================================================
+
+def explain_result(result: Optional[Dict], verbose: bool = False) -> str:
+    """
+    Giải thích kết quả suy diễn
     
-    def __init__(self, knowledge_base: Optional[KnowledgeBase] = None):
-        """
-        Khởi tạo inference engine
+    Args:
+        result: Kết quả trả về từ run / run_from_dict / run_legacy
+        verbose: Hiển thị chi tiết trace hay không
         
-        Args:
-            knowledge_base: Knowledge base chứa rules. Nếu None, tạo mới.
-        """
-        self.kb = knowledge_base or KnowledgeBase()
+    Returns:
+        Chuỗi giải thích
+    """
+    if not result:
+        return "Chưa có kết quả suy diễn"
+    
+    lines = []
+    
+    lines.append("="*80)
+    lines.append("GIẢI THÍCH QUÁ TRÌNH SUY DIỄN (FORWARD CHAINING)")
+    lines.append("="*80)
+    
+    if result['success']:
+        lines.append(f"\n✓ KẾT LUẬN: Độ {result['degree']}")
+        
+        # Hiển thị intermediate rules đã fire
+        if result.get('fired_intermediate_rules'):
+            lines.append(f"\n🔄 LUẬT TRUNG GIAN ĐÃ FIRE ({len(result['fired_intermediate_rules'])}):")
+            for i, r in enumerate(result['fired_intermediate_rules'], 1):
+                lines.append(f"   Bước {i}: [{r['rule_id']}] {r['description']}")
+                lines.append(f"           → Tạo: {r['derived_facts']}")
+        
+        # Hiển thị derived facts
+        if result.get('derived_facts'):
+            lines.append(f"\n💡 SỰ KIỆN SUY DIỄN ({len(result['derived_facts'])}):")
+            for k, v in result['derived_facts'].items():
+                lines.append(f"   • {k} = {v}")
+        
+        # Luật kết luận
+        if result.get('primary_rule'):
+            rule = result['primary_rule']
+            lines.append(f"\n📋 LUẬT KẾT LUẬN:")
+            lines.append(f"   • ID: {rule['rule_id']}")
+            lines.append(f"   • Mô tả: {rule['description']}")
+            lines.append(f"   • Nguồn: {rule['source']}")
+        
+        lines.append(f"\n📊 SỐ VÒNG LẶP: {result.get('total_iterations', 1)}")
+        
+    else:
+        lines.append(f"\n✗ {result.get('message', 'Không xác định')}")
+        
+        # Vẫn hiển thị các bước đã thực hiện
+        if result.get('fired_intermediate_rules'):
+            lines.append(f"\n🔄 ĐÃ THỰC HIỆN {len(result['fired_intermediate_rules'])} BƯỚC:")
+            for i, r in enumerate(result['fired_intermediate_rules'], 1):
+                lines.append(f"   Bước {i}: [{r['rule_id']}] {r['description']}")
+    
+    if verbose and 'inference_trace' in result:
+        lines.append(f"\n🔍 TRACE SUY DIỄN CHI TIẾT:")
+        for trace_line in result['inference_trace']:
+            lines.append(f"   {trace_line}")
+    
+    lines.append("="*80)
+    
+    return "\n".join(lines)
+
+
+# ============================================================================
+# INFERENCE SESSION - Trạng thái của một lần suy diễn
+# ============================================================================
+
+class InferenceSession:
+    """
+    Một lần suy diễn: working memory + trace riêng, dùng rules/matcher của engine
+    
+    Mỗi request/thread dùng một session riêng nên một InferenceEngine có thể
+    phục vụ nhiều thread cùng lúc mà không cần lock.
+    """
+    
+    def __init__(self, engine: 'InferenceEngine'):
+        self.engine = engine
+        self.kb = engine.kb
+        self.conflict_resolver = engine.conflict_resolver
+        self.trace_level = engine.trace_level
         self.working_memory = WorkingMemory()
-        self.conflict_resolver = ConflictResolutionStrategy.priority_based
-        self.inference_trace: List[str] = []
-        
+        self.inference_trace = TraceLog(engine.trace_level)
+        self.agenda = None  # Agenda của lần forward chaining gần nhất
+    
+    @property
+    def result(self) -> Optional[Dict]:
+        """Kết quả của lần chạy gần nhất trong session (None nếu chưa chạy)"""
+        return self.working_memory.conclusion
+    
     def reset(self):
-        """Reset engine về trạng thái ban đầu"""
+        """Xóa working memory và trace để chạy lại"""
         self.working_memory.clear()
         self.inference_trace.clear()
     
-    def set_conflict_resolution(self, strategy: str):
-        """
-        Đặt chiến lược giải quyết xung đột
-        
-        Args:
-            strategy: 'priority', 'severity', hoặc 'recency'
-        """
-        strategies = {
-            'priority': ConflictResolutionStrategy.priority_based,
-            'severity': ConflictResolutionStrategy.severity_based,
-            'recency': ConflictResolutionStrategy.recency_based
-        }
+    def _create_agenda(self, facts: Dict):
+        self.agenda = self.engine._create_agenda(facts)
+        return self.agenda
+    
+    def _run_cycle(self) -> bool:
+        """forward_chaining_cycle(), kèm đo thời gian và đếm rules đã fire nếu engine bật metrics"""
+        metrics = self.engine.metrics
+        if metrics is None:
+            return self.forward_chaining_cycle(max_iterations=10)
         
-        if strategy in strategies:
-            self.conflict_resolver = strategies[strategy]
-            self._trace(f"Conflict resolution strategy: {strategy}")
-        else:
-            raise ValueError(f"Unknown strategy: {strategy}")
+        start = time.perf_counter()
+        goal_reached = self.forward_chaining_cycle(max_iterations=10)
+        elapsed = time.perf_counter() - start
+        
+        name = self.engine.metrics_name
+        match_seconds = self.agenda.match_seconds
+        metrics.observe_phase(name, 'match', match_seconds)
+        metrics.observe_phase(name, 'execute', max(elapsed - match_seconds, 0.0))
+        metrics.observe_phase(name, 'cycle', elapsed)
+        self.engine.rule_counters.add(FIRES, self.working_memory.fired_rules)
+        return goal_reached
     
-    def _trace(self, message: str):
-        """Ghi lại quá trình suy diễn"""
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        self.inference_trace.append(f"[{timestamp}] {message}")
+    def _trace(self, code: str, rule_id: Optional[str] = None, *args):
+        """Ghi lại quá trình suy diễn (sự kiện có cấu trúc, format khi đọc)"""
+        self.inference_trace.record(code, rule_id, args)
     
     def load_facts(self, patient_data: PatientData):
         """
@@ -217,7 +421,7 @@ class InferenceEngine:
         """
         facts = patient_data.get_all_facts()
         self.working_memory.add_facts(facts)
-        self._trace(f"Loaded {len(facts)} facts into working memory")
+        self._trace(tr.LOADED, None, len(facts))
     
     def load_facts_from_dict(self, facts: Dict):
         """
@@ -227,7 +431,7 @@ class InferenceEngine:
             facts: Dictionary chứa dữ liệu
         """
         self.working_memory.add_facts(facts)
-        self._trace(f"Loaded {len(facts)} facts from dictionary")
+        self._trace(tr.LOADED_DICT, None, len(facts))
     
     def match_phase(self) -> List[Rule]:
         """
@@ -239,14 +443,14 @@ class InferenceEngine:
         matched_rules = []
         facts = self.working_memory.facts
         
-        self._trace(f"Starting match phase with {len(self.kb.rules)} rules")
+        self._trace(tr.MATCH_START, None, len(self.kb.rules))
         
         for rule in self.kb.rules:
             if rule.match(facts):
                 matched_rules.append(rule)
-                self._trace(f"  ✓ Matched: {rule.rule_id} (Độ {rule.degree}, P:{rule.priority})")
+                self._trace(tr.MATCHED, rule.rule_id, rule.degree, rule.priority)
         
-        self._trace(f"Match phase complete: {len(matched_rules)} rules matched")
+        self._trace(tr.MATCH_DONE, None, len(matched_rules))
         return matched_rules
     
     def conflict_resolution(self, matched_rules: List[Rule]) -> Optional[Rule]:
@@ -260,7 +464,7 @@ class InferenceEngine:
             Rule được chọn, hoặc None nếu không có rule nào
         """
         if not matched_rules:
-            self._trace("No rules to resolve")
+            self._trace(tr.NOTHING_TO_RESOLVE)
             return None
         
         # Chuyển rules thành dicts để resolve
@@ -276,10 +480,8 @@ class InferenceEngine:
         )
         
         if selected_rule:
-            self._trace(
-                f"Selected rule: {selected_rule.rule_id} "
-                f"(Độ {selected_rule.degree}, P:{selected_rule.priority})"
-            )
+            self._trace(tr.SELECTED, selected_rule.rule_id,
+                        selected_rule.degree, selected_rule.priority)
         
         return selected_rule
     
@@ -298,7 +500,7 @@ class InferenceEngine:
         
         result = selected_rule.fire()
         self.working_memory.record_match(result)
-        self._trace(f"Fired rule: {selected_rule.rule_id}")
+        self._trace(tr.FIRED, selected_rule.rule_id)
         
         return result
     
@@ -319,42 +521,48 @@ class InferenceEngine:
             True nếu tìm được kết luận (degree), False nếu không
         """
         iteration = 0
+        agenda = self._create_agenda(self.working_memory.facts)
+        # Sự kiện chi tiết chỉ ghi ở mức full (tránh cả lời gọi _trace khi không cần)
+        full_trace = self.trace_level == 'full'
         
-        self._trace(f"=== Starting Forward Chaining Cycle ===")
-        self._trace(f"Initial facts: {len(self.working_memory.facts)} facts")
+        if full_trace:
+            self._trace(tr.CYCLE_START)
+            self._trace(tr.INITIAL_FACTS, None, len(self.working_memory.facts))
         
         while iteration < max_iterations:
             iteration += 1
-            self._trace(f"\n--- Iteration {iteration} ---")
+            if full_trace:
+                self._trace(tr.ITERATION, None, iteration)
             
             # Kiểm tra xem đã có kết luận (degree) chưa
             if 'final_degree' in self.working_memory.facts:
-                self._trace(f"✓ Goal reached: final_degree = {self.working_memory.facts['final_degree']}")
+                self._trace(tr.GOAL_REACHED, None, self.working_memory.facts['final_degree'])
                 return True
             
             # 2.1. Tìm luật r: gt(r) ⊂ Known và kl(r) ∉ Known
-            facts = self.working_memory.get_all_facts()
+            # (view chỉ đọc, không copy facts mỗi vòng lặp)
+            facts = self.working_memory.facts
             
             # Tìm intermediate rules khớp (chưa fire)
             applicable_intermediate = []
-            for rule in self.kb.intermediate_rules:
-                if rule.rule_id not in self.working_memory.fired_rules and rule.match(facts):
-                    # Kiểm tra xem derived facts đã có chưa
-                    new_facts = any(k not in facts for k in rule.derived_facts.keys())
-                    if new_facts:
-                        applicable_intermediate.append(rule)
-                        self._trace(f"  Found applicable intermediate rule: {rule.rule_id}")
+            for rule in agenda.intermediate_rules(facts, self.working_memory.fired_rules):
+                # Kiểm tra xem derived facts đã có chưa
+                new_facts = any(k not in facts for k in rule.derived_facts.keys())
+                if new_facts:
+                    applicable_intermediate.append(rule)
+                    if full_trace:
+                        self._trace(tr.FOUND_INTERMEDIATE, rule.rule_id)
             
             # Tìm conclusion rules khớp
             applicable_conclusion = []
-            for rule in self.kb.rules:
-                if rule.rule_id not in self.working_memory.fired_rules and rule.match(facts):
-                    applicable_conclusion.append(rule)
-                    self._trace(f"  Found applicable conclusion rule: {rule.rule_id}")
+            for rule in agenda.conclusion_rules(facts, self.working_memory.fired_rules):
+                applicable_conclusion.append(rule)
+                if full_trace:
+                    self._trace(tr.FOUND_CONCLUSION, rule.rule_id)
             
             # 2.2. if (không có r) then Dừng
             if not applicable_intermediate and not applicable_conclusion:
-                self._trace("No more applicable rules. Stopping.")
+                self._trace(tr.NO_APPLICABLE)
                 return False
             
             # 2.3. Thêm r vào Solution; thêm kl(r) vào Known
@@ -364,13 +572,15 @@ class InferenceEngine:
                 # Chọn rule có priority cao nhất
                 rule_to_fire = max(applicable_intermediate, key=lambda r: r.priority)
                 
-                self._trace(f"→ Firing intermediate rule: {rule_to_fire.rule_id}")
-                result = rule_to_fire.fire(self.working_memory.facts)
+                self._trace(tr.FIRE_INTERMEDIATE, rule_to_fire.rule_id)
+                result = rule_to_fire.fire()
                 self.working_memory.record_intermediate_rule(result)
                 self.working_memory.add_derived_facts(rule_to_fire.derived_facts)
+                agenda.facts_changed(rule_to_fire.derived_facts, self.working_memory.facts)
                 
-                self._trace(f"  Derived facts: {rule_to_fire.derived_facts}")
-                self._trace(f"  Total facts now: {len(self.working_memory.facts)}")
+                if full_trace:
+                    self._trace(tr.DERIVED, None, rule_to_fire.derived_facts)
+                    self._trace(tr.TOTAL_FACTS, None, len(self.working_memory.facts))
                 
             # Nếu có conclusion rule, kiểm tra xem có thể kết luận không
             elif applicable_conclusion:
@@ -385,20 +595,22 @@ class InferenceEngine:
                     if rules_for_degree:
                         # Tìm thấy độ này → Chọn rule đầu tiên và DỪNG NGAY
                         selected_rule = rules_for_degree[0]
-                        self._trace(f"  Sequential selection: Found degree {target_degree}, stopping search")
+                        if full_trace:
+                            self._trace(tr.DEGREE_SELECTED, None, target_degree)
                         break
                 
                 if selected_rule:
-                    self._trace(f"→ Firing conclusion rule: {selected_rule.rule_id}")
+                    self._trace(tr.FIRE_CONCLUSION, selected_rule.rule_id)
                     result = selected_rule.fire()
                     self.working_memory.record_match(result)
                     
                     # Thêm kết luận vào working memory
                     self.working_memory.add_derived_fact('final_degree', selected_rule.degree)
-                    self._trace(f"  Conclusion: Degree = {selected_rule.degree}")
+                    if full_trace:
+                        self._trace(tr.CONCLUSION, None, selected_rule.degree)
                     return True
         
-        self._trace(f"⚠ Max iterations ({max_iterations}) reached")
+        self._trace(tr.MAX_ITERATIONS, None, max_iterations)
         return False
     
     def run(self, patient_data: PatientData) -> Dict:
@@ -412,54 +624,19 @@ class InferenceEngine:
             Kết quả chẩn đoán
         """
         self.reset()
-        self._trace("=== Inference Engine Started (Multi-Step Forward Chaining) ===")
+        self._trace(tr.STARTED)
         
         # Bước 1: Solution = []; Known = GT
         self.load_facts(patient_data)
         
         # Bước 2: Forward Chaining Cycle
-        goal_reached = self.forward_chaining_cycle(max_iterations=10)
+        goal_reached = self._run_cycle()
         
         # Bước 3: Tạo kết quả
-        if goal_reached and 'final_degree' in self.working_memory.facts:
-            final_degree = self.working_memory.facts['final_degree']
-            
-            # Tìm primary rule (rule đã cho kết luận)
-            primary_rule = None
-            if self.working_memory.matched_rules:
-                primary_rule = self.working_memory.matched_rules[-1]  # Rule cuối cùng
-            
-            conclusion = {
-                'success': True,
-                'degree': final_degree,
-                'primary_rule': primary_rule,
-                'all_matched_rules': self.working_memory.matched_rules,
-                'fired_intermediate_rules': self.working_memory.fired_intermediate_rules,
-                'derived_facts': self.working_memory.derived_facts.copy(),
-                'total_matched': len(self.working_memory.matched_rules),
-                'total_iterations': len(self.working_memory.fired_intermediate_rules) + 1,
-                'input_facts': {k: v for k, v in self.working_memory.facts.items() 
-                               if k not in self.working_memory.derived_facts},
-                'all_facts': self.working_memory.get_all_facts(),
-                'inference_trace': self.inference_trace.copy()
-            }
-        else:
-            # Không tìm được kết luận
-            conclusion = {
-                'success': False,
-                'degree': DegreeLevel.UNKNOWN.value,
-                'primary_rule': None,
-                'all_matched_rules': [],
-                'fired_intermediate_rules': self.working_memory.fired_intermediate_rules,
-                'derived_facts': self.working_memory.derived_facts.copy(),
-                'total_matched': 0,
-                'input_facts': self.working_memory.facts.copy(),
-                'message': 'Không tìm được kết luận. Cần bổ sung thông tin lâm sàng.',
-                'inference_trace': self.inference_trace.copy()
-            }
+        conclusion = self._build_conclusion(goal_reached)
         
         self.working_memory.set_conclusion(conclusion)
-        self._trace("=== Inference Engine Completed ===")
+        self._trace(tr.COMPLETED)
         
         return conclusion
     
@@ -475,55 +652,67 @@ class InferenceEngine:
             Kết quả chẩn đoán
         """
         self.reset()
-        self._trace("=== Inference Engine Started (from dict, Multi-Step FC) ===")
+        self._trace(tr.STARTED_DICT)
         
         # Bước 1: Solution = []; Known = GT
         self.load_facts_from_dict(facts)
         
         # Bước 2: Forward Chaining Cycle
-        goal_reached = self.forward_chaining_cycle(max_iterations=10)
+        goal_reached = self._run_cycle()
         
         # Bước 3: Tạo kết quả
-        if goal_reached and 'final_degree' in self.working_memory.facts:
-            final_degree = self.working_memory.facts['final_degree']
+        conclusion = self._build_conclusion(goal_reached)
+        
+        self.working_memory.set_conclusion(conclusion)
+        self._trace(tr.COMPLETED)
+        
+        return conclusion
+    
+    def _build_conclusion(self, goal_reached: bool) -> Dict:
+        """
+        Tạo kết quả từ working memory sau forward chaining
+        
+        Các facts trong kết quả là snapshot chỉ đọc của working memory,
+        không phải bản copy.
+        """
+        wm = self.working_memory
+        snapshot = wm.snapshot()
+        
+        if goal_reached and 'final_degree' in wm.facts:
+            final_degree = wm.facts['final_degree']
             
-            # Tìm primary rule
+            # Tìm primary rule (rule đã cho kết luận)
             primary_rule = None
-            if self.working_memory.matched_rules:
-                primary_rule = self.working_memory.matched_rules[-1]
+            if wm.matched_rules:
+                primary_rule = wm.matched_rules[-1]  # Rule cuối cùng
             
-            conclusion = {
+            return {
                 'success': True,
                 'degree': final_degree,
                 'primary_rule': primary_rule,
-                'all_matched_rules': self.working_memory.matched_rules,
-                'fired_intermediate_rules': self.working_memory.fired_intermediate_rules,
-                'derived_facts': self.working_memory.derived_facts.copy(),
-                'total_matched': len(self.working_memory.matched_rules),
-                'total_iterations': len(self.working_memory.fired_intermediate_rules) + 1,
-                'input_facts': {k: v for k, v in self.working_memory.facts.items() 
-                               if k not in self.working_memory.derived_facts},
-                'all_facts': self.working_memory.get_all_facts(),
-                'inference_trace': self.inference_trace.copy()
-            }
-        else:
-            conclusion = {
-                'success': False,
-                'degree': DegreeLevel.UNKNOWN.value,
-                'primary_rule': None,
-                'all_matched_rules': [],
-                'fired_intermediate_rules': self.working_memory.fired_intermediate_rules,
-                'derived_facts': self.working_memory.derived_facts.copy(),
-                'total_matched': 0,
-                'input_facts': self.working_memory.facts.copy(),
-                'message': 'Không tìm được kết luận. Cần bổ sung thông tin lâm sàng.',
-                'inference_trace': self.inference_trace.copy()
+                'all_matched_rules': wm.matched_rules,
+                'fired_intermediate_rules': wm.fired_intermediate_rules,
+                'derived_facts': snapshot.derived_facts,
+                'total_matched': len(wm.matched_rules),
+                'total_iterations': len(wm.fired_intermediate_rules) + 1,
+                'input_facts': snapshot.input_facts,
+                'all_facts': snapshot.all_facts,
+                'inference_trace': self.inference_trace.snapshot()
             }
         
-        self.working_memory.set_conclusion(conclusion)
-        self._trace("=== Inference Engine Completed ===")
-        
-        return conclusion
+        # Không tìm được kết luận
+        return {
+            'success': False,
+            'degree': DegreeLevel.UNKNOWN.value,
+            'primary_rule': None,
+            'all_matched_rules': [],
+            'fired_intermediate_rules': wm.fired_intermediate_rules,
+            'derived_facts': snapshot.derived_facts,
+            'total_matched': 0,
+            'input_facts': snapshot.all_facts,
+            'message': 'Không tìm được kết luận. Cần bổ sung thông tin lâm sàng.',
+            'inference_trace': self.inference_trace.snapshot()
+        }
     
     def run_legacy(self, patient_data: PatientData) -> Dict:
         """
@@ -537,7 +726,7 @@ class InferenceEngine:
             Kết quả chẩn đoán
         """
         self.reset()
-        self._trace("=== Inference Engine Started (Legacy Single-Step) ===")
+        self._trace(tr.STARTED_LEGACY)
         
         # 1. Load facts
         self.load_facts(patient_data)
@@ -565,8 +754,8 @@ class InferenceEngine:
                 'primary_rule': primary_result,
                 'all_matched_rules': self.working_memory.matched_rules,
                 'total_matched': len(matched_rules),
-                'input_facts': self.working_memory.facts.copy(),
-                'inference_trace': self.inference_trace.copy()
+                'input_facts': self.working_memory.snapshot().all_facts,
+                'inference_trace': self.inference_trace.snapshot()
             }
         else:
             # Không có rule nào match
@@ -577,79 +766,202 @@ class InferenceEngine:
                 'primary_rule': None,
                 'all_matched_rules': [],
                 'total_matched': 0,
-                'input_facts': self.working_memory.facts.copy(),
+                'input_facts': self.working_memory.snapshot().all_facts,
                 'message': 'Không có luật nào thỏa mãn. Cần bổ sung thông tin lâm sàng.',
-                'inference_trace': self.inference_trace.copy()
+                'inference_trace': self.inference_trace.snapshot()
             }
         
         self.working_memory.set_conclusion(conclusion)
-        self._trace("=== Inference Engine Completed (Legacy) ===")
+        self._trace(tr.COMPLETED_LEGACY)
         
         return conclusion
     
     def explain(self, verbose: bool = False) -> str:
+        """Giải thích kết quả của session (xem explain_result)"""
+        return explain_result(self.result, verbose)
+
+
+# ============================================================================
+# INFERENCE ENGINE - Forward Chaining
+# ============================================================================
+
+class InferenceEngine:
+    """
+    Inference Engine - Thực hiện suy diễn tiến (Forward Chaining)
+    
+    Quy trình:
+    1. Load facts vào working memory
+    2. Match phase: Tìm tất cả rules thỏa mãn
+    3. Conflict resolution: Chọn rule tốt nhất
+    4. Execute: Kích hoạt rule và tạo kết luận
+    5. Return: Trả về kết quả chẩn đoán
+    
+    Engine không giữ trạng thái của lần chạy: mỗi lần run tạo một
+    InferenceSession riêng. Session gần nhất của mỗi thread được giữ lại để
+    working_memory / inference_trace / explain() hoạt động như trước.
+    """
+    
+    MATCHERS = ('naive', 'rete')
+    
+    def __init__(self, knowledge_base: Optional[KnowledgeBase] = None, matcher: str = 'naive',
+                 trace_level: str = 'full', metrics=None):
         """
-        Giải thích kết quả suy diễn
+        Khởi tạo inference engine
         
         Args:
-            verbose: Hiển thị chi tiết trace hay không
-            
-        Returns:
-            Chuỗi giải thích
+            knowledge_base: Knowledge base chứa rules. Nếu None, tạo mới.
+            matcher: 'naive' (match lại mọi rules mỗi vòng lặp) hoặc
+                     'rete' (mạng alpha nodes dùng chung, chỉ lan truyền facts mới)
+            trace_level: 'off', 'summary' hoặc 'full' (xem inference_trace)
+            metrics: MetricsRegistry để đếm matches/fires theo rule và đo thời gian
+                     các phase (None: tắt, agenda không bị bọc)
         """
-        if not self.working_memory.conclusion:
-            return "Chưa có kết quả suy diễn"
-        
-        result = self.working_memory.conclusion
-        lines = []
+        if matcher not in self.MATCHERS:
+            raise ValueError(f"Unknown matcher: {matcher}")
+        if trace_level not in TRACE_LEVELS:
+            raise ValueError(f"Unknown trace level: {trace_level}")
         
-        lines.append("="*80)
-        lines.append("GIẢI THÍCH QUÁ TRÌNH SUY DIỄN (FORWARD CHAINING)")
-        lines.append("="*80)
-        
-        if result['success']:
-            lines.append(f"\n✓ KẾT LUẬN: Độ {result['degree']}")
-            
-            # Hiển thị intermediate rules đã fire
-            if result.get('fired_intermediate_rules'):
-                lines.append(f"\n🔄 LUẬT TRUNG GIAN ĐÃ FIRE ({len(result['fired_intermediate_rules'])}):")
-                for i, r in enumerate(result['fired_intermediate_rules'], 1):
-                    lines.append(f"   Bước {i}: [{r['rule_id']}] {r['description']}")
-                    lines.append(f"           → Tạo: {r['derived_facts']}")
-            
-            # Hiển thị derived facts
-            if result.get('derived_facts'):
-                lines.append(f"\n💡 SỰ KIỆN SUY DIỄN ({len(result['derived_facts'])}):")
-                for k, v in result['derived_facts'].items():
-                    lines.append(f"   • {k} = {v}")
-            
-            # Luật kết luận
-            if result.get('primary_rule'):
-                rule = result['primary_rule']
-                lines.append(f"\n📋 LUẬT KẾT LUẬN:")
-                lines.append(f"   • ID: {rule['rule_id']}")
-                lines.append(f"   • Mô tả: {rule['description']}")
-                lines.append(f"   • Nguồn: {rule['source']}")
-            
-            lines.append(f"\n📊 SỐ VÒNG LẶP: {result.get('total_iterations', 1)}")
-            
+        self.kb = knowledge_base or KnowledgeBase()
+        self.matcher = matcher
+        self.conflict_resolver = ConflictResolutionStrategy.priority_based
+        self.trace_level = trace_level
+        # Mạng Rete dựng ngay khi tạo engine; chỉ dựng lại (có lock) khi KB có thêm rules
+        self._rete_lock = threading.Lock()
+        self._rete_network: Optional[ReteNetwork] = None
+        if matcher == 'rete':
+            self._rete_network = ReteNetwork.for_knowledge_base(self.kb)
+        self._local = threading.local()  # Session gần nhất của mỗi thread
+        self.metrics = metrics
+        self.metrics_name = f'inference_{matcher}'
+        self.rule_counters = None
+        if metrics is not None:
+            self.rule_counters = metrics.rule_counters(self.metrics_name, [
+                rule.rule_id for rule in list(self.kb.intermediate_rules) + list(self.kb.rules)
+            ])
+        
+    def _create_agenda(self, facts: Dict):
+        """Tạo agenda cho một lần chạy forward chaining theo matcher đã chọn"""
+        if self.matcher == 'naive':
+            agenda = NaiveAgenda(self.kb)
         else:
-            lines.append(f"\n✗ {result.get('message', 'Không xác định')}")
-            
-            # Vẫn hiển thị các bước đã thực hiện
-            if result.get('fired_intermediate_rules'):
-                lines.append(f"\n🔄 ĐÃ THỰC HIỆN {len(result['fired_intermediate_rules'])} BƯỚC:")
-                for i, r in enumerate(result['fired_intermediate_rules'], 1):
-                    lines.append(f"   Bước {i}: [{r['rule_id']}] {r['description']}")
+            agenda = self._current_rete_network().create_agenda(facts)
+        
+        if self.rule_counters is not None:
+            return MeteredAgenda(agenda, self.kb, self.rule_counters,
+                                 count_evaluations=self.matcher == 'naive')
+        return agenda
+        
+    def _current_rete_network(self) -> ReteNetwork:
+        """Mạng Rete dùng chung theo knowledge base, dựng lại nếu KB có thêm rules"""
+        network = self._rete_network
+        if not network.is_current():
+            with self._rete_lock:
+                network = self._rete_network
+                if not network.is_current():
+                    network = self._rete_network = ReteNetwork.for_knowledge_base(self.kb)
+        return network
+    
+    def session(self) -> InferenceSession:
+        """Tạo session mới cho một lần suy diễn"""
+        return InferenceSession(self)
+    
+    def _current_session(self) -> InferenceSession:
+        """Session gần nhất của thread hiện tại (tạo mới nếu chưa có)"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self.session()
+        return session
+    
+    def _new_session(self) -> InferenceSession:
+        """Session mới, thay thế session gần nhất của thread hiện tại"""
+        session = self._local.session = self.session()
+        return session
+    
+    @property
+    def working_memory(self) -> WorkingMemory:
+        """Working memory của session gần nhất trong thread hiện tại"""
+        return self._current_session().working_memory
+    
+    @property
+    def inference_trace(self) -> TraceLog:
+        """Trace của session gần nhất trong thread hiện tại"""
+        return self._current_session().inference_trace
+    
+    def reset(self):
+        """Reset engine về trạng thái ban đầu (bỏ session của thread hiện tại)"""
+        self._local.session = None
+    
+    def set_conflict_resolution(self, strategy: str):
+        """
+        Đặt chiến lược giải quyết xung đột
         
-        if verbose and 'inference_trace' in result:
-            lines.append(f"\n🔍 TRACE SUY DIỄN CHI TIẾT:")
-            for trace_line in result['inference_trace']:
-                lines.append(f"   {trace_line}")
+        Args:
+            strategy: 'priority', 'severity', hoặc 'recency'
+        """
+        strategies = {
+            'priority': ConflictResolutionStrategy.priority_based,
+            'severity': ConflictResolutionStrategy.severity_based,
+            'recency': ConflictResolutionStrategy.recency_based
+        }
         
-        lines.append("="*80)
+        if strategy in strategies:
+            self.conflict_resolver = strategies[strategy]
+        else:
+            raise ValueError(f"Unknown strategy: {strategy}")
+    
+    # ------------------------------------------------------------------
+    # Chạy suy diễn: mỗi lần run dùng một session mới
+    # ------------------------------------------------------------------
+    
+    def run(self, patient_data: PatientData) -> Dict:
+        """Chạy forward chaining với dữ liệu bệnh nhân (xem InferenceSession.run)"""
+        return self._new_session().run(patient_data)
+    
+    def run_from_dict(self, facts: Dict) -> Dict:
+        """Chạy forward chaining với dictionary (xem InferenceSession.run_from_dict)"""
+        return self._new_session().run_from_dict(facts)
+    
+    def run_legacy(self, patient_data: PatientData) -> Dict:
+        """Phiên bản cũ single-step (xem InferenceSession.run_legacy)"""
+        return self._new_session().run_legacy(patient_data)
+    
+    # ------------------------------------------------------------------
+    # Chạy từng bước: thao tác trên session gần nhất của thread hiện tại
+    # ------------------------------------------------------------------
+    
+    def load_facts(self, patient_data: PatientData):
+        self._current_session().load_facts(patient_data)
+    
+    def load_facts_from_dict(self, facts: Dict):
+        self._current_session().load_facts_from_dict(facts)
+    
+    def match_phase(self) -> List[Rule]:
+        return self._current_session().match_phase()
+    
+    def conflict_resolution(self, matched_rules: List[Rule]) -> Optional[Rule]:
+        return self._current_session().conflict_resolution(matched_rules)
+    
+    def execute_phase(self, selected_rule: Rule) -> Dict:
+        return self._current_session().execute_phase(selected_rule)
+    
+    def forward_chaining_cycle(self, max_iterations: int = 10) -> bool:
+        return self._current_session().forward_chaining_cycle(max_iterations)
+    
+    def explain(self, verbose: bool = False, result: Optional[Dict] = None) -> str:
+        """
+        Giải thích kết quả suy diễn
         
-        return "\n".join(lines)
+        Args:
+            verbose: Hiển thị chi tiết trace hay không
+            result: Kết quả cần giải thích (None: lần chạy gần nhất của thread này)
+            
+        Returns:
+            Chuỗi giải thích
+        """
+        if result is None:
+            session = getattr(self._local, 'session', None)
+            result = session.result if session is not None else None
+        return explain_result(result, verbose)
     
     def get_knowledge_base_stats(self) -> Dict:
         """Lấy thống kê về knowledge base"""
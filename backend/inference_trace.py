@@ -0,0 +1,165 @@
+"""
+Inference Trace - Ghi vết quá trình suy diễn của InferenceEngine
+Lưu sự kiện có cấu trúc, chỉ format thành chuỗi khi có người đọc
+
+Mỗi sự kiện là tuple (thời điểm monotonic, mã sự kiện, rule_id, args).
+Mức ghi vết:
+- off: không ghi gì
+- summary: chỉ các mốc chính (bắt đầu/kết thúc, rule được fire, kết luận)
+- full: toàn bộ sự kiện (mỗi vòng lặp, mỗi rule tìm thấy...)
+"""
+
+import time
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+TRACE_LEVELS = ('off', 'summary', 'full')
+
+
+# ============================================================================
+# MÃ SỰ KIỆN
+# ============================================================================
+
+LOADED = 'loaded'
+LOADED_DICT = 'loaded_dict'
+MATCH_START = 'match_start'
+MATCHED = 'matched'
+MATCH_DONE = 'match_done'
+NOTHING_TO_RESOLVE = 'nothing_to_resolve'
+SELECTED = 'selected'
+FIRED = 'fired'
+CYCLE_START = 'cycle_start'
+INITIAL_FACTS = 'initial_facts'
+ITERATION = 'iteration'
+GOAL_REACHED = 'goal_reached'
+FOUND_INTERMEDIATE = 'found_intermediate'
+FOUND_CONCLUSION = 'found_conclusion'
+NO_APPLICABLE = 'no_applicable'
+FIRE_INTERMEDIATE = 'fire_intermediate'
+DERIVED = 'derived'
+TOTAL_FACTS = 'total_facts'
+DEGREE_SELECTED = 'degree_selected'
+FIRE_CONCLUSION = 'fire_conclusion'
+CONCLUSION = 'conclusion'
+MAX_ITERATIONS = 'max_iterations'
+STARTED = 'started'
+STARTED_DICT = 'started_dict'
+STARTED_LEGACY = 'started_legacy'
+COMPLETED = 'completed'
+COMPLETED_LEGACY = 'completed_legacy'
+
+# Mẫu hiển thị: {rule} là rule_id, {0}, {1}... là args của sự kiện
+TRACE_MESSAGES = {
+    LOADED: "Loaded {0} facts into working memory",
+    LOADED_DICT: "Loaded {0} facts from dictionary",
+    MATCH_START: "Starting match phase with {0} rules",
+    MATCHED: "  ✓ Matched: {rule} (Độ {0}, P:{1})",
+    MATCH_DONE: "Match phase complete: {0} rules matched",
+    NOTHING_TO_RESOLVE: "No rules to resolve",
+    SELECTED: "Selected rule: {rule} (Độ {0}, P:{1})",
+    FIRED: "Fired rule: {rule}",
+    CYCLE_START: "=== Starting Forward Chaining Cycle ===",
+    INITIAL_FACTS: "Initial facts: {0} facts",
+    ITERATION: "\n--- Iteration {0} ---",
+    GOAL_REACHED: "✓ Goal reached: final_degree = {0}",
+    FOUND_INTERMEDIATE: "  Found applicable intermediate rule: {rule}",
+    FOUND_CONCLUSION: "  Found applicable conclusion rule: {rule}",
+    NO_APPLICABLE: "No more applicable rules. Stopping.",
+    FIRE_INTERMEDIATE: "→ Firing intermediate rule: {rule}",
+    DERIVED: "  Derived facts: {0}",
+    TOTAL_FACTS: "  Total facts now: {0}",
+    DEGREE_SELECTED: "  Sequential selection: Found degree {0}, stopping search",
+    FIRE_CONCLUSION: "→ Firing conclusion rule: {rule}",
+    CONCLUSION: "  Conclusion: Degree = {0}",
+    MAX_ITERATIONS: "⚠ Max iterations ({0}) reached",
+    STARTED: "=== Inference Engine Started (Multi-Step Forward Chaining) ===",
+    STARTED_DICT: "=== Inference Engine Started (from dict, Multi-Step FC) ===",
+    STARTED_LEGACY: "=== Inference Engine Started (Legacy Single-Step) ===",
+    COMPLETED: "=== Inference Engine Completed ===",
+    COMPLETED_LEGACY: "=== Inference Engine Completed (Legacy) ===",
+}
+
+# Các sự kiện được ghi ở mức summary
+SUMMARY_EVENTS = frozenset({
+    SELECTED, FIRED, GOAL_REACHED, NO_APPLICABLE,
+    FIRE_INTERMEDIATE, FIRE_CONCLUSION, MAX_ITERATIONS,
+    STARTED, STARTED_DICT, STARTED_LEGACY, COMPLETED, COMPLETED_LEGACY,
+})
+
+TraceEvent = Tuple[float, str, Optional[str], Tuple[Any, ...]]
+
+
+# ============================================================================
+# TRACE LOG
+# ============================================================================
+
+class TraceLog(Sequence):
+    """
+    Danh sách sự kiện suy diễn, đọc như một list các dòng trace dạng chuỗi
+
+    Dòng chỉ được format khi truy cập (iterate, index, lines()). Giờ hiển thị
+    được tính từ mốc (wall clock, monotonic) lúc tạo log.
+    """
+
+    def __init__(self, level: str = 'full', events: Optional[List[TraceEvent]] = None,
+                 anchor: Optional[Tuple[float, float]] = None):
+        """
+        Args:
+            level: Mức ghi vết ('off', 'summary', 'full')
+            events: Danh sách sự kiện có sẵn (dùng cho snapshot)
+            anchor: Mốc thời gian (time.time(), time.monotonic())
+        """
+        if level not in TRACE_LEVELS:
+            raise ValueError(f"Unknown trace level: {level}")
+
+        self.level = level
+        self.events = [] if events is None else events
+        self.anchor = anchor or (time.time(), time.monotonic())
+
+    def wants(self, code: str) -> bool:
+        """Sự kiện này có được ghi ở mức hiện tại không?"""
+        if self.level == 'full':
+            return True
+        return self.level == 'summary' and code in SUMMARY_EVENTS
+
+    def record(self, code: str, rule_id: Optional[str] = None, args: Tuple = ()):
+        """Ghi một sự kiện (không format gì cả)"""
+        if self.wants(code):
+            self.events.append((time.monotonic(), code, rule_id, args))
+
+    def render(self, event: TraceEvent) -> str:
+        """Format một sự kiện thành dòng trace '[HH:MM:SS.mmm] message'"""
+        timestamp, code, rule_id, args = event
+        wall, monotonic = self.anchor
+        clock = datetime.fromtimestamp(wall + (timestamp - monotonic))
+        message = TRACE_MESSAGES[code].format(*args, rule=rule_id)
+        return f"[{clock.strftime('%H:%M:%S.%f')[:-3]}] {message}"
+
+    def lines(self) -> List[str]:
+        """Toàn bộ trace dạng list chuỗi (dùng khi trả về JSON)"""
+        return [self.render(event) for event in self.events]
+
+    def snapshot(self) -> 'TraceLog':
+        """Bản sao các sự kiện hiện có (không format), không bị ảnh hưởng khi log ghi tiếp"""
+        return TraceLog(self.level, list(self.events), self.anchor)
+
+    def clear(self):
+        """Xóa sự kiện và đặt lại mốc thời gian"""
+        self.events = []
+        self.anchor = (time.time(), time.monotonic())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.render(event) for event in self.events[index]]
+        return self.render(self.events[index])
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def __iter__(self):
+        for event in self.events:
+            yield self.render(event)
+
+    def __repr__(self) -> str:
+        return f"TraceLog(level={self.level!r}, events={len(self.events)})"
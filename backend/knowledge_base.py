@@ -8,8 +8,9 @@ Chứa:
 - Knowledge Base: Quản lý tập luật
 """
 
+import operator
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Callable
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
 from enum import Enum
 
 
@@ -180,14 +181,55 @@ class PatientData:
 # RULES - Tri thức y khoa
 # ============================================================================
 
-@dataclass
+def _is_in(field_value, value) -> bool:
+    return field_value in value
+
+
+def _is_not_in(field_value, value) -> bool:
+    return field_value not in value
+
+
+def _never(field_value, value) -> bool:
+    """Operator không hỗ trợ: điều kiện không bao giờ thỏa mãn"""
+    return False
+
+
+# Bảng operator → hàm so sánh (field_value, value); giữ nguyên ngữ nghĩa so sánh
+# Python (không ép kiểu), lỗi so sánh khác kiểu vẫn được raise như trước
+CONDITION_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': _is_in,
+    'not_in': _is_not_in,
+}
+
+
+@dataclass(frozen=True, slots=True)
 class Condition:
     """
     Một điều kiện trong luật
+    
+    Bất biến; operator được tra bảng một lần khi khởi tạo.
+    So sánh theo giá trị nhưng không hash được (value có thể là list), như bản
+    @dataclass gốc.
     """
     field: str
     operator: str  # '<', '<=', '>', '>=', '==', '!=', 'in', 'not_in'
     value: Any
+    _compare: Callable[[Any, Any], bool] = field(
+        init=False, repr=False, compare=False
+    )
+    
+    # frozen=True sẽ sinh __hash__ theo fields: hash(Condition(..., value=[...])) lỗi
+    # trong khi value khác thì không; giữ ngữ nghĩa gốc là không hash được
+    __hash__ = None
+    
+    def __post_init__(self):
+        object.__setattr__(self, '_compare', CONDITION_OPERATORS.get(self.operator, _never))
     
     def evaluate(self, data: Dict) -> bool:
         """
@@ -203,47 +245,33 @@ class Condition:
         if self.field not in data:
             return False
         
-        field_value = data[self.field]
-        
-        # Đánh giá theo operator
-        if self.operator == '==':
-            return field_value == self.value
-        elif self.operator == '!=':
-            return field_value != self.value
-        elif self.operator == '<':
-            return field_value < self.value
-        elif self.operator == '<=':
-            return field_value <= self.value
-        elif self.operator == '>':
-            return field_value > self.value
-        elif self.operator == '>=':
-            return field_value >= self.value
-        elif self.operator == 'in':
-            return field_value in self.value
-        elif self.operator == 'not_in':
-            return field_value not in self.value
-        else:
-            return False
+        return self._compare(data[self.field], self.value)
     
     def __str__(self) -> str:
         return f"{self.field} {self.operator} {self.value}"
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Rule:
     """
     Luật chẩn đoán
     Tương tự như Rule trong COPD system với decorator @Rule
     
     Cấu trúc: IF (conditions) THEN (conclusion)
+    Bất biến; conditions được lưu dưới dạng tuple. Không hash được (như Condition).
     """
     rule_id: str
     degree: str
     priority: int
-    conditions: List[Condition]
+    conditions: Sequence[Condition]
     description: str = ""
     source: str = ""
     
+    __hash__ = None
+    
+    def __post_init__(self):
+        object.__setattr__(self, 'conditions', tuple(self.conditions))
+    
     def match(self, data: Dict) -> bool:
         """
         Kiểm tra xem rule có match với dữ liệu không
@@ -255,7 +283,10 @@ class Rule:
         Returns:
             True nếu tất cả conditions đều thỏa mãn
         """
-        return all(cond.evaluate(data) for cond in self.conditions)
+        for cond in self.conditions:
+            if not cond.evaluate(data):
+                return False
+        return True
     
     def fire(self) -> Dict:
         """
@@ -282,33 +313,47 @@ class Rule:
         return f"Rule({self.rule_id}, Độ {self.degree}, P:{self.priority})"
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class IntermediateRule:
     """
     Luật trung gian - Tạo sự kiện suy diễn mới
     
     Cấu trúc: IF (conditions) THEN (assert new_facts)
     Ví dụ: IF (hr_no_fever > 150 AND age_months < 12) THEN (tachycardia_for_age = True)
+    Bất biến; conditions được lưu dưới dạng tuple. Không hash được (như Condition).
     """
     rule_id: str
     priority: int
-    conditions: List[Condition]
+    conditions: Sequence[Condition]
     derived_facts: Dict[str, Any]  # Facts mới được tạo ra
     description: str = ""
     
+    __hash__ = None
+    
+    def __post_init__(self):
+        object.__setattr__(self, 'conditions', tuple(self.conditions))
+    
     def match(self, data: Dict) -> bool:
         """Kiểm tra xem rule có match với dữ liệu không"""
-        return all(cond.evaluate(data) for cond in self.conditions)
+        for cond in self.conditions:
+            if not cond.evaluate(data):
+                return False
+        return True
     
-    def fire(self, working_memory: Dict) -> Dict:
+    def fire(self, working_memory: Optional[Dict] = None) -> Dict:
         """
         Kích hoạt rule và thêm facts mới vào working memory
         
+        Args:
+            working_memory: Dict facts cần cập nhật. None nếu người gọi tự thêm
+                            derived facts (InferenceEngine dùng add_derived_facts)
+        
         Returns:
             Dictionary chứa thông tin về rule đã fire và facts mới
         """
         # Thêm derived facts vào working memory
-        working_memory.update(self.derived_facts)
+        if working_memory is not None:
+            working_memory.update(self.derived_facts)
         
         return {
             'rule_id': self.rule_id,
@@ -339,11 +384,41 @@ class KnowledgeBase:
     """
     
     def __init__(self):
-        self.rules: List[Rule] = []                      # Rules kết luận cuối cùng
-        self.intermediate_rules: List[IntermediateRule] = []  # Rules tạo facts mới
+        self._init_storage()
         self._initialize_rules()
         self._initialize_intermediate_rules()
     
+    @classmethod
+    def from_rules(cls, rules: Iterable[Rule],
+                   intermediate_rules: Iterable[IntermediateRule] = ()) -> 'KnowledgeBase':
+        """
+        Tạo knowledge base từ các rules có sẵn (không nạp bộ luật mặc định)
+        
+        Args:
+            rules: Rules kết luận
+            intermediate_rules: Rules trung gian
+        """
+        kb = cls.__new__(cls)
+        kb._init_storage()
+        kb.bulk_load(rules, intermediate_rules)
+        return kb
+    
+    def _init_storage(self):
+        """Khởi tạo danh sách rules rỗng và các index"""
+        self.rules: List[Rule] = []                      # Rules kết luận cuối cùng
+        self.intermediate_rules: List[IntermediateRule] = []  # Rules tạo facts mới
+        
+        # Index tra cứu O(1), cập nhật trong add_rule / add_intermediate_rule
+        self._rules_by_id: Dict[str, Rule] = {}
+        self._intermediate_by_id: Dict[str, IntermediateRule] = {}
+        self._rules_by_degree: Dict[str, List[Rule]] = {}
+        self._count_by_degree: Dict[str, int] = {}
+        self._count_by_priority: Dict[int, int] = {}
+        # Số rules đã được index (phát hiện rules thêm trực tiếp vào list)
+        self._indexed_rules = 0
+        self._indexed_intermediate_rules = 0
+        self._frozen = False
+    
     def _initialize_intermediate_rules(self):
         """
         Khởi tạo các luật trung gian (Intermediate Rules)
@@ -856,49 +931,121 @@ class KnowledgeBase:
             source='QĐ 292/2015 - II.3 (Độ 1)'
         ))
     
+    def freeze(self) -> 'KnowledgeBase':
+        """
+        Khóa knowledge base (rules chuyển thành tuple, không thêm rules được nữa)
+        
+        KB đã freeze có thể dùng chung giữa nhiều engine/thread mà không cần lock.
+        
+        Returns:
+            Chính knowledge base này
+        """
+        if not self._frozen:
+            self._ensure_indexes()
+            self.rules = tuple(self.rules)
+            self.intermediate_rules = tuple(self.intermediate_rules)
+            self._frozen = True
+        return self
+    
+    @property
+    def frozen(self) -> bool:
+        """Knowledge base đã bị khóa (freeze) chưa"""
+        return self._frozen
+    
+    def _check_mutable(self):
+        if self._frozen:
+            raise TypeError("Knowledge base đã freeze, không thể thêm rules")
+    
     def add_rule(self, rule: Rule):
         """Thêm một luật vào knowledge base"""
+        self._check_mutable()
+        self._ensure_indexes()
         self.rules.append(rule)
+        self._index_rule(rule)
     
     def add_intermediate_rule(self, rule: IntermediateRule):
         """Thêm một luật trung gian vào knowledge base"""
+        self._check_mutable()
+        self._ensure_indexes()
         self.intermediate_rules.append(rule)
+        self._index_intermediate_rule(rule)
+    
+    def bulk_load(self, rules: Iterable[Rule] = (),
+                  intermediate_rules: Iterable[IntermediateRule] = ()):
+        """
+        Thêm nhiều rules một lần, index được cập nhật một lượt sau khi thêm
+        
+        Args:
+            rules: Rules kết luận
+            intermediate_rules: Rules trung gian
+        """
+        self._check_mutable()
+        self.rules.extend(rules)
+        self.intermediate_rules.extend(intermediate_rules)
+        self._ensure_indexes()
+    
+    def _index_rule(self, rule: Rule):
+        """Cập nhật index và thống kê cho một rule kết luận"""
+        # Trùng ID: giữ rule thêm vào trước (giống tìm tuần tự)
+        self._rules_by_id.setdefault(rule.rule_id, rule)
+        self._rules_by_degree.setdefault(rule.degree, []).append(rule)
+        self._count_by_degree[rule.degree] = self._count_by_degree.get(rule.degree, 0) + 1
+        self._count_by_priority[rule.priority] = self._count_by_priority.get(rule.priority, 0) + 1
+        self._indexed_rules += 1
+    
+    def _index_intermediate_rule(self, rule: IntermediateRule):
+        """Cập nhật index cho một rule trung gian"""
+        self._intermediate_by_id.setdefault(rule.rule_id, rule)
+        self._indexed_intermediate_rules += 1
+    
+    def _ensure_indexes(self):
+        """Index các rules được thêm trực tiếp vào self.rules / self.intermediate_rules"""
+        if self._indexed_rules != len(self.rules):
+            if self._indexed_rules > len(self.rules):
+                # List bị xóa/thay thế: dựng lại từ đầu
+                self._reindex()
+                return
+            for rule in self.rules[self._indexed_rules:]:
+                self._index_rule(rule)
+        
+        if self._indexed_intermediate_rules != len(self.intermediate_rules):
+            if self._indexed_intermediate_rules > len(self.intermediate_rules):
+                self._reindex()
+                return
+            for rule in self.intermediate_rules[self._indexed_intermediate_rules:]:
+                self._index_intermediate_rule(rule)
+    
+    def _reindex(self):
+        """Dựng lại toàn bộ index từ danh sách rules"""
+        rules, intermediate_rules = self.rules, self.intermediate_rules
+        self._init_storage()
+        self.rules, self.intermediate_rules = rules, intermediate_rules
+        self._ensure_indexes()
     
     def get_rule(self, rule_id: str) -> Optional[Rule]:
         """Lấy rule theo ID"""
-        for rule in self.rules:
-            if rule.rule_id == rule_id:
-                return rule
-        return None
+        self._ensure_indexes()
+        return self._rules_by_id.get(rule_id)
     
     def get_intermediate_rule(self, rule_id: str) -> Optional[IntermediateRule]:
         """Lấy intermediate rule theo ID"""
-        for rule in self.intermediate_rules:
-            if rule.rule_id == rule_id:
-                return rule
-        return None
+        self._ensure_indexes()
+        return self._intermediate_by_id.get(rule_id)
     
     def get_rules_by_degree(self, degree: str) -> List[Rule]:
         """Lấy tất cả rules của một độ bệnh"""
-        return [r for r in self.rules if r.degree == degree]
+        self._ensure_indexes()
+        return list(self._rules_by_degree.get(degree, ()))
     
     def get_statistics(self) -> Dict:
         """Thống kê về knowledge base"""
-        stats = {
+        self._ensure_indexes()
+        return {
             'total_rules': len(self.rules),
             'total_intermediate_rules': len(self.intermediate_rules),
-            'by_degree': {},
-            'by_priority': {}
+            'by_degree': dict(self._count_by_degree),
+            'by_priority': dict(self._count_by_priority)
         }
-        
-        for rule in self.rules:
-            # Đếm theo degree
-            stats['by_degree'][rule.degree] = stats['by_degree'].get(rule.degree, 0) + 1
-            
-            # Đếm theo priority
-            stats['by_priority'][rule.priority] = stats['by_priority'].get(rule.priority, 0) + 1
-        
-        return stats
     
     def __len__(self) -> int:
         return len(self.rules) + len(self.intermediate_rules)
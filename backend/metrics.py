@@ -0,0 +1,287 @@
+"""
+Metrics - Bộ đếm theo rule và histogram thời gian xử lý, xuất dạng Prometheus text
+
+Chứa:
+- RuleCounters: số lần đánh giá / match / fire của từng rule trong một engine
+  (mỗi thread ghi vào shard riêng, không cần lock; cộng lại khi scrape)
+- Histogram: phân bố thời gian theo bucket cố định (giây)
+- MetricsRegistry: gom các bộ đếm + histogram theo phase và theo route HTTP
+- get_default_metrics: registry mặc định của process (None nếu HFMD_METRICS=0)
+
+Khi tắt (engine tạo với metrics=None) không có predicate nào bị bọc và
+không có bộ đếm nào được cập nhật.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Bucket thời gian (giây): từ 10µs (một lần đánh giá rules) tới 5s (batch lớn)
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+# Chỉ số trong shard của RuleCounters
+EVALUATIONS, MATCHES, FIRES = 0, 1, 2
+RULE_METRICS = (
+    ('hfmd_rule_evaluations_total', 'Số lần rule được đánh giá với dữ liệu bệnh nhân'),
+    ('hfmd_rule_matches_total', 'Số lần rule match'),
+    ('hfmd_rule_fires_total', 'Số lần rule được chọn làm kết luận (fire)'),
+)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+# ============================================================================
+# RULE COUNTERS
+# ============================================================================
+
+class RuleCounters:
+    """
+    Bộ đếm evaluations / matches / fires cho các rules của một engine
+
+    Mỗi thread có một shard (3 list int theo vị trí rule) nên tăng bộ đếm chỉ là
+    `shard[k][i] += 1`, không lock; totals() cộng các shard khi scrape.
+    """
+
+    def __init__(self, engine: str, rule_ids: Iterable[str]):
+        self.engine = engine
+        self.rule_ids = list(rule_ids)
+        self.position = {rule_id: i for i, rule_id in enumerate(self.rule_ids)}
+        self._local = threading.local()
+        self._shards: List[Tuple[List[int], List[int], List[int]]] = []
+        self._lock = threading.Lock()
+
+    def shard(self) -> Tuple[List[int], List[int], List[int]]:
+        """Shard của thread hiện tại (tạo khi thread ghi lần đầu)"""
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            size = len(self.rule_ids)
+            shard = ([0] * size, [0] * size, [0] * size)
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def add(self, kind: int, rule_ids: Iterable[str], amount: int = 1):
+        """Tăng bộ đếm `kind` (EVALUATIONS/MATCHES/FIRES) cho các rule theo id"""
+        counts = self.shard()[kind]
+        position = self.position
+        for rule_id in rule_ids:
+            i = position.get(rule_id)
+            if i is not None:
+                counts[i] += amount
+
+    def add_all(self, kind: int, amount: int = 1):
+        """Tăng bộ đếm `kind` cho mọi rule (vd. batch đánh giá mọi rule trên mọi record)"""
+        counts = self.shard()[kind]
+        for i in range(len(counts)):
+            counts[i] += amount
+
+    def reset(self):
+        """Đưa mọi bộ đếm về 0 (giữ nguyên danh sách rules)"""
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for counts in shard:
+                counts[:] = [0] * len(counts)
+
+    def totals(self) -> Tuple[List[int], List[int], List[int]]:
+        size = len(self.rule_ids)
+        totals = ([0] * size, [0] * size, [0] * size)
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for kind in (EVALUATIONS, MATCHES, FIRES):
+                column = totals[kind]
+                for i, value in enumerate(shard[kind]):
+                    column[i] += value
+        return totals
+
+
+def counting_predicate(predicate: Callable[[Dict], bool], counters: RuleCounters,
+                       position: int) -> Callable[[Dict], bool]:
+    """Bọc predicate đã biên dịch: mỗi lần gọi tăng evaluations, khi True tăng matches"""
+    def counted(patient_data):
+        shard = counters.shard()
+        shard[EVALUATIONS][position] += 1
+        if predicate(patient_data):
+            shard[MATCHES][position] += 1
+            return True
+        return False
+    return counted
+
+
+# ============================================================================
+# HISTOGRAM
+# ============================================================================
+
+class Histogram:
+    """Histogram bucket cố định (giá trị tính bằng giây)"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Phần tử cuối: +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """(số đếm tích lũy theo bucket, tổng, số lần)"""
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = []
+        running = 0
+        for value in counts:
+            running += value
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+# ============================================================================
+# REGISTRY
+# ============================================================================
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """Các bộ đếm và histogram của process, render ra Prometheus text format"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.started_at = time.time()
+        self._rule_counters: Dict[str, RuleCounters] = {}
+        self._phase_histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._route_histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._route_requests: Dict[Tuple[str, str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def rule_counters(self, engine: str, rule_ids: Iterable[str]) -> RuleCounters:
+        """
+        Bộ đếm cho các rules của một engine (mọi rule hiện với giá trị 0 ngay từ đầu,
+        nên rule chưa bao giờ fire vẫn thấy được)
+        """
+        with self._lock:
+            counters = RuleCounters(engine, rule_ids)
+            self._rule_counters[engine] = counters
+        return counters
+
+    def _histogram(self, table: Dict, key: Tuple[str, str]) -> Histogram:
+        histogram = table.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = table.setdefault(key, Histogram(self.buckets))
+        return histogram
+
+    def observe_phase(self, engine: str, phase: str, seconds: float):
+        """Thời gian một phase suy diễn (match, build_result, execute...)"""
+        self._histogram(self._phase_histograms, (engine, phase)).observe(seconds)
+
+    def observe_request(self, route: str, method: str, status: int, seconds: float):
+        """Thời gian xử lý một request HTTP theo route"""
+        self._histogram(self._route_histograms, (route, method)).observe(seconds)
+        key = (route, method, str(status))
+        with self._lock:
+            self._route_requests[key] = self._route_requests.get(key, 0) + 1
+
+    def reset(self):
+        """Xóa số liệu đã thu (vd. sau warm-up), giữ các rules đã đăng ký"""
+        with self._lock:
+            counters = list(self._rule_counters.values())
+            self._phase_histograms.clear()
+            self._route_histograms.clear()
+            self._route_requests.clear()
+        for counter in counters:
+            counter.reset()
+
+    def render_prometheus(self) -> str:
+        """Toàn bộ metrics dạng Prometheus text exposition format 0.0.4"""
+        lines = []
+
+        with self._lock:
+            counters = list(self._rule_counters.values())
+            phases = sorted(self._phase_histograms.items())
+            routes = sorted(self._route_histograms.items())
+            requests = sorted(self._route_requests.items())
+
+        totals = [(counter, counter.totals()) for counter in counters]
+        for kind, (name, help_text) in enumerate(RULE_METRICS):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for counter, values in totals:
+                for rule_id, value in zip(counter.rule_ids, values[kind]):
+                    lines.append(f'{name}{{{_labels((("engine", counter.engine), ("rule", rule_id)))}}} {value}')
+
+        self._render_histograms(
+            lines, 'hfmd_phase_duration_seconds', 'Thời gian từng phase suy diễn (giây)',
+            (((('engine', engine), ('phase', phase)), histogram) for (engine, phase), histogram in phases)
+        )
+        self._render_histograms(
+            lines, 'hfmd_http_request_duration_seconds', 'Thời gian xử lý request theo route (giây)',
+            (((('route', route), ('method', method)), histogram) for (route, method), histogram in routes)
+        )
+
+        lines.append('# HELP hfmd_http_requests_total Số request theo route và status')
+        lines.append('# TYPE hfmd_http_requests_total counter')
+        for (route, method, status), value in requests:
+            labels = _labels((('route', route), ('method', method), ('status', status)))
+            lines.append(f'hfmd_http_requests_total{{{labels}}} {value}')
+
+        lines.append('# HELP hfmd_metrics_start_time_seconds Thời điểm bắt đầu thu thập metrics')
+        lines.append('# TYPE hfmd_metrics_start_time_seconds gauge')
+        lines.append(f'hfmd_metrics_start_time_seconds {_number(self.started_at)}')
+        return '\n'.join(lines) + '\n'
+
+    def _render_histograms(self, lines: List[str], name: str, help_text: str, entries):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for pairs, histogram in entries:
+            cumulative, total, count = histogram.snapshot()
+            for bound, value in zip(histogram.buckets, cumulative):
+                lines.append(f'{name}_bucket{{{_labels(pairs + (("le", _number(bound)),))}}} {value}')
+            lines.append(f'{name}_bucket{{{_labels(pairs + (("le", "+Inf"),))}}} {cumulative[-1]}')
+            lines.append(f'{name}_sum{{{_labels(pairs)}}} {_number(total)}')
+            lines.append(f'{name}_count{{{_labels(pairs)}}} {count}')
+
+
+_default_metrics: Optional[MetricsRegistry] = None
+_default_metrics_lock = threading.Lock()
+
+
+def metrics_enabled() -> bool:
+    """Bật/tắt thu thập metrics qua biến môi trường HFMD_METRICS (mặc định bật)"""
+    return os.environ.get('HFMD_METRICS', '1') != '0'
+
+
+def get_default_metrics() -> Optional[MetricsRegistry]:
+    """Registry metrics dùng chung trong process, None nếu đã tắt (HFMD_METRICS=0)"""
+    global _default_metrics
+    if not metrics_enabled():
+        return None
+    if _default_metrics is None:
+        with _default_metrics_lock:
+            if _default_metrics is None:
+                _default_metrics = MetricsRegistry()
+    return _default_metrics
@@ -0,0 +1,113 @@
+"""
+NDJSON Stream - Parse body NDJSON theo từng chunk (không đọc cả body vào bộ nhớ)
+Dùng cho /api/grade/stream (WSGI và ASGI)
+
+- NDJSONDecoder: nhận từng chunk bytes, trả ra các record đã đủ dòng;
+  bộ đệm không vượt quá max_line_size (dòng dài hơn bị báo lỗi và bỏ qua)
+- iter_ndjson: đọc từng dòng từ file-like (request.stream của WSGI) qua NDJSONDecoder
+- grade_rows: chấm 2 giai đoạn từng record, trả ra các dòng NDJSON kết quả
+"""
+
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from bulk_grading import InputRow, parse_json_line, result_row
+from data_store import dumps_json
+
+# Kích thước tối đa của một dòng (một bệnh nhân)
+MAX_LINE_SIZE = 64 * 1024
+
+
+class NDJSONDecoder:
+    """Parser NDJSON tăng dần: feed() từng chunk, close() khi hết body"""
+
+    def __init__(self, max_line_size: int = MAX_LINE_SIZE):
+        self.max_line_size = max_line_size
+        self.buffer = bytearray()
+        self.line_no = 0
+        self.skipping = False  # Đang bỏ qua phần còn lại của một dòng quá dài
+
+    def feed(self, data: bytes) -> List[InputRow]:
+        """Thêm một chunk, trả về các record của những dòng đã kết thúc"""
+        rows = []
+        start = 0
+        while True:
+            end = data.find(b'\n', start)
+            if end < 0:
+                break
+            self._append(data[start:end], rows)
+            self._end_line(rows)
+            start = end + 1
+        self._append(data[start:], rows)
+        return rows
+
+    def close(self) -> List[InputRow]:
+        """Hết body: dòng cuối không có '\\n' vẫn được parse"""
+        rows = []
+        self._end_line(rows)
+        return rows
+
+    def _append(self, part: bytes, rows: List[InputRow]):
+        if self.skipping or not part:
+            return
+        if len(self.buffer) + len(part) > self.max_line_size:
+            self.buffer.clear()
+            self.skipping = True
+            rows.append((self.line_no + 1, None,
+                         f'Dòng vượt quá {self.max_line_size} byte'))
+            return
+        self.buffer += part
+
+    def _end_line(self, rows: List[InputRow]):
+        if self.skipping:
+            self.line_no += 1
+            self.skipping = False
+            return
+        line = bytes(self.buffer)
+        self.buffer.clear()
+        self.line_no += 1
+        if line.strip():
+            rows.append(parse_json_line(self.line_no, line))
+
+
+def iter_ndjson(readline: Callable[[int], bytes],
+                max_line_size: int = MAX_LINE_SIZE) -> Iterator[InputRow]:
+    """
+    Đọc records từ hàm readline(n) của một stream (ví dụ request.stream.readline)
+
+    Đọc từng dòng thay vì read(n): read(n) của WSGI server chờ đủ n byte, còn
+    readline trả về ngay khi dòng kết thúc, nên record được chấm trong lúc
+    client vẫn đang gửi phần sau của body.
+    """
+    decoder = NDJSONDecoder(max_line_size)
+    while True:
+        data = readline(max_line_size + 1)
+        if not data:
+            break
+        yield from decoder.feed(data)
+    yield from decoder.close()
+
+
+def grade_row(grade: Callable, row: InputRow, id_field: Optional[str] = None,
+              summary: bool = False) -> bytes:
+    """
+    Chấm một record, trả về một dòng NDJSON (cùng định dạng với bulk_grading)
+
+    Args:
+        grade: Hàm chấm 2 giai đoạn, ví dụ EngineRegistry.grade
+    """
+    line_no, record, error = row
+    record_id = record.get(id_field) if record and id_field else None
+    diagnosis = classification = None
+    if error is None:
+        try:
+            diagnosis, classification = grade(record)
+        except Exception as e:
+            error = str(e)
+    return dumps_json(result_row(line_no, record_id, diagnosis, classification, error, summary))
+
+
+def grade_rows(grade: Callable, rows: Iterable[InputRow], id_field: Optional[str] = None,
+               summary: bool = False) -> Iterator[bytes]:
+    """Chấm lần lượt từng record khi nó tới, trả ra từng dòng kết quả"""
+    for row in rows:
+        yield grade_row(grade, row, id_field, summary)
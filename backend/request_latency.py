@@ -0,0 +1,378 @@
+"""
+Request Latency - Đo thời gian xử lý từng request ngay trong process (không cần APM)
+
+Chứa:
+- LogSketch: sketch phân vị bucket theo log (sai số tương đối ≤ 1%), bộ nhớ bị chặn
+  bởi số bucket, không phụ thuộc số request
+- RollingSketch: vòng các sketch theo khoảng thời gian, gộp lại cho cửa sổ 1m/5m/15m
+- LatencyTracker: wall time, CPU time, kích thước response theo route → p50/p90/p99
+- LatencyMiddleware: WSGI middleware ghi số liệu cho mỗi request (kể cả response streaming)
+- install_dump_signal: ghi snapshot ra file khi nhận SIGUSR1
+"""
+
+import json
+import math
+import os
+import signal
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Cửa sổ thời gian (giây) cho các phân vị và độ dài một ô của vòng sketch
+DEFAULT_WINDOWS = (60, 300, 900)
+SLOT_SECONDS = 10
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Nhãn route khi URL không khớp route nào (tránh số nhãn tăng theo URL rác)
+UNMATCHED = '<unmatched>'
+
+
+# ============================================================================
+# SKETCH
+# ============================================================================
+
+class LogSketch:
+    """
+    Sketch phân vị kiểu DDSketch: giá trị v > min_value rơi vào bucket
+    ceil(log_gamma(v)); giá trị đại diện của bucket sai lệch tối đa `accuracy`
+    (tương đối) so với mọi giá trị trong bucket. Giá trị ≤ min_value (vd. body
+    rỗng) gộp vào một bucket riêng (key None).
+
+    Số bucket tối đa log_gamma(max_value / min_value) nên bộ nhớ cố định.
+    """
+
+    __slots__ = ('gamma', 'log_gamma', 'min_value', 'max_index', 'buckets',
+                 'count', 'sum', 'min', 'max')
+
+    def __init__(self, accuracy: float = 0.01, min_value: float = 1e-6, max_value: float = 3600.0):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.max_index = math.ceil(math.log(max_value) / self.log_gamma)
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value: float) -> Optional[int]:
+        if value <= self.min_value:
+            return None
+        return min(math.ceil(math.log(value) / self.log_gamma), self.max_index)
+
+    def add(self, value: float):
+        index = self._index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'LogSketch'):
+        """Cộng số liệu của sketch khác (cùng accuracy) vào sketch này"""
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def clear(self):
+        self.buckets.clear()
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Giá trị ở phân vị q (0..1), None nếu chưa có dữ liệu"""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        # Bucket None (≤ min_value) đứng trước mọi bucket khác
+        for index in sorted(self.buckets, key=lambda i: -math.inf if i is None else i):
+            seen += self.buckets[index]
+            if seen > rank:
+                if index is None:
+                    return max(self.min, 0.0)
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+
+class RollingCounter:
+    """Bộ đếm theo vòng ô thời gian, cùng cách chia ô với RollingSketch"""
+
+    def __init__(self, slots: int, slot_seconds: float):
+        self.slot_seconds = slot_seconds
+        self.counts = [0] * slots
+        self.epochs = [-1] * slots
+
+    def add(self, now: float, amount: int = 1):
+        epoch = int(now // self.slot_seconds)
+        i = epoch % len(self.counts)
+        if self.epochs[i] != epoch:
+            self.counts[i] = 0
+            self.epochs[i] = epoch
+        self.counts[i] += amount
+
+    def window(self, seconds: float, now: float) -> int:
+        current = int(now // self.slot_seconds)
+        oldest = current - max(int(seconds // self.slot_seconds), 1) + 1
+        return sum(count for epoch, count in zip(self.epochs, self.counts)
+                   if oldest <= epoch <= current)
+
+
+class RollingSketch:
+    """
+    Vòng `slots` sketch, mỗi sketch giữ số liệu của một khoảng slot_seconds giây
+
+    Ô cũ được tái sử dụng (clear) khi vòng quay lại, nên bộ nhớ không tăng theo
+    thời gian chạy. Cửa sổ N giây = gộp các ô thuộc N giây gần nhất.
+    """
+
+    def __init__(self, slots: int, slot_seconds: float, **sketch_options):
+        self.slot_seconds = slot_seconds
+        self.sketches = [LogSketch(**sketch_options) for _ in range(slots)]
+        self.epochs = [-1] * slots
+        self.sketch_options = sketch_options
+
+    def add(self, value: float, now: float):
+        epoch = int(now // self.slot_seconds)
+        i = epoch % len(self.sketches)
+        if self.epochs[i] != epoch:
+            self.sketches[i].clear()
+            self.epochs[i] = epoch
+        self.sketches[i].add(value)
+
+    def window(self, seconds: float, now: float) -> LogSketch:
+        """Sketch gộp của `seconds` giây gần nhất (gồm cả ô hiện tại đang ghi)"""
+        current = int(now // self.slot_seconds)
+        oldest = current - max(int(seconds // self.slot_seconds), 1) + 1
+        merged = LogSketch(**self.sketch_options)
+        for epoch, sketch in zip(self.epochs, self.sketches):
+            if oldest <= epoch <= current:
+                merged.merge(sketch)
+        return merged
+
+
+# ============================================================================
+# TRACKER
+# ============================================================================
+
+def window_name(seconds: int) -> str:
+    return f'{seconds // 60}m' if seconds % 60 == 0 else f'{seconds}s'
+
+
+class RouteLatency:
+    """Số liệu của một route: wall time, CPU time (giây), kích thước response (byte)"""
+
+    def __init__(self, slots: int, slot_seconds: float):
+        time_options = {'min_value': 1e-6, 'max_value': 3600.0}
+        self.series = {
+            'wall': RollingSketch(slots, slot_seconds, **time_options),
+            'cpu': RollingSketch(slots, slot_seconds, **time_options),
+            'bytes': RollingSketch(slots, slot_seconds, min_value=1.0, max_value=2.0 ** 40),
+        }
+        self.errors = RollingCounter(slots, slot_seconds)  # Response 5xx
+        self.lock = threading.Lock()
+
+    def record(self, wall: float, cpu: float, size: int, failed: bool, now: float):
+        with self.lock:
+            self.series['wall'].add(wall, now)
+            self.series['cpu'].add(cpu, now)
+            self.series['bytes'].add(size, now)
+            if failed:
+                self.errors.add(now)
+
+    def summary(self, seconds: int, now: float) -> Optional[Dict]:
+        with self.lock:
+            sketches = {name: series.window(seconds, now) for name, series in self.series.items()}
+            errors = self.errors.window(seconds, now)
+        if sketches['wall'].count == 0:
+            return None
+
+        def quantiles(sketch: LogSketch, scale: float, digits: int) -> Dict:
+            values = {f'p{round(q * 100)}': sketch.quantile(q) for q in QUANTILES}
+            values['max'] = sketch.max
+            values['mean'] = sketch.sum / sketch.count
+            return {name: round(value * scale, digits) for name, value in values.items()}
+
+        return {
+            'count': sketches['wall'].count,
+            'errors': errors,
+            'wall_ms': quantiles(sketches['wall'], 1000, 3),
+            'cpu_ms': quantiles(sketches['cpu'], 1000, 3),
+            'bytes': quantiles(sketches['bytes'], 1, 0),
+        }
+
+
+class LatencyTracker:
+    """Số liệu latency theo route ('METHOD /mẫu/url') trên các cửa sổ thời gian trượt"""
+
+    def __init__(self, windows: Tuple[int, ...] = DEFAULT_WINDOWS, slot_seconds: float = SLOT_SECONDS,
+                 clock: Callable[[], float] = time.time):
+        self.windows = tuple(sorted(windows))
+        self.slot_seconds = slot_seconds
+        self.slots = math.ceil(self.windows[-1] / slot_seconds)
+        self.clock = clock
+        self.started_at = clock()
+        self._routes: Dict[str, RouteLatency] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, wall: float, cpu: float, size: int, status: int):
+        stats = self._routes.get(route)
+        if stats is None:
+            with self._lock:
+                stats = self._routes.setdefault(route, RouteLatency(self.slots, self.slot_seconds))
+        stats.record(wall, cpu, size, status >= 500, self.clock())
+
+    def snapshot(self) -> Dict:
+        """p50/p90/p99/max/mean của từng route trên từng cửa sổ"""
+        now = self.clock()
+        with self._lock:
+            routes = sorted(self._routes.items())
+        windows = {}
+        for seconds in self.windows:
+            summaries = {}
+            for route, stats in routes:
+                summary = stats.summary(seconds, now)
+                if summary is not None:
+                    summaries[route] = summary
+            windows[window_name(seconds)] = summaries
+        return {
+            'pid': os.getpid(),
+            'generated_at': round(now, 3),
+            'uptime_s': round(now - self.started_at, 3),
+            'windows': windows,
+        }
+
+    def dump(self, path: str) -> str:
+        """Ghi snapshot ra file JSON (ghi file tạm rồi đổi tên, không để lại file dở)"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.latency-', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return path
+
+
+def default_dump_path() -> str:
+    """File dump mặc định: HFMD_LATENCY_DUMP (có thể chứa {pid}) hoặc thư mục tạm"""
+    pattern = os.environ.get('HFMD_LATENCY_DUMP',
+                             os.path.join(tempfile.gettempdir(), 'hfmd-latency-{pid}.json'))
+    return pattern.format(pid=os.getpid())
+
+
+def install_dump_signal(tracker: LatencyTracker, path: Optional[str] = None,
+                        signum: Optional[int] = None) -> bool:
+    """
+    Ghi snapshot của tracker ra file mỗi khi process nhận SIGUSR1
+
+    Handler cũ (vd. mở lại file log của gunicorn worker) vẫn được gọi. Việc ghi
+    file chạy trong thread riêng: signal handler có thể chen vào giữa lúc chính
+    thread đó đang giữ lock của tracker.
+
+    Returns:
+        False nếu không cài được (không có SIGUSR1 hoặc không ở main thread)
+    """
+    signum = signum if signum is not None else getattr(signal, 'SIGUSR1', None)
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+
+    previous = signal.getsignal(signum)
+
+    def handle(received, frame):
+        target = path or default_dump_path()
+        threading.Thread(target=tracker.dump, args=(target,), name='hfmd-latency-dump',
+                         daemon=True).start()
+        if callable(previous):
+            previous(received, frame)
+
+    signal.signal(signum, handle)
+    return True
+
+
+# ============================================================================
+# WSGI MIDDLEWARE
+# ============================================================================
+
+class _MeasuredResponse:
+    """Bọc iterable response: đếm byte và ghi số liệu khi server gọi close()"""
+
+    __slots__ = ('iterable', 'on_close', 'size', 'cpu_time', 'closed')
+
+    def __init__(self, iterable: Iterable[bytes], on_close: Callable, cpu_time: float):
+        self.iterable = iterable
+        self.on_close = on_close
+        self.size = 0
+        self.cpu_time = cpu_time
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.iterable:
+            self.size += len(chunk)
+            yield chunk
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            close = getattr(self.iterable, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self.on_close(self.size, self.cpu_time)
+
+
+class LatencyMiddleware:
+    """
+    WSGI middleware: wall time (tới khi gửi xong response), CPU time của thread
+    xử lý và số byte body cho mỗi request, gom theo route
+
+    Args:
+        app: WSGI app được bọc (vd. flask_app.wsgi_app)
+        tracker: Nơi ghi số liệu
+        route_of: Hàm environ → mẫu route (vd. '/api/classify'), None nếu không khớp
+    """
+
+    def __init__(self, app: Callable, tracker: LatencyTracker,
+                 route_of: Callable[[Dict], Optional[str]]):
+        self.app = app
+        self.tracker = tracker
+        self.route_of = route_of
+
+    def __call__(self, environ: Dict, start_response: Callable):
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        status_holder: List[int] = [500]
+
+        def measured_start_response(status, headers, exc_info=None):
+            status_holder[0] = int(status.split(' ', 1)[0])
+            return start_response(status, headers, exc_info)
+
+        def on_close(size: int, cpu_time: float):
+            route = self.route_of(environ) or UNMATCHED
+            self.tracker.record(
+                f"{environ.get('REQUEST_METHOD', 'GET')} {route}",
+                time.perf_counter() - start,
+                cpu_time + time.thread_time(),
+                size,
+                status_holder[0]
+            )
+
+        try:
+            iterable = self.app(environ, measured_start_response)
+        except BaseException:
+            on_close(0, -cpu_start)
+            raise
+        return _MeasuredResponse(iterable, on_close, -cpu_start)
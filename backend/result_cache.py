@@ -0,0 +1,93 @@
+"""
+Result Cache - LRU cache (kèm TTL) cho kết quả match rules
+Dùng cho SimpleInferenceEngine: các lần gửi trùng dữ liệu chỉ tốn một lần tra dict
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+# Giá trị trả về khi không có trong cache (phân biệt với giá trị None được cache)
+MISSING = object()
+
+
+class ResultCache:
+    """
+    LRU cache giới hạn kích thước, mỗi entry hết hạn sau ttl giây
+
+    An toàn khi nhiều threads dùng chung (Flask threaded / gunicorn gthread).
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        """
+        Args:
+            max_size: Số entry tối đa (0: tắt cache)
+            ttl: Thời gian sống của entry (giây), None: không hết hạn
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Any:
+        """Lấy giá trị theo key, trả về MISSING nếu không có hoặc đã hết hạn"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return MISSING
+
+    def put(self, key: Hashable, value: Any):
+        """Lưu giá trị, loại entry ít dùng nhất khi vượt max_size"""
+        if self.max_size <= 0:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Xóa toàn bộ entries (khi rules được load lại)"""
+        with self._lock:
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+
+    def reset(self):
+        """Xóa entries và bộ đếm (sau warm-up, để thống kê chỉ tính traffic thật)"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get_stats(self) -> Dict:
+        """Thống kê hit/miss của cache"""
+        total = self.hits + self.misses
+        return {
+            'enabled': self.max_size > 0,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,158 @@
+"""
+Rete Network - Bộ match tăng dần cho InferenceEngine (kiểu TREAT)
+Chỉ đánh giá lại các điều kiện bị ảnh hưởng bởi facts mới
+
+Cấu trúc:
+- Alpha node: một Condition duy nhất, dùng chung giữa mọi rules có điều kiện đó
+- Rule node: đếm số alpha nodes đang thỏa mãn; đủ hết → rule vào conflict set
+- Conflict set: giữ nguyên qua các vòng lặp, chỉ cập nhật khi facts thay đổi
+"""
+
+import threading
+import weakref
+from typing import Dict, List, Set
+
+from knowledge_base import Condition, KnowledgeBase
+
+
+def _freeze(value):
+    """Chuyển value thành dạng hash được để làm khóa alpha node"""
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__, tuple(_freeze(v) for v in value))
+    if isinstance(value, (set, frozenset)):
+        return ('set', frozenset(_freeze(v) for v in value))
+    if isinstance(value, dict):
+        return ('dict', tuple(sorted((k, _freeze(v)) for k, v in value.items())))
+    return (type(value).__name__, value)
+
+
+class ReteNetwork:
+    """
+    Mạng alpha/rule nodes dựng MỘT LẦN từ knowledge base
+
+    Rules được đánh số liên tục: intermediate rules trước, conclusion rules sau,
+    mỗi nhóm giữ thứ tự trong knowledge base.
+    """
+
+    def __init__(self, knowledge_base: KnowledgeBase):
+        self.kb = knowledge_base
+        self.intermediate_rules = list(knowledge_base.intermediate_rules)
+        self.conclusion_rules = list(knowledge_base.rules)
+        self.rules = self.intermediate_rules + self.conclusion_rules
+        self.num_intermediate = len(self.intermediate_rules)
+
+        self.alpha_conditions: List[Condition] = []   # alpha node → Condition
+        self.alpha_successors: List[List[int]] = []   # alpha node → rule nodes
+        self.alpha_by_field: Dict[str, List[int]] = {}
+        self.rule_sizes: List[int] = []               # rule node → số điều kiện
+
+        alpha_keys = {}
+        for rule_index, rule in enumerate(self.rules):
+            self.rule_sizes.append(len(rule.conditions))
+            for condition in rule.conditions:
+                key = (condition.field, condition.operator, _freeze(condition.value))
+                alpha = alpha_keys.get(key)
+                if alpha is None:
+                    alpha = len(self.alpha_conditions)
+                    alpha_keys[key] = alpha
+                    self.alpha_conditions.append(condition)
+                    self.alpha_successors.append([])
+                    self.alpha_by_field.setdefault(condition.field, []).append(alpha)
+                self.alpha_successors[alpha].append(rule_index)
+
+    _shared: 'weakref.WeakKeyDictionary[KnowledgeBase, ReteNetwork]' = weakref.WeakKeyDictionary()
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def for_knowledge_base(cls, knowledge_base: KnowledgeBase) -> 'ReteNetwork':
+        """
+        Mạng dùng chung cho mọi engine trên cùng knowledge base
+
+        Dựng lần đầu, dựng lại nếu knowledge base có thêm rules.
+        """
+        network = cls._shared.get(knowledge_base)
+        if network is None or not network.is_current():
+            with cls._shared_lock:
+                network = cls._shared.get(knowledge_base)
+                if network is None or not network.is_current():
+                    network = cls(knowledge_base)
+                    cls._shared[knowledge_base] = network
+        return network
+
+    def is_current(self) -> bool:
+        """Mạng còn khớp với knowledge base (chưa thêm rules mới)?"""
+        return (len(self.kb.intermediate_rules) == len(self.intermediate_rules)
+                and len(self.kb.rules) == len(self.conclusion_rules))
+
+    def create_agenda(self, facts: Dict) -> 'ReteAgenda':
+        """Tạo trạng thái match cho một lần suy diễn"""
+        return ReteAgenda(self, facts)
+
+
+class ReteAgenda:
+    """
+    Trạng thái match của một lần suy diễn: alpha memory + conflict set
+
+    Dùng cùng giao diện với NaiveAgenda trong inference_engine.
+    """
+
+    def __init__(self, network: ReteNetwork, facts: Dict):
+        self.network = network
+        self.alpha_memory = [False] * len(network.alpha_conditions)
+        self.satisfied = [0] * len(network.rules)
+        self.conflict_set: Set[int] = {
+            i for i, size in enumerate(network.rule_sizes) if size == 0
+        }
+        self.facts_changed(facts, facts)
+
+    def facts_changed(self, changed: Dict, facts: Dict):
+        """
+        Lan truyền các facts vừa thêm/đổi qua mạng
+
+        Args:
+            changed: Các facts vừa được thêm (chỉ các fields này được đánh giá lại)
+            facts: Toàn bộ facts hiện tại
+        """
+        network = self.network
+        alpha_memory = self.alpha_memory
+        satisfied = self.satisfied
+        rule_sizes = network.rule_sizes
+        conflict_set = self.conflict_set
+
+        for field in changed:
+            for alpha in network.alpha_by_field.get(field, ()):
+                try:
+                    matched = bool(network.alpha_conditions[alpha].evaluate(facts))
+                except (TypeError, ValueError):
+                    # Khác kiểu (vd. str < số): coi là không thỏa. Matcher naive dừng ở
+                    # điều kiện sai đầu tiên nên không gặp lỗi này khi rule đã không match
+                    matched = False
+                if matched == alpha_memory[alpha]:
+                    continue
+                alpha_memory[alpha] = matched
+
+                delta = 1 if matched else -1
+                for rule_index in network.alpha_successors[alpha]:
+                    satisfied[rule_index] += delta
+                    if satisfied[rule_index] == rule_sizes[rule_index]:
+                        conflict_set.add(rule_index)
+                    else:
+                        conflict_set.discard(rule_index)
+
+    def intermediate_rules(self, facts: Dict, fired_rules: Set[str]) -> List:
+        """Intermediate rules đang match và chưa fire, theo thứ tự knowledge base"""
+        rules = self.network.rules
+        limit = self.network.num_intermediate
+        return [
+            rules[i] for i in sorted(self.conflict_set)
+            if i < limit and rules[i].rule_id not in fired_rules
+        ]
+
+    def conclusion_rules(self, facts: Dict, fired_rules: Set[str]) -> List:
+        """Conclusion rules đang match và chưa fire, theo thứ tự knowledge base"""
+        rules = self.network.rules
+        limit = self.network.num_intermediate
+        return [
+            rules[i] for i in sorted(self.conflict_set)
+            if i >= limit and rules[i].rule_id not in fired_rules
+        ]
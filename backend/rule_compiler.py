@@ -0,0 +1,270 @@
+"""
+Rule Compiler - Biên dịch luật JSON thành predicate
+Dùng cho SimpleInferenceEngine: parse conditions MỘT LẦN khi load rules
+
+Quy trình:
+- normalize_condition: chuẩn hóa condition dict thành cây node (làm phẳng OR/AND,
+  chuyển ngưỡng sang float, loại bỏ điều kiện không hợp lệ)
+- build_predicate: dựng closure từ cây node
+- compile_rule: gói rule + predicate thành CompiledRule
+"""
+
+import operator
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+
+# ============================================================================
+# NODE - Cây điều kiện đã chuẩn hóa
+# ============================================================================
+# ('true',)                       : luôn đúng (rule không có điều kiện)
+# ('false',)                      : luôn sai (điều kiện thiếu field/operator/value)
+# ('all', (node, ...))            : AND đã làm phẳng
+# ('any', (node, ...))            : OR đã làm phẳng
+# ('cmp', field, operator, value) : điều kiện đơn, value số đã là float
+
+TRUE = ('true',)
+FALSE = ('false',)
+
+# Operators so sánh số: giá trị bệnh nhân được ép float như evaluate_condition
+NUMERIC_OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+EQUALITY_OPERATORS = {'==', '!=', 'in'}
+
+
+def normalize_condition(condition: Dict) -> tuple:
+    """
+    Chuẩn hóa một condition (hoặc condition group) thành node
+
+    Ngữ nghĩa giữ nguyên như SimpleInferenceEngine.evaluate_condition:
+    điều kiện thiếu field/operator/value hoặc operator lạ luôn sai.
+    """
+    if 'type' in condition:
+        children = [normalize_condition(c) for c in condition.get('conditions', [])]
+        if condition['type'] == 'AND':
+            return _make_group('all', children)
+        if condition['type'] == 'OR':
+            return _make_group('any', children)
+        return FALSE
+
+    field = condition.get('field')
+    if not field:
+        return FALSE
+
+    op = condition.get('operator')
+    value = condition.get('value')
+    if op is None or value is None:
+        return FALSE
+
+    if op in NUMERIC_OPERATORS:
+        try:
+            return ('cmp', field, op, float(value))
+        except (ValueError, TypeError):
+            # Ngưỡng không phải số → float() luôn lỗi → luôn sai
+            return FALSE
+    if op == 'in':
+        if not isinstance(value, list):
+            return FALSE
+        return ('cmp', field, op, tuple(value))
+    if op in EQUALITY_OPERATORS:
+        return ('cmp', field, op, value)
+    return FALSE
+
+
+def normalize_rule(rule: Dict) -> tuple:
+    """Chuẩn hóa toàn bộ conditions của rule (AND logic ở cấp ngoài cùng)"""
+    return _make_group('all', [normalize_condition(c) for c in rule.get('conditions', [])])
+
+
+def _make_group(kind: str, children: List[tuple]) -> tuple:
+    """Làm phẳng group lồng cùng loại và rút gọn hằng TRUE/FALSE"""
+    identity, absorbing = (TRUE, FALSE) if kind == 'all' else (FALSE, TRUE)
+
+    flat = []
+    for child in children:
+        if child == absorbing:
+            return absorbing
+        if child == identity:
+            continue
+        if child[0] == kind:
+            flat.extend(child[1])
+        else:
+            flat.append(child)
+
+    if not flat:
+        return identity
+    if len(flat) == 1:
+        return flat[0]
+    return (kind, tuple(flat))
+
+
+def iter_leaves(node: tuple):
+    """Duyệt tất cả điều kiện đơn ('cmp') trong cây"""
+    if node[0] == 'cmp':
+        yield node
+    elif node[0] in ('all', 'any'):
+        for child in node[1]:
+            yield from iter_leaves(child)
+
+
+def referenced_fields(node: tuple) -> FrozenSet[str]:
+    """Tất cả fields mà node tham chiếu"""
+    return frozenset(leaf[1] for leaf in iter_leaves(node))
+
+
+def required_fields(node: tuple) -> FrozenSet[str]:
+    """
+    Fields BẮT BUỘC có mặt (khác None) để node có thể đúng
+
+    - cmp: field của nó (thiếu giá trị → luôn sai)
+    - all: hợp các fields bắt buộc của con
+    - any: giao các fields bắt buộc của con (nhánh nào cũng cần)
+    """
+    kind = node[0]
+    if kind == 'cmp':
+        return frozenset((node[1],))
+    if kind == 'all':
+        return frozenset().union(*(required_fields(child) for child in node[1]))
+    if kind == 'any':
+        return frozenset.intersection(*(required_fields(child) for child in node[1]))
+    return frozenset()
+
+
+# ============================================================================
+# PREDICATE - Dựng closure từ node
+# ============================================================================
+
+def build_predicate(node: tuple) -> Callable[[Dict], bool]:
+    """Dựng closure predicate(patient_data) -> bool từ node đã chuẩn hóa"""
+    kind = node[0]
+
+    if kind == 'true':
+        return lambda data: True
+    if kind == 'false':
+        return lambda data: False
+    if kind == 'cmp':
+        return _build_leaf(*node[1:])
+
+    children = tuple(build_predicate(child) for child in node[1])
+
+    if kind == 'all':
+        def all_of(data):
+            for predicate in children:
+                if not predicate(data):
+                    return False
+            return True
+        return all_of
+
+    def any_of(data):
+        for predicate in children:
+            if predicate(data):
+                return True
+        return False
+    return any_of
+
+
+def _build_leaf(field: str, op: str, expected: Any) -> Callable[[Dict], bool]:
+    """Dựng closure cho điều kiện đơn"""
+    if op in NUMERIC_OPERATORS:
+        compare = NUMERIC_OPERATORS[op]
+
+        def numeric(data):
+            actual = data.get(field)
+            if actual is None:
+                return False
+            try:
+                return compare(float(actual), expected)
+            except (ValueError, TypeError):
+                return False
+        return numeric
+
+    if op == '==':
+        def equals(data):
+            actual = data.get(field)
+            return actual is not None and actual == expected
+        return equals
+
+    if op == '!=':
+        def not_equals(data):
+            actual = data.get(field)
+            return actual is not None and actual != expected
+        return not_equals
+
+    def contains(data):
+        actual = data.get(field)
+        return actual is not None and actual in expected
+    return contains
+
+
+# ============================================================================
+# COMPILED RULE
+# ============================================================================
+
+@dataclass
+class CompiledRule:
+    """Rule JSON kèm predicate đã biên dịch"""
+    index: int                          # Vị trí trong file rules (giữ thứ tự gốc)
+    rule: Dict                          # Rule dict gốc (dùng cho kết quả trả về)
+    node: tuple                         # Cây điều kiện đã chuẩn hóa
+    predicate: Callable[[Dict], bool]
+    fields: FrozenSet[str]              # Fields được tham chiếu
+    required_fields: FrozenSet[str]     # Fields phải có mặt để rule có thể match
+
+    @property
+    def rule_id(self) -> str:
+        return self.rule.get('id')
+
+    @property
+    def degree(self):
+        return self.rule.get('conclusion', {}).get('disease_level')
+
+
+def compile_rule(index: int, rule: Dict, node: Optional[tuple] = None) -> CompiledRule:
+    """
+    Biên dịch một rule JSON
+
+    Args:
+        node: Cây điều kiện đã chuẩn hóa sẵn (từ snapshot), None: chuẩn hóa từ rule
+    """
+    if node is None:
+        node = normalize_rule(rule)
+    return CompiledRule(
+        index=index,
+        rule=rule,
+        node=node,
+        predicate=build_predicate(node),
+        fields=referenced_fields(node),
+        required_fields=required_fields(node)
+    )
+
+
+def compile_rules(rules: List[Dict], nodes: Optional[List[tuple]] = None) -> List[CompiledRule]:
+    """Biên dịch danh sách rules, giữ nguyên thứ tự (nodes: cây đã chuẩn hóa sẵn)"""
+    if nodes is None:
+        return [compile_rule(i, rule) for i, rule in enumerate(rules)]
+    return [compile_rule(i, rule, node) for i, (rule, node) in enumerate(zip(rules, nodes))]
+
+
+def build_field_index(compiled_rules: List[CompiledRule]) -> Tuple[Dict[str, Tuple[int, ...]], Tuple[int, ...]]:
+    """
+    Inverted index: field → vị trí các rules tham chiếu field đó
+
+    Returns:
+        (field_index, unconditional): unconditional là các rule không điều kiện
+        (ví dụ R1-3) - luôn được xét. Rule luôn sai không nằm trong index.
+    """
+    field_index: Dict[str, List[int]] = {}
+    unconditional = []
+
+    for compiled in compiled_rules:
+        if compiled.node == TRUE:
+            unconditional.append(compiled.index)
+        for field in compiled.fields:
+            field_index.setdefault(field, []).append(compiled.index)
+
+    return {field: tuple(indexes) for field, indexes in field_index.items()}, tuple(unconditional)
@@ -0,0 +1,197 @@
+"""
+Rule Snapshot - Bản biên dịch nhị phân của các tập luật JSON để khởi động nhanh
+SimpleInferenceEngine nạp snapshot qua mmap + pickle thay vì parse JSON / chuẩn hóa rules
+
+Định dạng file (.snap):
+- Header: magic 'HFMDSNAP', phiên bản định dạng (uint16), SHA-256 của nguồn
+- Payload: pickle của dữ liệu đã biên dịch
+
+Snapshot cũ (nguồn hoặc bộ biên dịch thay đổi, hỏng, khác phiên bản) được
+dựng lại tự động khi nạp. Snapshot là cache cục bộ, chỉ đọc file do chính
+hệ thống ghi ra (không nạp snapshot từ nguồn không tin cậy).
+
+Snapshot nằm trong $HFMD_SNAPSHOT_DIR, mặc định thư mục cache của user
+($XDG_CACHE_HOME/hfmd/snapshots hoặc ~/.cache/hfmd/snapshots), không ghi vào cây mã nguồn.
+
+Dựng sẵn (ví dụ trong bước build image):
+    python backend/rule_snapshot.py [--data-dir data] [--force]
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, Optional
+
+import rule_compiler
+from rule_compiler import normalize_rule
+
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_MAGIC = b'HFMDSNAP'
+SNAPSHOT_SUFFIX = '.snap'
+
+# Thư mục chứa snapshot; mặc định thư mục cache của user (xem snapshot_dir)
+SNAPSHOT_DIR_ENV = 'HFMD_SNAPSHOT_DIR'
+
+_HEADER = struct.Struct('<8sH32s')  # magic, phiên bản định dạng, digest nguồn
+
+
+# ============================================================================
+# ĐỌC / GHI SNAPSHOT
+# ============================================================================
+
+def _read_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def source_digest(*sources: bytes) -> bytes:
+    """SHA-256 của các nguồn (kèm phiên bản định dạng snapshot)"""
+    digest = hashlib.sha256(struct.pack('<H', SNAPSHOT_FORMAT_VERSION))
+    for source in sources:
+        digest.update(struct.pack('<Q', len(source)))
+        digest.update(source)
+    return digest.digest()
+
+
+def snapshot_dir() -> str:
+    """Thư mục chứa snapshot: $HFMD_SNAPSHOT_DIR hoặc thư mục cache của user"""
+    directory = os.environ.get(SNAPSHOT_DIR_ENV)
+    if directory:
+        return directory
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'hfmd', 'snapshots')
+
+
+def snapshot_path(source_path: str) -> str:
+    """
+    Đường dẫn file snapshot tương ứng với file nguồn
+
+    Tên file kèm hash đường dẫn nguồn: các bản checkout khác nhau dùng chung thư
+    mục cache không ghi đè snapshot của nhau.
+    """
+    source_path = os.path.abspath(source_path)
+    tag = hashlib.sha256(source_path.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(snapshot_dir(), f'{os.path.basename(source_path)}-{tag}{SNAPSHOT_SUFFIX}')
+
+
+def read_snapshot(path: str, digest: bytes) -> Optional[Any]:
+    """
+    Nạp snapshot qua mmap (không copy file vào bộ nhớ trước khi unpickle)
+
+    Returns:
+        Dữ liệu đã lưu, None nếu không có, hỏng hoặc không khớp digest nguồn
+    """
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, stored_digest = _HEADER.unpack_from(mm)
+            if (magic != SNAPSHOT_MAGIC or version != SNAPSHOT_FORMAT_VERSION
+                    or stored_digest != digest):
+                return None
+            with memoryview(mm) as view, view[_HEADER.size:] as payload:
+                return pickle.loads(payload)
+    except Exception:
+        # Không có file, file rỗng/hỏng, class đã đổi... → dựng lại
+        return None
+
+
+def write_snapshot(path: str, digest: bytes, data: Any) -> bool:
+    """
+    Ghi snapshot (ghi file tạm rồi os.replace để worker khác không đọc file dở)
+
+    Returns:
+        False nếu không ghi được (thư mục chỉ đọc...), engine vẫn chạy bình thường
+    """
+    try:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, digest))
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.chmod(tmp_path, 0o644)  # mkstemp tạo file 0600
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return True
+    except OSError:
+        return False
+
+
+def load_or_build(path: str, digest: bytes, build: Callable[[], Any], force: bool = False) -> Any:
+    """Nạp snapshot nếu còn mới, nếu không thì dựng lại và ghi snapshot"""
+    if not force:
+        data = read_snapshot(path, digest)
+        if data is not None:
+            return data
+
+    data = build()
+    write_snapshot(path, digest, data)
+    return data
+
+
+# ============================================================================
+# TẬP LUẬT JSON (SimpleInferenceEngine)
+# ============================================================================
+
+def build_rule_set(raw: bytes) -> Dict:
+    """Parse file rules JSON và chuẩn hóa cây điều kiện của từng rule"""
+    data = json.loads(raw.decode('utf-8'))
+    rules = data.get('conclusion_rules', [])
+    return {'rules': rules, 'nodes': [normalize_rule(rule) for rule in rules]}
+
+
+def rule_set_digest(raw: bytes) -> bytes:
+    """Digest của file rules + bộ biên dịch (đổi cách chuẩn hóa → dựng lại)"""
+    return source_digest(raw, _read_file(rule_compiler.__file__))
+
+
+def load_rule_set(rules_file: str, raw: Optional[bytes] = None, force: bool = False) -> Dict:
+    """
+    Tập luật JSON đã chuẩn hóa: {'rules': [...], 'nodes': [...]}
+
+    Args:
+        rules_file: Đường dẫn file rules JSON
+        raw: Nội dung file (nếu đã đọc sẵn)
+        force: Luôn dựng lại snapshot
+    """
+    if raw is None:
+        raw = _read_file(rules_file)
+    return load_or_build(
+        snapshot_path(rules_file), rule_set_digest(raw), lambda: build_rule_set(raw), force
+    )
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+RULE_FILES = ('diagnosis_rules.json', 'classification_level_rules.json')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Dựng snapshot nhị phân cho các tập luật')
+    parser.add_argument('--data-dir', default=os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), 'data'), help='Thư mục chứa file rules JSON')
+    parser.add_argument('--force', action='store_true', help='Dựng lại kể cả khi snapshot còn mới')
+    args = parser.parse_args(argv)
+
+    for name in RULE_FILES:
+        rules_file = os.path.join(args.data_dir, name)
+        start = time.perf_counter()
+        rule_set = load_rule_set(rules_file, force=args.force)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"✓ {snapshot_path(rules_file)}: {len(rule_set['rules'])} rules ({elapsed:.1f} ms)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
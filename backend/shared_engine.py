@@ -0,0 +1,50 @@
+"""
+Shared Engine - Knowledge base và InferenceEngine dùng chung trong process
+Mỗi lần chẩn đoán chỉ tốn chi phí suy diễn, không dựng lại KB/engine
+
+Chứa:
+- get_shared_knowledge_base: KB mặc định, nạp một lần mỗi process và freeze
+- get_shared_engine: InferenceEngine dùng chung theo chiến lược conflict resolution
+"""
+
+import threading
+from typing import Dict, Optional
+
+from inference_engine import InferenceEngine
+from knowledge_base import KnowledgeBase
+
+_shared_kb: Optional[KnowledgeBase] = None
+_shared_kb_lock = threading.Lock()
+
+
+def get_shared_knowledge_base() -> KnowledgeBase:
+    """Knowledge base mặc định dùng chung trong process (đã freeze, chỉ đọc)"""
+    global _shared_kb
+    if _shared_kb is None:
+        with _shared_kb_lock:
+            if _shared_kb is None:
+                _shared_kb = KnowledgeBase().freeze()
+    return _shared_kb
+
+
+_shared_engines: Dict[str, InferenceEngine] = {}
+_shared_engines_lock = threading.Lock()
+
+
+def get_shared_engine(conflict_strategy: str = 'priority') -> InferenceEngine:
+    """
+    InferenceEngine dùng chung (trên KB dùng chung) cho một chiến lược conflict resolution
+
+    Engine không giữ trạng thái của lần chạy: mỗi lần chẩn đoán gọi
+    engine.session() để có working memory + trace riêng, nên một engine phục vụ
+    được mọi thread mà không cần lock. Matcher 'naive' như TCMDiagnosisSystem.
+    """
+    engine = _shared_engines.get(conflict_strategy)
+    if engine is None:
+        with _shared_engines_lock:
+            engine = _shared_engines.get(conflict_strategy)
+            if engine is None:
+                engine = InferenceEngine(get_shared_knowledge_base())
+                engine.set_conflict_resolution(conflict_strategy)
+                _shared_engines[conflict_strategy] = engine
+    return engine
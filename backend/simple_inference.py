@@ -3,30 +3,167 @@ Simple Forward Chaining Inference Engine
 Engine đơn giản để xử lý rules.json theo format mới
 """
 
-import json
+import hashlib
 import os
+import time
+from dataclasses import replace
+from operator import itemgetter
+
+from decision_tree import DEFAULT_MAX_NODES, DecisionTree
+from fact_bitset import FactEncoder, compile_bitset_rule
+from metrics import EVALUATIONS, FIRES, MATCHES, counting_predicate
+from result_cache import MISSING, ResultCache
+from rule_compiler import FALSE, build_field_index, compile_rules
+from rule_snapshot import build_rule_set, load_rule_set
+
+# Thứ tự kiểm tra phân độ: nặng → nhẹ
+DEGREE_PRIORITY_ORDER = ['4', '3', '2b', '2a', '1']
+
+# Chế độ đánh giá rules
+#   'sequential': đánh giá mọi rule ứng viên rồi mới chọn độ
+#   'severity'  : đánh giá theo nhóm độ 4→3→2b→2a→1, dừng ở nhóm đầu tiên có match
+#   'tree'      : như 'severity' nhưng đi theo sơ đồ quyết định đã biên dịch
+#                 (mỗi field kiểm tra một lần, xem decision_tree); sơ đồ vượt
+#                 max_tree_nodes thì đánh giá như 'severity'
+#   'bitset'    : như 'severity' nhưng facts boolean và ngưỡng số được mã hóa
+#                 thành bitmask, rule kiểm tra bằng phép & (xem fact_bitset)
+EVALUATION_MODES = ('sequential', 'severity', 'tree', 'bitset')
 
 class SimpleInferenceEngine:
-    def __init__(self, rules_file='data/rules.json'):
-        """Khởi tạo engine với file rules"""
+    def __init__(self, rules_file='data/rules.json', evaluation_mode='sequential',
+                 cache_size=0, cache_ttl=None, use_snapshot=True, metrics=None, metrics_name=None,
+                 max_tree_nodes=DEFAULT_MAX_NODES):
+        """
+        Khởi tạo engine với file rules
+        
+        Args:
+            rules_file: Đường dẫn file rules JSON
+            evaluation_mode: 'sequential', 'severity', 'tree' hoặc 'bitset' (xem EVALUATION_MODES)
+            cache_size: Số kết quả match tối đa trong LRU cache (0: tắt cache)
+            cache_ttl: Thời gian sống của mỗi kết quả trong cache (giây), None: không hết hạn
+            use_snapshot: Nạp rules đã biên dịch từ snapshot nhị phân (xem rule_snapshot)
+            metrics: MetricsRegistry để đếm evaluations/matches/fires theo rule và đo
+                     thời gian từng phase (None: tắt, predicates không bị bọc)
+            metrics_name: Nhãn engine trong metrics (mặc định: tên file rules)
+            max_tree_nodes: Số nút tối đa của sơ đồ quyết định (chế độ 'tree')
+        """
+        if evaluation_mode not in EVALUATION_MODES:
+            raise ValueError(f"Unknown evaluation mode: {evaluation_mode}")
+        
         self.rules_file = rules_file
+        self.evaluation_mode = evaluation_mode
+        self.use_snapshot = use_snapshot
         self.rules = []
+        self.rules_version = None  # SHA-256 nội dung file rules đã load
+        self.compiled_rules = []
+        self.field_index = {}
+        self.unconditional_rules = ()
+        self.severity_buckets = []
+        self.severity_rank = []
+        self.severity_key = []
+        self._batch_plan = None  # Vector predicates, dựng khi gọi diagnose_batch lần đầu
+        self.decision_tree = None  # Chỉ dựng ở chế độ 'tree'
+        self.max_tree_nodes = max_tree_nodes
+        self.fact_encoder = None  # Chỉ dựng ở chế độ 'bitset'
+        self.bitset_buckets = []
+        self.referenced_fields = frozenset()
+        self.result_cache = ResultCache(max_size=cache_size, ttl=cache_ttl)
+        self.metrics = metrics
+        self.metrics_name = metrics_name or os.path.splitext(os.path.basename(rules_file))[0]
+        self.rule_counters = None
         self.load_rules()
     
     def load_rules(self):
-        """Load rules từ JSON file"""
+        """Load rules từ JSON file (hoặc snapshot còn mới) và biên dịch thành predicates"""
+        nodes = None
         try:
-            with open(self.rules_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.rules = data.get('conclusion_rules', [])
+            with open(self.rules_file, 'rb') as f:
+                raw = f.read()
+            if self.use_snapshot:
+                rule_set = load_rule_set(self.rules_file, raw)
+            else:
+                rule_set = build_rule_set(raw)
+            self.rules = rule_set['rules']
+            nodes = rule_set['nodes']
+            self.rules_version = hashlib.sha256(raw).hexdigest()
             print(f"✓ Loaded {len(self.rules)} rules from {self.rules_file}")
         except Exception as e:
             print(f"✗ Error loading rules: {e}")
             self.rules = []
+            self.rules_version = None
+        
+        # Biên dịch một lần: diagnose() chỉ chạy các predicate đã dựng sẵn
+        self.compiled_rules = compile_rules(self.rules, nodes)
+        if self.metrics is not None:
+            self.compiled_rules = self._instrument_rules(self.compiled_rules)
+        self.field_index, self.unconditional_rules = build_field_index(self.compiled_rules)
+        self.severity_buckets = self._build_severity_buckets()
+        self._batch_plan = None
+        if self.evaluation_mode == 'tree':
+            self.decision_tree = DecisionTree(self.severity_buckets, max_nodes=self.max_tree_nodes)
+            if self.decision_tree.root is None:
+                print(f"✗ Decision tree vượt quá {self.max_tree_nodes} nút, đánh giá theo 'severity'")
+        elif self.evaluation_mode == 'bitset':
+            self.fact_encoder = FactEncoder.for_rules(self.compiled_rules)
+            self.bitset_buckets = [
+                tuple(
+                    (compiled.rule,) + compile_bitset_rule(compiled.node, self.fact_encoder.bits)
+                    for compiled in bucket
+                    if compiled.node != FALSE
+                )
+                for _, bucket in self.severity_buckets
+            ]
+        
+        # Kết quả cũ không còn đúng với rules mới
+        self.referenced_fields = frozenset(self.field_index)
+        self.result_cache.clear()
+        
+        # Vị trí nhóm của từng rule và khóa sắp xếp (nhóm, thứ tự trong file)
+        self.severity_rank = [0] * len(self.compiled_rules)
+        for rank, (degree, bucket) in enumerate(self.severity_buckets):
+            for compiled in bucket:
+                self.severity_rank[compiled.index] = rank
+        self.severity_key = [
+            (self.severity_rank[compiled.index], compiled.index)
+            for compiled in self.compiled_rules
+        ]
+    
+    def _instrument_rules(self, compiled_rules):
+        """Bọc predicate của từng rule bằng bộ đếm evaluations/matches (chỉ khi bật metrics)"""
+        self.rule_counters = self.metrics.rule_counters(
+            self.metrics_name, [compiled.rule_id or str(compiled.index) for compiled in compiled_rules]
+        )
+        return [
+            replace(compiled, predicate=counting_predicate(
+                compiled.predicate, self.rule_counters, compiled.index
+            ))
+            for compiled in compiled_rules
+        ]
+    
+    def _build_severity_buckets(self):
+        """
+        Nhóm rules theo conclusion.disease_level theo thứ tự DEGREE_PRIORITY_ORDER
+        
+        Nhóm cuối (degree None) chứa các rules còn lại: không có disease_level
+        hoặc độ nằm ngoài thứ tự, chỉ được đánh giá khi không độ nào match.
+        """
+        buckets = {degree: [] for degree in DEGREE_PRIORITY_ORDER}
+        remaining = []
+        for compiled in self.compiled_rules:
+            bucket = buckets.get(compiled.degree)
+            if bucket is None:
+                remaining.append(compiled)
+            else:
+                bucket.append(compiled)
+        
+        ordered = [(degree, tuple(buckets[degree])) for degree in DEGREE_PRIORITY_ORDER]
+        ordered.append((None, tuple(remaining)))
+        return ordered
     
     def evaluate_condition(self, condition, patient_data):
         """
-        Đánh giá một condition hoặc condition group
+        Đánh giá một condition hoặc condition group (bản thông dịch)
+        diagnose() dùng predicate đã biên dịch trong compiled_rules
         
         Args:
             condition: {"field": "spo2", "operator": "<", "value": 92}
@@ -94,6 +231,138 @@ class SimpleInferenceEngine:
         except (ValueError, TypeError):
             return False
     
+    def candidate_rules(self, patient_data):
+        """
+        Chọn các rules cần đánh giá dựa trên inverted index
+        
+        Chỉ giữ rules có đủ các fields bắt buộc trong patient_data
+        (giá trị khác None) cùng các rules không điều kiện.
+        
+        Returns:
+            list: CompiledRule theo đúng thứ tự trong file rules
+        """
+        candidates, present = self._lookup_candidates(patient_data)
+        compiled_rules = self.compiled_rules
+        return [
+            compiled_rules[i]
+            for i in sorted(candidates)
+            if compiled_rules[i].required_fields <= present
+        ]
+    
+    def _lookup_candidates(self, patient_data):
+        """Tra inverted index: trả về (vị trí rules ứng viên, fields có giá trị)"""
+        present = set()
+        candidates = set(self.unconditional_rules)
+        field_index = self.field_index
+        
+        for field, value in patient_data.items():
+            if value is None:
+                continue
+            present.add(field)
+            indexes = field_index.get(field)
+            if indexes:
+                candidates.update(indexes)
+        
+        return candidates, present
+    
+    def cache_key(self, patient_data):
+        """
+        Khóa cache: tuple (field, value) đã sắp xếp của các fields mà rules tham chiếu
+        
+        Fields không được rule nào dùng và giá trị None bị bỏ qua, nên chúng không
+        làm mất cache hit. Trả về None nếu có giá trị không hash được.
+        """
+        referenced = self.referenced_fields
+        key = tuple(sorted(
+            ((field, value) for field, value in patient_data.items()
+             if value is not None and field in referenced),
+            key=itemgetter(0)
+        ))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+    
+    def match_rules(self, patient_data):
+        """
+        Tìm các rules match theo evaluation_mode (qua LRU cache nếu bật)
+        
+        Returns:
+            list: Rule dicts đã match, theo thứ tự trong file rules
+        """
+        cache = self.result_cache
+        if cache.max_size <= 0:
+            return self._match_rules(patient_data)
+        
+        key = self.cache_key(patient_data)
+        if key is None:
+            return self._match_rules(patient_data)
+        
+        matched = cache.get(key)
+        if matched is MISSING:
+            matched = tuple(self._match_rules(patient_data))
+            cache.put(key, matched)
+        return list(matched)
+    
+    def _match_rules(self, patient_data):
+        """Tìm các rules match theo evaluation_mode (không qua cache)"""
+        if self.evaluation_mode == 'severity':
+            return self._match_by_severity(patient_data)
+        if self.evaluation_mode == 'tree':
+            matched = self.decision_tree.match(patient_data)
+            if matched is not None:
+                return matched
+            return self._match_by_severity(patient_data)  # Sơ đồ đã đủ max_tree_nodes
+        if self.evaluation_mode == 'bitset':
+            return self._match_by_bitset(patient_data)
+        
+        return [
+            compiled.rule
+            for compiled in self.candidate_rules(patient_data)
+            if compiled.predicate(patient_data)
+        ]
+    
+    def _match_by_severity(self, patient_data):
+        """
+        Đánh giá theo nhóm độ nặng → nhẹ, dừng ở nhóm đầu tiên có match
+        
+        Các độ thấp hơn không ảnh hưởng kết quả phân độ nên không cần đánh giá;
+        trace vẫn ghi matched=False cho các độ cao hơn bị bỏ qua.
+        """
+        candidates, present = self._lookup_candidates(patient_data)
+        compiled_rules = self.compiled_rules
+        bucket_of = self.severity_rank
+        
+        matched = []
+        current_bucket = None
+        for i in sorted(candidates, key=self.severity_key.__getitem__):
+            bucket = bucket_of[i]
+            if bucket != current_bucket:
+                if matched:
+                    break
+                current_bucket = bucket
+            compiled = compiled_rules[i]
+            if compiled.required_fields <= present and compiled.predicate(patient_data):
+                matched.append(compiled.rule)
+        
+        return matched
+    
+    def _match_by_bitset(self, patient_data):
+        """
+        Như _match_by_severity, nhưng mã hóa facts MỘT lần thành bitmask; rule chỉ
+        có điều kiện boolean/ngưỡng số được kiểm tra bằng một phép & và so sánh
+        """
+        mask = self.fact_encoder.encode(patient_data)
+        for bucket in self.bitset_buckets:
+            matched = [
+                rule for rule, required, rest in bucket
+                if mask & required == required and (rest is None or rest(mask, patient_data))
+            ]
+            if matched:
+                return matched
+        return []
+    
     def evaluate_rule(self, rule, patient_data):
         """
         Đánh giá xem rule có match không
@@ -127,12 +396,94 @@ class SimpleInferenceEngine:
         Returns:
             dict: Kết quả chẩn đoán
         """
-        # Tìm tất cả rules match
-        matched_rules = []
-        for rule in self.rules:
-            if self.evaluate_rule(rule, patient_data):
-                matched_rules.append(rule)
+        if self.metrics is not None:
+            return self._diagnose_measured(patient_data)
+        
+        # Tìm rules match (chỉ xét rules có đủ dữ liệu đầu vào)
+        matched_rules = self.match_rules(patient_data)
         
+        return self.build_result(patient_data, matched_rules)
+    
+    def _diagnose_measured(self, patient_data):
+        """diagnose() kèm đo thời gian phase match / build_result và đếm rule fire"""
+        metrics, name = self.metrics, self.metrics_name
+        start = time.perf_counter()
+        matched_rules = self.match_rules(patient_data)
+        matched_at = time.perf_counter()
+        result = self.build_result(patient_data, matched_rules)
+        end = time.perf_counter()
+        
+        metrics.observe_phase(name, 'match', matched_at - start)
+        metrics.observe_phase(name, 'build_result', end - matched_at)
+        metrics.observe_phase(name, 'diagnose', end - start)
+        self._count_fire(result)
+        return result
+    
+    def _count_fire(self, result):
+        best_rule = result.get('best_rule')
+        if best_rule is not None:
+            self.rule_counters.add(FIRES, (best_rule.get('id'),))
+    
+    def diagnose_batch(self, records):
+        """
+        Chẩn đoán nhiều bệnh nhân cùng lúc (đánh giá rules vector hóa)
+        
+        Records được chuyển thành bảng cột NumPy; mỗi điều kiện chạy một phép
+        so sánh trên toàn bộ batch. Kết quả giống hệt gọi diagnose() cho từng
+        record (kể cả trace) và giữ nguyên thứ tự đầu vào.
+        
+        Args:
+            records: list các dict thông tin bệnh nhân
+        
+        Returns:
+            list: Kết quả chẩn đoán cho từng record
+        """
+        if self._batch_plan is None:
+            from batch_inference import BatchPlan
+            self._batch_plan = BatchPlan(self.compiled_rules)
+        
+        if self.metrics is not None:
+            return self._diagnose_batch_measured(records)
+        
+        matched_per_record = self._batch_plan.matched_rules(records)
+        return [
+            self.build_result(patient_data, matched_rules)
+            for patient_data, matched_rules in zip(records, matched_per_record)
+        ]
+    
+    def _diagnose_batch_measured(self, records):
+        """
+        diagnose_batch() kèm metrics: mọi rule được đánh giá trên cả batch nên
+        evaluations tăng len(records) cho từng rule
+        """
+        metrics, name, counters = self.metrics, self.metrics_name, self.rule_counters
+        start = time.perf_counter()
+        matched_per_record = self._batch_plan.matched_rules(records)
+        matched_at = time.perf_counter()
+        results = []
+        for patient_data, matched_rules in zip(records, matched_per_record):
+            counters.add(MATCHES, [rule.get('id') for rule in matched_rules])
+            result = self.build_result(patient_data, matched_rules)
+            self._count_fire(result)
+            results.append(result)
+        end = time.perf_counter()
+        
+        counters.add_all(EVALUATIONS, len(records))
+        metrics.observe_phase(name, 'batch_match', matched_at - start)
+        metrics.observe_phase(name, 'batch_build_result', end - matched_at)
+        return results
+    
+    def build_result(self, patient_data, matched_rules):
+        """
+        Tạo kết quả chẩn đoán (kèm trace) từ các rules đã match
+        
+        Args:
+            patient_data: dict chứa thông tin bệnh nhân
+            matched_rules: list rule dicts đã match, theo thứ tự file rules
+        
+        Returns:
+            dict: Kết quả chẩn đoán
+        """
         # Nếu không có rule nào match
         if not matched_rules:
             return {
@@ -151,7 +502,7 @@ class SimpleInferenceEngine:
         
         if has_disease_level:
             # Logic TUẦN TỰ cho phân độ bệnh với TRACE CHI TIẾT
-            degree_priority_order = ['4', '3', '2b', '2a', '1']
+            degree_priority_order = DEGREE_PRIORITY_ORDER
             degree_names = {
                 '4': 'Độ 4 (Nguy kịch)',
                 '3': 'Độ 3 (Thần kinh nặng)',
@@ -294,14 +645,20 @@ class SimpleInferenceEngine:
             'total_matched': len(matched_rules)
         }
     
+    def get_cache_stats(self):
+        """Lấy thống kê hit/miss của result cache"""
+        return self.result_cache.get_stats()
+    
     def get_stats(self):
         """Lấy thống kê knowledge base"""
         grades = {}
         for rule in self.rules:
-            grade = rule['conclusion']['disease_level']
-            grades[grade] = grades.get(grade, 0) + 1
+            # Rules chẩn đoán có/không bệnh không có disease_level
+            grade = rule.get('conclusion', {}).get('disease_level')
+            if grade is not None:
+                grades[grade] = grades.get(grade, 0) + 1
         
-        return {
+        stats = {
             'total_rules': len(self.rules),
             'rules_by_grade': grades,
             'priorities': {
@@ -309,6 +666,10 @@ class SimpleInferenceEngine:
                 'max': max([r.get('priority', 0) for r in self.rules]) if self.rules else 0
             }
         }
+        if self.decision_tree is not None:
+            # Kích thước sơ đồ (tăng khi dựng thêm nhánh lúc chạy)
+            stats['decision_tree'] = self.decision_tree.get_stats()
+        return stats
 
 
 # Test
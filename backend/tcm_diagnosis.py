@@ -22,6 +22,7 @@ from knowledge_base import (
 )
 
 from inference_engine import InferenceEngine
+from shared_engine import get_shared_engine
 
 
 # ============================================================================
@@ -38,18 +39,23 @@ class TCMDiagnosisSystem:
     - Patient Data: Biểu diễn dữ liệu bệnh nhân
     """
     
-    def __init__(self, conflict_strategy: str = 'priority'):
+    def __init__(self, conflict_strategy: str = 'priority', show_banner: bool = True):
         """
         Khởi tạo hệ thống
         
         Args:
             conflict_strategy: Chiến lược giải quyết xung đột
                               ('priority', 'severity', 'recency')
+            show_banner: In thông tin hệ thống ra console
         """
+        # Knowledge base riêng (thêm rules được); quick_diagnose mới dùng KB/engine dùng chung
         self.kb = KnowledgeBase()
         self.engine = InferenceEngine(self.kb)
         self.engine.set_conflict_resolution(conflict_strategy)
         
+        if not show_banner:
+            return
+        
         print("="*80)
         print("🏥 HỆ THỐNG CHẨN ĐOÁN TCM - TCM DIAGNOSIS EXPERT SYSTEM")
         print("="*80)
@@ -159,9 +165,10 @@ def print_diagnosis_result(result: Dict, show_trace: bool = False):
     
     if result['success']:
         print(f"\n✓ ĐỘ BỆNH: {result['degree']}")
-        print(f"✓ ĐỘ ƯU TIÊN: {result['priority']}")
-        
         rule = result['primary_rule']
+        # Kết quả forward chaining không có 'priority' ở cấp ngoài, lấy từ luật chính
+        print(f"✓ ĐỘ ƯU TIÊN: {result.get('priority', rule['priority'])}")
+        
         print(f"\n📋 LUẬT CHÍNH:")
         print(f"   • ID: {rule['rule_id']}")
         print(f"   • Mô tả: {rule['description']}")
@@ -231,21 +238,29 @@ def summarize_statistics(stats: Dict):
 # QUICK DIAGNOSIS FUNCTIONS
 # ============================================================================
 
-def quick_diagnose(clinical_data: Dict, verbose: bool = False) -> Dict:
+def quick_diagnose(clinical_data: Dict, verbose: bool = False,
+                   print_result: bool = True) -> Dict:
     """
     Chẩn đoán nhanh từ dictionary
     
+    Dùng engine dùng chung trên knowledge base dùng chung: không dựng lại KB,
+    engine hay in banner mỗi lần gọi.
+    
     Args:
         clinical_data: Dictionary chứa dữ liệu lâm sàng
         verbose: Hiển thị chi tiết
+        print_result: In kết quả (tắt khi gọi trong vòng lặp)
         
     Returns:
         Kết quả chẩn đoán
     """
-    system = TCMDiagnosisSystem()
-    result = system.diagnose_from_dict(clinical_data, verbose=verbose)
+    session = get_shared_engine().session()
+    result = session.run_from_dict(clinical_data)
+    
+    if verbose:
+        print(session.explain(verbose=True))
     
-    if not verbose:
+    if print_result and not verbose:
         print_diagnosis_result(result)
     
     return result
@@ -0,0 +1,413 @@
+"""
+Benchmark Suite - So sánh tốc độ các engine chẩn đoán và các route HTTP
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --quick --compare benchmarks/results/baseline.json
+
+Đo cho mỗi engine (trên workload sinh từ rules của chính engine, xem workloads.py):
+- throughput (chẩn đoán/giây), latency p50/p90/p99
+- bộ nhớ cấp phát mỗi lần chẩn đoán (tracemalloc: đỉnh và phần còn giữ lại)
+- tách theo mật độ input (sparse/dense) và theo độ bệnh
+HTTP: từng route của app.py qua Flask test client (không qua mạng).
+Kết quả ghi ra JSON để so sánh giữa các lần chạy (--compare).
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from workloads import (BASE_DIR, DATA_DIR, Workload, degree_label, generate_workload,
+                       knowledge_base_vocabulary, pure_python_vocabulary, simple_label,
+                       simple_vocabulary)
+
+sys.path.insert(0, BASE_DIR)
+
+from diagnosis_pure_python import DiagnosisEngine
+from inference_engine import InferenceEngine
+from knowledge_base import KnowledgeBase
+from metrics import MetricsRegistry
+from simple_inference import SimpleInferenceEngine
+
+RESULTS_DIR = os.path.join(BASE_DIR, 'benchmarks', 'results')
+BATCH_SIZE = 64
+
+
+# ============================================================================
+# ĐO
+# ============================================================================
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+def summarize(latencies_ns: List[int], units: int = 1, throughput: Optional[float] = None,
+              allocations: Optional[List[int]] = None, retained: Optional[List[int]] = None) -> Dict:
+    """
+    Thống kê latency (µs) và bộ nhớ cấp phát (KiB)
+
+    Args:
+        units: Số chẩn đoán mỗi lần gọi (batch) để tính bộ nhớ mỗi chẩn đoán
+    """
+    values = sorted(latencies_ns)
+    stats = {
+        'calls': len(values),
+        'throughput_per_s': round(throughput, 1) if throughput is not None else None,
+        'mean_us': round(sum(values) / len(values) / 1000, 2) if values else 0.0,
+        'p50_us': round(percentile(values, 0.50) / 1000, 2),
+        'p90_us': round(percentile(values, 0.90) / 1000, 2),
+        'p99_us': round(percentile(values, 0.99) / 1000, 2),
+    }
+    if allocations:
+        peaks = sorted(allocations)
+        stats['alloc_kib_mean'] = round(sum(peaks) / len(peaks) / units / 1024, 2)
+        stats['alloc_kib_p99'] = round(percentile(peaks, 0.99) / units / 1024, 2)
+        stats['retained_bytes_mean'] = round(sum(retained) / len(retained) / units, 1)
+    return stats
+
+
+def time_calls(func: Callable, inputs: Sequence, repeat: int) -> List[int]:
+    """Latency từng lần gọi (ns), lặp qua inputs `repeat` lần"""
+    clock = time.perf_counter_ns
+    latencies = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = clock()
+            func(item)
+            latencies.append(clock() - start)
+    return latencies
+
+
+def measure_throughput(func: Callable, inputs: Sequence, repeat: int, units: int = 1) -> float:
+    """Số chẩn đoán/giây trong vòng lặp không đo từng lần"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in inputs:
+            func(item)
+    elapsed = time.perf_counter() - start
+    return len(inputs) * repeat * units / elapsed if elapsed > 0 else 0.0
+
+
+def measure_allocations(func: Callable, inputs: Sequence, sample: int):
+    """Bộ nhớ cấp phát đỉnh và phần còn giữ lại của mỗi lần gọi (byte)"""
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for item in inputs[:sample]:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            func(item)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+    return peaks, retained
+
+
+# ============================================================================
+# ENGINES
+# ============================================================================
+
+@dataclass
+class EngineCase:
+    """Một engine cần đo: hàm chẩn đoán và workload (theo bộ tên field) nó dùng"""
+    name: str
+    workload: str
+    run: Callable[[Dict], object]
+    batch: bool = False  # run nhận list records (diagnose_batch)
+
+
+def build_engine_cases() -> Tuple[Dict[str, EngineCase], Dict[str, tuple]]:
+    """
+    Dựng các engines và bộ sinh workload tương ứng
+
+    Returns:
+        (engine cases theo tên, {tên workload: (vocabulary, hàm gán nhãn)})
+    """
+    diagnosis = SimpleInferenceEngine(os.path.join(DATA_DIR, 'diagnosis_rules.json'))
+    sequential = SimpleInferenceEngine(os.path.join(DATA_DIR, 'classification_level_rules.json'))
+    severity = SimpleInferenceEngine(os.path.join(DATA_DIR, 'classification_level_rules.json'),
+                                     evaluation_mode='severity')
+    tree = SimpleInferenceEngine(os.path.join(DATA_DIR, 'classification_level_rules.json'),
+                                 evaluation_mode='tree')
+    bitset = SimpleInferenceEngine(os.path.join(DATA_DIR, 'classification_level_rules.json'),
+                                   evaluation_mode='bitset')
+    # Cùng engine nhưng bật metrics: đo chi phí của bộ đếm theo rule + histogram
+    severity_metrics = SimpleInferenceEngine(
+        os.path.join(DATA_DIR, 'classification_level_rules.json'),
+        evaluation_mode='severity', metrics=MetricsRegistry()
+    )
+    kb = KnowledgeBase()
+    inference = InferenceEngine(kb)
+    inference_rete = InferenceEngine(kb, matcher='rete', trace_level='off')
+    pure = DiagnosisEngine()
+
+    cases = [
+        EngineCase('simple_diagnosis', 'diagnosis', diagnosis.diagnose),
+        EngineCase('simple_sequential', 'classification', sequential.diagnose),
+        EngineCase('simple_severity', 'classification', severity.diagnose),
+        EngineCase('simple_tree', 'classification', tree.diagnose),
+        EngineCase('simple_bitset', 'classification', bitset.diagnose),
+        EngineCase('simple_severity_metrics', 'classification', severity_metrics.diagnose),
+        EngineCase('simple_batch', 'classification', severity.diagnose_batch, batch=True),
+        EngineCase('inference_engine', 'knowledge_base', inference.run_from_dict),
+        EngineCase('inference_engine_rete', 'knowledge_base', inference_rete.run_from_dict),
+        EngineCase('pure_python', 'pure_python', pure.diagnose),
+    ]
+    vocabularies = {
+        'diagnosis': (simple_vocabulary(diagnosis, 'diagnosis'),
+                      lambda record: simple_label(diagnosis.diagnose(record))),
+        'classification': (simple_vocabulary(severity, 'classification'),
+                           lambda record: simple_label(severity.diagnose(record))),
+        'knowledge_base': (knowledge_base_vocabulary(kb),
+                           lambda record: degree_label(inference_rete.run_from_dict(record))),
+        'pure_python': (pure_python_vocabulary(pure),
+                        lambda record: degree_label(pure.diagnose(record))),
+    }
+    return {case.name: case for case in cases}, vocabularies
+
+
+def bench_engine(case: EngineCase, workload: Workload, repeat: int, alloc_sample: int) -> Dict:
+    """Đo một engine trên workload của nó, kèm tách theo mật độ và độ bệnh"""
+    records = workload.records
+    if case.batch:
+        inputs = [records[i:i + BATCH_SIZE] for i in range(0, len(records), BATCH_SIZE)]
+        units = len(records) / len(inputs)  # Số chẩn đoán trung bình mỗi batch
+    else:
+        inputs = records
+        units = 1
+
+    for item in inputs:  # Warm-up (dựng index, vector predicates...)
+        case.run(item)
+
+    gc.collect()
+    throughput = measure_throughput(case.run, inputs, repeat, units)
+    gc.collect()
+    latencies = time_calls(case.run, inputs, repeat)
+    gc.collect()
+    peaks, retained = measure_allocations(case.run, inputs, alloc_sample)
+
+    result = {
+        'workload': workload.vocabulary,
+        'latency_unit': f'batch_{BATCH_SIZE}' if case.batch else 'record',
+        'overall': summarize(latencies, units, throughput, peaks, retained),
+    }
+    if case.batch:
+        return result
+
+    # Tách theo mật độ / độ bệnh (latency lặp `repeat` lần theo cùng thứ tự records)
+    for key, tags in (('by_density', workload.densities), ('by_label', workload.labels)):
+        groups: Dict[str, List[int]] = {}
+        for i, latency in enumerate(latencies):
+            groups.setdefault(tags[i % len(records)], []).append(latency)
+        result[key] = {tag: summarize(values) for tag, values in sorted(groups.items())}
+    return result
+
+
+# ============================================================================
+# HTTP
+# ============================================================================
+
+def http_routes(workloads: Dict[str, Workload]):
+    """(tên, method, path, hàm tạo kwargs cho test client theo số thứ tự request)"""
+    diagnosis = workloads['diagnosis'].records
+    classification = workloads['classification'].records
+
+    def batch(i):
+        start = (i * BATCH_SIZE) % max(len(classification) - BATCH_SIZE, 1)
+        return classification[start:start + BATCH_SIZE]
+
+    levels = ('1', '2a', '2b', '3', '4')
+    return [
+        ('index', 'get', '/', lambda i: {}),
+        ('diagnose', 'post', '/api/diagnose', lambda i: {'json': diagnosis[i % len(diagnosis)]}),
+        ('classify', 'post', '/api/classify',
+         lambda i: {'json': classification[i % len(classification)]}),
+        ('classify_batch', 'post', '/api/classify/batch', lambda i: {'json': batch(i)}),
+        ('grade_stream', 'post', '/api/grade/stream', lambda i: {
+            'data': ''.join(json.dumps(record) + '\n' for record in batch(i)),
+            'content_type': 'application/x-ndjson',
+        }),
+        ('diagnosis_questions', 'get', '/api/diagnosis-questions', lambda i: {}),
+        ('treatment', 'post', '/api/treatment',
+         lambda i: {'json': {'disease_level': levels[i % len(levels)]}}),
+        ('stats', 'get', '/api/stats', lambda i: {}),
+        ('healthz', 'get', '/healthz', lambda i: {}),
+        ('readyz', 'get', '/readyz', lambda i: {}),
+    ]
+
+
+def bench_http(workloads: Dict[str, Workload], requests: int) -> Dict:
+    """Đo từng route của app.py qua Flask test client (cache kết quả tắt)"""
+    with contextlib.redirect_stdout(sys.stderr):
+        import app as app_module
+        from engine_registry import EngineRegistry
+        flask_app = app_module.create_app(EngineRegistry(DATA_DIR), warm_up=False)
+    client = flask_app.test_client()
+
+    results = {}
+    for name, method, path, make_kwargs in http_routes(workloads):
+        call = getattr(client, method)
+        for i in range(min(requests, 20)):  # Warm-up
+            call(path, **make_kwargs(i)).get_data()
+
+        kwargs = [make_kwargs(i) for i in range(requests)]
+        errors = 0
+        latencies = []
+        start = time.perf_counter()
+        for item in kwargs:
+            t0 = time.perf_counter_ns()
+            response = call(path, **item)
+            response.get_data()  # Route streaming chỉ chạy khi đọc body
+            latencies.append(time.perf_counter_ns() - t0)
+            errors += response.status_code >= 400
+        elapsed = time.perf_counter() - start
+
+        stats = summarize(latencies, throughput=requests / elapsed if elapsed > 0 else 0.0)
+        stats['errors'] = errors
+        results[f'{method.upper()} {path}'] = stats
+    return results
+
+
+# ============================================================================
+# SO SÁNH / IN KẾT QUẢ
+# ============================================================================
+
+def _ratio(new: Optional[float], old: Optional[float]) -> str:
+    if not new or not old:
+        return '   -  '
+    return f'{new / old:6.2f}x'
+
+
+def print_report(report: Dict, baseline: Optional[Dict] = None):
+    """In bảng kết quả; có baseline thì kèm tỉ lệ mới/cũ (throughput cao hơn là tốt)"""
+    def rows(section: str):
+        for name, entry in report.get(section, {}).items():
+            stats = entry.get('overall', entry)
+            old = (baseline or {}).get(section, {}).get(name)
+            old = old.get('overall', old) if old else None
+            yield name, stats, old
+
+    for section, title in (('engines', 'ENGINES'), ('http', 'HTTP (Flask test client)')):
+        if not report.get(section):
+            continue
+        print(f"\n{title}")
+        header = f"{'':34} {'ops/s':>11} {'p50 µs':>9} {'p99 µs':>9} {'KiB/op':>8}"
+        if baseline:
+            header += f" {'ops/s':>8} {'p50':>8} {'p99':>8}"
+        print(header)
+        for name, stats, old in rows(section):
+            alloc = stats.get('alloc_kib_mean')
+            line = (f"{name:34} {stats['throughput_per_s'] or 0:11,.0f} {stats['p50_us']:9.1f} "
+                    f"{stats['p99_us']:9.1f} {'-' if alloc is None else f'{alloc:.1f}':>8}")
+            if baseline:
+                line += (f" {_ratio(stats['throughput_per_s'], old and old['throughput_per_s'])}"
+                         f" {_ratio(stats['p50_us'], old and old['p50_us'])}"
+                         f" {_ratio(stats['p99_us'], old and old['p99_us'])}")
+            print(line)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark các engine chẩn đoán và route HTTP')
+    parser.add_argument('--seed', type=int, default=20240101)
+    parser.add_argument('--per-bucket', type=int, default=40,
+                        help='Số bệnh nhân mỗi ô (mật độ, độ bệnh) của workload')
+    parser.add_argument('--repeat', type=int, default=5, help='Số lượt chạy qua workload')
+    parser.add_argument('--alloc-sample', type=int, default=200,
+                        help='Số lần gọi đo bộ nhớ cấp phát (tracemalloc)')
+    parser.add_argument('--engines', nargs='*', help='Chỉ đo các engine này (mặc định: tất cả)')
+    parser.add_argument('--http-requests', type=int, default=300, help='Số request mỗi route (0: bỏ qua HTTP)')
+    parser.add_argument('--quick', action='store_true', help='Workload và số lượt nhỏ (kiểm tra nhanh)')
+    parser.add_argument('-o', '--output', help='File JSON kết quả (mặc định benchmarks/results/bench-<thời gian>.json)')
+    parser.add_argument('--compare', help='File JSON của lần chạy trước để so sánh')
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.per_bucket, args.repeat, args.alloc_sample = 10, 2, 50
+        args.http_requests = min(args.http_requests, 50)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        cases, vocabularies = build_engine_cases()
+    selected = args.engines or list(cases)
+    unknown = set(selected) - set(cases)
+    if unknown:
+        parser.error(f"Engine không tồn tại: {', '.join(sorted(unknown))} (có: {', '.join(cases)})")
+
+    workloads = {
+        name: generate_workload(vocabulary, label_of, args.per_bucket, args.seed)
+        for name, (vocabulary, label_of) in vocabularies.items()
+    }
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': args.seed,
+            'per_bucket': args.per_bucket,
+            'repeat': args.repeat,
+            'alloc_sample': args.alloc_sample,
+            'http_requests': args.http_requests,
+        },
+        'workloads': {
+            name: {'size': len(workload), 'counts': workload.counts()}
+            for name, workload in workloads.items()
+        },
+        'engines': {},
+        'http': {},
+    }
+
+    for name in selected:
+        case = cases[name]
+        print(f"… {name}", file=sys.stderr, flush=True)
+        report['engines'][name] = bench_engine(case, workloads[case.workload],
+                                               args.repeat, args.alloc_sample)
+
+    if args.http_requests > 0:
+        print("… http", file=sys.stderr, flush=True)
+        report['http'] = bench_http(workloads, args.http_requests)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f"\n✓ Kết quả: {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+Workloads - Sinh bệnh nhân giả lập (có seed) cho benchmark
+
+Mỗi engine dùng bộ tên field riêng, nên workload được sinh từ chính rules của
+engine đó (RuleVocabulary):
+- Chọn một rule của độ đích, gán giá trị thỏa các điều kiện của nó
+- sparse: chỉ các fields của rule đó (+ 0-2 field ngẫu nhiên)
+- dense: thêm mọi field khác với giá trị "lành" (không thỏa điều kiện nào)
+- Nhãn là kết quả thật của engine (nhiễu có thể đẩy lên độ nặng hơn);
+  sinh tới khi mỗi ô (mật độ, nhãn) đủ số bệnh nhân
+"""
+
+import os
+import random
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+sys.path.insert(0, os.path.join(BASE_DIR, 'backend'))
+
+from knowledge_base import CONDITION_OPERATORS, KnowledgeBase
+from rule_compiler import iter_leaves
+
+DENSITIES = ('sparse', 'dense')
+
+# Nhãn khi engine không kết luận được
+NO_MATCH = 'none'
+
+
+@dataclass(frozen=True)
+class Leaf:
+    """Một điều kiện đơn: field, operator, ngưỡng"""
+    field: str
+    operator: str
+    value: Any
+
+    def test(self, value: Any) -> bool:
+        try:
+            return bool(CONDITION_OPERATORS[self.operator](value, self.value))
+        except (TypeError, ValueError):
+            return False
+
+    def candidates(self) -> List[Any]:
+        """Giá trị đáng thử: hai phía ngưỡng, thành viên của 'in', cả True/False"""
+        value = self.value
+        if isinstance(value, bool):
+            return [True, False]
+        if isinstance(value, (int, float)):
+            values = [value - 1, value, value + 1]
+            return [int(v) if float(v).is_integer() else v for v in values]
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return list(value) + ['other']
+        return [value, 'other']
+
+
+@dataclass
+class VocabularyRule:
+    rule_id: str
+    label: str
+    leaves: List[Leaf]
+
+
+@dataclass
+class RuleVocabulary:
+    """Các rules của một engine quy về dạng chung (nhãn + điều kiện đơn)"""
+    name: str
+    rules: List[VocabularyRule]
+    labels: Sequence[str]
+    candidates: Dict[str, List[Any]] = field(default_factory=dict)
+    benign: Dict[str, List[Any]] = field(default_factory=dict)
+
+    def __post_init__(self):
+        leaves_by_field: Dict[str, List[Leaf]] = {}
+        for rule in self.rules:
+            for leaf in rule.leaves:
+                leaves_by_field.setdefault(leaf.field, []).append(leaf)
+
+        for name, leaves in sorted(leaves_by_field.items()):
+            values = []
+            for leaf in leaves:
+                for value in leaf.candidates():
+                    if value not in values:
+                        values.append(value)
+            self.candidates[name] = values
+            # Giá trị "lành": không thỏa điều kiện nào của field
+            self.benign[name] = [
+                value for value in values if not any(leaf.test(value) for leaf in leaves)
+            ]
+
+    def satisfy(self, rule: VocabularyRule, rnd: random.Random) -> Dict:
+        """Gán giá trị cho các fields của rule, ưu tiên giá trị thỏa nhiều điều kiện nhất"""
+        record = {}
+        by_field: Dict[str, List[Leaf]] = {}
+        for leaf in rule.leaves:
+            by_field.setdefault(leaf.field, []).append(leaf)
+        for name, leaves in by_field.items():
+            scored = [(sum(leaf.test(value) for leaf in leaves), value)
+                      for value in self.candidates[name]]
+            best = max(score for score, _ in scored)
+            record[name] = rnd.choice([value for score, value in scored if score == best])
+        return record
+
+    def filler(self, name: str, rnd: random.Random) -> Any:
+        return rnd.choice(self.benign[name] or self.candidates[name])
+
+
+@dataclass
+class Workload:
+    """Danh sách bệnh nhân kèm nhãn và mật độ (cùng thứ tự)"""
+    vocabulary: str
+    records: List[Dict]
+    labels: List[str]
+    densities: List[str]
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        counts: Dict[str, Dict[str, int]] = {}
+        for label, density in zip(self.labels, self.densities):
+            bucket = counts.setdefault(density, {})
+            bucket[label] = bucket.get(label, 0) + 1
+        return counts
+
+
+def generate_workload(vocabulary: RuleVocabulary, label_of: Callable[[Dict], str],
+                      per_bucket: int = 50, seed: int = 0,
+                      max_attempts: Optional[int] = None) -> Workload:
+    """
+    Sinh workload phân tầng theo (mật độ, nhãn)
+
+    Args:
+        vocabulary: Rules của engine
+        label_of: Hàm chạy engine trên một record và trả về nhãn
+        per_bucket: Số bệnh nhân mỗi ô (mật độ, nhãn)
+        seed: Seed cho random (cùng seed → cùng workload)
+        max_attempts: Giới hạn số lần thử mỗi mật độ (ô không đủ thì giữ số đã có)
+    """
+    rnd = random.Random(seed)
+    fields = sorted(vocabulary.candidates)
+    targets = list(vocabulary.labels) + [NO_MATCH]
+    rules_by_label: Dict[str, List[VocabularyRule]] = {}
+    for rule in vocabulary.rules:
+        rules_by_label.setdefault(rule.label, []).append(rule)
+    max_attempts = max_attempts or per_bucket * len(targets) * 40
+
+    records, labels, densities = [], [], []
+    for density in DENSITIES:
+        filled = {label: 0 for label in targets}
+        for attempt in range(max_attempts):
+            if all(count >= per_bucket for count in filled.values()):
+                break
+            target = targets[attempt % len(targets)]
+            if filled[target] >= per_bucket:
+                continue
+
+            candidates = rules_by_label.get(target)
+            record = vocabulary.satisfy(rnd.choice(candidates), rnd) if candidates else {}
+            if density == 'dense':
+                for name in fields:
+                    if name not in record:
+                        record[name] = vocabulary.filler(name, rnd)
+            else:
+                for name in rnd.sample(fields, min(rnd.randint(0, 2), len(fields))):
+                    record.setdefault(name, vocabulary.filler(name, rnd))
+
+            label = label_of(record)
+            if filled.get(label, per_bucket) < per_bucket:
+                filled[label] += 1
+                records.append(record)
+                labels.append(label)
+                densities.append(density)
+
+    # Xáo trộn (có seed) để các nhãn xen kẽ như traffic thật
+    order = list(range(len(records)))
+    rnd.shuffle(order)
+    return Workload(
+        vocabulary.name,
+        [records[i] for i in order],
+        [labels[i] for i in order],
+        [densities[i] for i in order],
+    )
+
+
+# ============================================================================
+# VOCABULARY CỦA TỪNG ENGINE
+# ============================================================================
+
+DEGREE_LABELS = ('4', '3', '2b', '2a', '1')
+
+
+def simple_vocabulary(engine, name: str) -> RuleVocabulary:
+    """Rules JSON của SimpleInferenceEngine (phân độ hoặc chẩn đoán có/không TCM)"""
+    rules = []
+    for compiled in engine.compiled_rules:
+        conclusion = compiled.rule.get('conclusion', {})
+        label = conclusion.get('disease_level')
+        if label is None:
+            label = 'has_hfmd' if conclusion.get('has_hfmd') else NO_MATCH
+        leaves = [Leaf(leaf[1], leaf[2], leaf[3]) for leaf in iter_leaves(compiled.node)]
+        rules.append(VocabularyRule(compiled.rule.get('id', ''), label, leaves))
+    labels = sorted({rule.label for rule in rules} - {NO_MATCH},
+                    key=lambda label: DEGREE_LABELS.index(label) if label in DEGREE_LABELS else -1)
+    return RuleVocabulary(name, rules, labels)
+
+
+def simple_label(result: Dict) -> str:
+    conclusions = result.get('conclusions') or {}
+    if 'disease_level' in conclusions:
+        return conclusions['disease_level']
+    return 'has_hfmd' if conclusions.get('has_hfmd') is True else NO_MATCH
+
+
+def knowledge_base_vocabulary(kb: KnowledgeBase) -> RuleVocabulary:
+    """
+    Rules của KnowledgeBase (InferenceEngine)
+
+    Điều kiện trên fact suy diễn (vd. tachycardia_for_age) được thay bằng điều kiện
+    của một luật trung gian sinh ra fact đó, để workload đi qua cả bước suy diễn.
+    """
+    producers: Dict[Tuple[str, Any], List] = {}
+    for intermediate in kb.intermediate_rules:
+        for name, value in intermediate.derived_facts.items():
+            producers.setdefault((name, value), []).append(intermediate)
+
+    rnd = random.Random(0)
+
+    def expand(conditions, depth=0) -> List[Leaf]:
+        leaves = []
+        for condition in conditions:
+            sources = (producers.get((condition.field, condition.value))
+                       if condition.operator == '==' and depth < 3 else None)
+            if sources:
+                leaves.extend(expand(rnd.choice(sources).conditions, depth + 1))
+            else:
+                leaves.append(Leaf(condition.field, condition.operator, condition.value))
+        return leaves
+
+    rules = [VocabularyRule(rule.rule_id, rule.degree, expand(rule.conditions)) for rule in kb.rules]
+    return RuleVocabulary('knowledge_base', rules, DEGREE_LABELS)
+
+
+def degree_label(result: Dict) -> str:
+    """Nhãn từ kết quả InferenceEngine / DiagnosisEngine ('degree')"""
+    return result['degree'] if result.get('success') else NO_MATCH
+
+
+def _parse_pure_condition(name: str, condition: Any) -> Leaf:
+    """Điều kiện dạng '<92', '>=2', True, list... của diagnosis_pure_python"""
+    if isinstance(condition, bool):
+        return Leaf(name, '==', condition)
+    if isinstance(condition, str):
+        for op in ('>=', '<=', '>', '<', '='):
+            if condition.startswith(op):
+                try:
+                    return Leaf(name, '==' if op == '=' else op, float(condition[len(op):]))
+                except ValueError:
+                    break
+        return Leaf(name, '==', condition)
+    if isinstance(condition, (list, set)):
+        return Leaf(name, 'in', list(condition))
+    return Leaf(name, '==', condition)
+
+
+def pure_python_vocabulary(engine) -> RuleVocabulary:
+    """Rules của diagnosis_pure_python.DiagnosisEngine"""
+    rules = [
+        VocabularyRule(rule.rule_id, rule.degree,
+                       [_parse_pure_condition(name, condition)
+                        for name, condition in rule.conditions.items()])
+        for rule in engine.rules
+    ]
+    return RuleVocabulary('pure_python', rules, DEGREE_LABELS)
@@ -0,0 +1,52 @@
+"""
+Gunicorn config - Chạy HFMD Diagnosis System ở chế độ production
+
+    gunicorn -c gunicorn.conf.py
+
+preload_app: app (rules đã biên dịch, payload encode sẵn, warm-up) được dựng
+một lần trong process master; các worker fork ra dùng chung bộ nhớ đó
+(copy-on-write) và sẵn sàng ngay, không phải phục vụ request đầu tiên khi "nguội".
+
+Cấu hình qua biến môi trường:
+    HFMD_BIND     địa chỉ lắng nghe (mặc định 0.0.0.0:5000)
+    HFMD_WORKERS  số worker process (mặc định số CPU)
+    HFMD_THREADS  số thread mỗi worker (mặc định 4)
+    HFMD_WARMUP   0 để bỏ qua warm-up
+    HFMD_LATENCY  0 để tắt đo latency theo route (/api/admin/latency)
+
+`kill -USR1 <master pid>`: gunicorn mở lại file log và chuyển tín hiệu cho các
+worker; mỗi worker ghi p50/p90/p99 theo route ra HFMD_LATENCY_DUMP
+(mặc định <thư mục tạm>/hfmd-latency-<pid>.json).
+"""
+
+import gc
+import multiprocessing
+import os
+
+wsgi_app = 'app:app'
+bind = os.environ.get('HFMD_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('HFMD_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('HFMD_THREADS', 4))
+preload_app = True
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+
+
+def when_ready(server):
+    """App đã dựng và warm-up xong trong master, ngay trước khi fork workers"""
+    # Đưa các object đã dựng vào vùng permanent của GC: GC trong worker không
+    # chạm vào chúng, tránh ghi đè trang nhớ dùng chung sau fork
+    gc.freeze()
+    server.log.info("HFMD rules preloaded and warmed up; forking %s workers", server.num_workers)
+
+
+def post_worker_init(worker):
+    """Worker vừa cài signal handlers riêng: thêm dump latency vào SIGUSR1 (giữ việc mở lại log)"""
+    from request_latency import install_dump_signal
+
+    tracker = worker.wsgi.extensions.get('hfmd_latency')
+    if tracker is not None:
+        install_dump_signal(tracker)
@@ -0,0 +1,29 @@
+"""
+Cấu hình pytest: import các module backend phẳng như app.py / asgi.py
+"""
+
+import os
+import sys
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(BASE_DIR, 'backend')
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+
+for path in (BACKEND_DIR, BASE_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def snapshot_dir(tmp_path_factory):
+    """Snapshot rules của cả phiên test ghi vào thư mục tạm, không vào cache của user"""
+    directory = str(tmp_path_factory.mktemp('snapshots'))
+    previous = os.environ.get('HFMD_SNAPSHOT_DIR')
+    os.environ['HFMD_SNAPSHOT_DIR'] = directory
+    yield directory
+    if previous is None:
+        os.environ.pop('HFMD_SNAPSHOT_DIR', None)
+    else:
+        os.environ['HFMD_SNAPSHOT_DIR'] = previous
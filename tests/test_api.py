@@ -0,0 +1,171 @@
+"""
+Bản Flask (app.py) và bản ASGI (asgi.py) phải trả cùng status và cùng JSON
+cho các routes chung
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from conftest import DATA_DIR
+from engine_registry import EngineRegistry
+
+CASES = [
+    {'mouth_ulcer': True, 'age_months': 24, 'fever_status': 'high_fever'},
+    {'rash_hand_foot_mouth': True, 'age_months': 12, 'spo2': 91, 'startle_per_30min': 3},
+    {'mouth_ulcer': True, 'age_months': 30, 'hr_no_fever': 170, 'gcs': 9},
+    {'age_months': 80},
+    {'spo2': 'abc', 'mouth_ulcer': True},
+]
+
+
+class FlaskClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=b'', headers=None):
+        response = self.client.open(path, method=method, data=body, headers=headers or {})
+        response_headers = {name.lower(): value for name, value in response.headers.items()}
+        return response.status_code, response_headers, response.get_data()
+
+
+class ASGIClient:
+    """Gọi thẳng ASGI app (scope/receive/send), không cần HTTP server"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def request(self, method, path, body=b'', headers=None):
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http', 'method': method, 'path': path,
+            'query_string': query.encode('latin-1'),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                        for name, value in (headers or {}).items()],
+        }
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(self.app(scope, receive, send))
+        response_headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                            for name, value in sent[0]['headers']}
+        return sent[0]['status'], response_headers, b''.join(m.get('body', b'') for m in sent[1:])
+
+
+@pytest.fixture(scope='module')
+def clients():
+    import app
+    import asgi
+    registry = EngineRegistry(DATA_DIR)
+    return (FlaskClient(app.create_app(registry, warm_up=False, latency=False)),
+            ASGIClient(asgi.create_asgi_app(registry, warm_up=False)))
+
+
+def both(clients, method, path, body=None, headers=None, raw=b''):
+    """(status, headers, body) của hai app cho cùng một request (body: object JSON)"""
+    headers = dict(headers or {})
+    if body is not None:
+        raw = json.dumps(body).encode('utf-8')
+        headers['Content-Type'] = 'application/json'
+    return [client.request(method, path, raw, headers) for client in clients]
+
+
+def assert_same_json(results):
+    """Hai app trả cùng status và cùng JSON; trả về (status, JSON)"""
+    (flask_status, flask_headers, flask_body), (asgi_status, asgi_headers, asgi_body) = results
+    assert flask_status == asgi_status
+    assert flask_headers['content-type'] == asgi_headers['content-type'] == 'application/json'
+    assert json.loads(asgi_body) == json.loads(flask_body)
+    return flask_status, json.loads(flask_body)
+
+
+@pytest.mark.parametrize('path', ['/api/diagnose', '/api/classify'])
+def test_diagnose_and_classify(clients, path):
+    for case in CASES:
+        status, _ = assert_same_json(both(clients, 'POST', path, case))
+        assert status == 200
+
+    assert assert_same_json(both(clients, 'POST', path, {}))[0] == 400
+    assert assert_same_json(both(clients, 'POST', path, raw=b'x',
+                                 headers={'Content-Type': 'application/json'}))[0] == 500
+    assert assert_same_json(both(clients, 'POST', path, raw=b'{}'))[0] == 500  # Không có Content-Type
+
+
+def test_classify_batch(clients):
+    status, data = assert_same_json(both(clients, 'POST', '/api/classify/batch', CASES))
+    assert status == 200 and data['total'] == len(CASES)
+    status, data = assert_same_json(both(clients, 'POST', '/api/classify/batch', {'records': CASES}))
+    assert status == 200 and data['total'] == len(CASES)
+
+    for bad in ([], {'records': 3}, [1, 2]):
+        assert assert_same_json(both(clients, 'POST', '/api/classify/batch', bad))[0] == 400
+
+
+def test_treatment(clients):
+    for level in ('1', '2a', '2b', '3', '4'):
+        status, _ = assert_same_json(both(clients, 'POST', '/api/treatment', {'disease_level': level}))
+        assert status == 200
+    for body, expected in (({'disease_level': '9'}, 404), ({'disease_level': ''}, 400), ({}, 400)):
+        assert assert_same_json(both(clients, 'POST', '/api/treatment', body))[0] == expected
+
+
+def test_precomputed_payloads(clients):
+    """JSON encode sẵn: cùng ETag, cùng bản gzip, cùng 304"""
+    for method, path, body in (('GET', '/api/diagnosis-questions', None),
+                               ('POST', '/api/treatment', {'disease_level': '2a'})):
+        for headers in ({}, {'Accept-Encoding': 'gzip'}):
+            results = [
+                (status, response_headers.get('etag'), response_headers.get('content-encoding'), data)
+                for status, response_headers, data in both(clients, method, path, body, headers)
+            ]
+            assert results[0] == results[1]
+
+            headers = dict(headers, **{'If-None-Match': results[0][1]})
+            assert [status for status, _, _ in both(clients, method, path, body, headers)] == [304, 304]
+
+
+def test_stats_health_and_metrics(clients):
+    stats = []
+    for status, _, data in both(clients, 'GET', '/api/stats'):
+        assert status == 200
+        engines = json.loads(data)['stats']
+        for engine_stats in engines.values():
+            engine_stats.pop('cache')  # Bộ đếm thay đổi theo từng request
+        stats.append(engines)
+    assert stats[0] == stats[1]
+
+    ready = []
+    for status, headers, data in both(clients, 'GET', '/readyz'):
+        assert status == 200 and headers['content-type'] == 'application/json'
+        health = json.loads(data)
+        health.pop('uptime_s')  # Đổi giữa hai request
+        ready.append(health)
+    assert ready[0] == ready[1] and ready[0]['ready']
+
+    flask_health, asgi_health = [json.loads(data) for _, _, data in both(clients, 'GET', '/healthz')]
+    assert flask_health.keys() == asgi_health.keys()
+    assert flask_health['pid'] == asgi_health['pid']
+
+    assert assert_same_json(both(clients, 'GET', '/api/metrics'))[0] == 404  # Metrics tắt
+
+
+def test_grade_stream(clients):
+    rows = b''.join(json.dumps(dict(case, case_id=i)).encode('utf-8') + b'\n'
+                    for i, case in enumerate(CASES))
+    (flask_status, flask_headers, flask_body), (asgi_status, asgi_headers, asgi_body) = \
+        both(clients, 'POST', '/api/grade/stream?id_field=case_id', raw=rows)
+    assert flask_status == asgi_status == 200
+    assert flask_headers['content-type'] == asgi_headers['content-type']
+    assert flask_body == asgi_body
+    assert len(flask_body.splitlines()) == len(CASES)
+
+
+def test_unknown_method(clients):
+    assert [status for status, _, _ in both(clients, 'GET', '/api/diagnose')] == [405, 405]
@@ -0,0 +1,44 @@
+"""
+Chấm hàng loạt: một record lỗi không làm hỏng cả chunk, kết quả giống /api/grade/stream
+"""
+
+import json
+
+from bulk_grading import Grader, grade_record, grade_stream, parse_json_line
+from conftest import DATA_DIR
+from ndjson_stream import grade_row
+
+LINES = [
+    '{"case_id": "a", "mouth_ulcer": true, "age_months": 24}',
+    '{"case_id": "b", "mouth_ulcer": true, "age_months": 24, "spo2": 1' + '0' * 400 + '}',
+    '{"case_id": "c", "rash_hand_foot_mouth": true, "age_months": 12, "spo2": 91}',
+    'not json',
+    '{"case_id": "d", "age_months": 80}',
+]
+
+
+def test_bad_record_among_good_ones():
+    rows = [parse_json_line(line_no, line) for line_no, line in enumerate(LINES, 1)]
+    chunks = list(grade_stream(iter(rows), DATA_DIR, id_field='case_id', chunk_size=len(rows)))
+    assert len(chunks) == 1
+    output, size, positives = chunks[0]
+    assert size == len(LINES)
+    assert positives == 2
+
+    results = [json.loads(line) for line in output]
+    assert [result['line'] for result in results] == [1, 2, 3, 4, 5]
+    assert [result['id'] for result in results] == ['a', 'b', 'c', None, 'd']
+    assert 'error' in results[1] and 'error' in results[3]
+    assert all('error' not in results[i] for i in (0, 2, 4))
+
+    # Cùng định dạng và cùng kết quả với NDJSON endpoint (chấm từng record)
+    grader = Grader(DATA_DIR, id_field='case_id')
+    grade = lambda record: grade_record(grader.diagnosis_engine, grader.classification_engine, record)
+    assert output == [grade_row(grade, row, 'case_id') for row in rows]
+
+
+def test_good_chunk_uses_batch_results():
+    rows = [parse_json_line(line_no, line) for line_no, line in enumerate(LINES, 1)]
+    rows = [row for row in rows if row[0] in (1, 3, 5)]
+    output, _ = Grader(DATA_DIR, summary=True).grade_chunk(rows)
+    assert [json.loads(line)['has_hfmd'] for line in output] == [True, True, False]
@@ -0,0 +1,103 @@
+"""
+Matcher 'rete' phải cho kết quả giống matcher 'naive' của InferenceEngine
+"""
+
+import random
+
+import pytest
+
+from inference_engine import InferenceEngine
+from knowledge_base import KnowledgeBase, PatientData
+
+STRATEGIES = ('priority', 'severity', 'recency')
+
+# Giá trị quanh các ngưỡng trong knowledge base
+NUMERIC_VALUES = (0, 1, 2, 3, 3.5, 9, 10, 12, 24, 38, 39, 69, 70, 79, 80, 91, 92, 94, 130, 131, 150, 151)
+# Giá trị khác kiểu (str/bool/list/None so với ngưỡng số)
+MIXED_VALUES = (True, False, 'abc', '12', [1], None, 0, 12, 91.5, 150, 3, 'P', 'U')
+
+
+@pytest.fixture(scope='module')
+def kb():
+    return KnowledgeBase()
+
+
+def _fields(kb):
+    fields = {}
+    for rule in list(kb.rules) + list(kb.intermediate_rules):
+        for condition in rule.conditions:
+            fields.setdefault(condition.field, set()).add(condition.operator)
+    return fields
+
+
+def typed_cases(kb, count=600, seed=7):
+    """Bệnh nhân có giá trị đúng kiểu cho từng field"""
+    fields = _fields(kb)
+    names = sorted(fields)
+    rnd = random.Random(seed)
+    cases = [{}, {'spo2': 88.0, 'rash_hf': True}, {'rash_hf': True, 'oral_ulcer': True}]
+    for _ in range(count):
+        case = {}
+        for field in rnd.sample(names, rnd.choice((1, 2, 4, 6, 9, 14))):
+            operators = fields[field]
+            if 'in' in operators:
+                case[field] = rnd.choice(('A', 'V', 'P', 'U'))
+            elif operators <= {'=='}:
+                case[field] = rnd.choice((True, False, True))
+            else:
+                case[field] = rnd.choice(NUMERIC_VALUES)
+        cases.append(case)
+    return cases
+
+
+def normalize(result):
+    """Kết quả so sánh được: facts thành dict, trace thành (code, rule, args)"""
+    result = dict(result)
+    trace = result.pop('inference_trace', None)
+    if trace is not None:
+        result['trace'] = [event[1:] for event in trace.events]
+    for key in ('derived_facts', 'input_facts', 'all_facts'):
+        if key in result:
+            result[key] = dict(result[key])
+    return result
+
+
+def run(engine, method, case):
+    arg = dict(case) if method == 'run_from_dict' else PatientData.from_dict(dict(case))
+    return normalize(getattr(engine, method)(arg))
+
+
+@pytest.mark.parametrize('strategy', STRATEGIES)
+def test_rete_matches_naive(kb, strategy):
+    naive = InferenceEngine(kb)
+    rete = InferenceEngine(kb, matcher='rete')
+    for engine in (naive, rete):
+        engine.set_conflict_resolution(strategy)
+
+    for case in typed_cases(kb):
+        for method in ('run_from_dict', 'run'):
+            assert run(rete, method, case) == run(naive, method, case), (method, case)
+
+
+def test_rete_mixed_types_never_raise(kb):
+    """
+    Giá trị khác kiểu: naive chỉ raise khi đã đánh giá tới điều kiện lỗi; rete đánh
+    giá mọi alpha node của field nhưng coi lỗi là không thỏa, nên không bao giờ raise
+    và cho kết quả như naive ở mọi trường hợp naive chạy được
+    """
+    naive = InferenceEngine(kb, trace_level='off')
+    rete = InferenceEngine(kb, matcher='rete', trace_level='off')
+    names = sorted(_fields(kb))
+    rnd = random.Random(5)
+
+    compared = 0
+    for _ in range(3000):
+        case = {field: rnd.choice(MIXED_VALUES) for field in rnd.sample(names, rnd.randint(1, 10))}
+        rete_result = run(rete, 'run_from_dict', case)
+        try:
+            naive_result = run(naive, 'run_from_dict', case)
+        except TypeError:
+            continue
+        assert rete_result == naive_result, case
+        compared += 1
+    assert compared > 1000
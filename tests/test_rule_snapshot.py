@@ -0,0 +1,94 @@
+"""
+Snapshot nhị phân của tập luật: nạp lại khi còn mới, dựng lại khi file rules thay đổi
+"""
+
+import json
+import os
+import shutil
+
+import pytest
+
+import rule_snapshot
+from conftest import BASE_DIR, DATA_DIR
+from simple_inference import SimpleInferenceEngine
+
+
+@pytest.fixture
+def rules_file(tmp_path, monkeypatch):
+    monkeypatch.setenv('HFMD_SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+    path = tmp_path / 'classification_level_rules.json'
+    shutil.copy(os.path.join(DATA_DIR, path.name), path)
+    return str(path)
+
+
+def count_builds(monkeypatch):
+    builds = []
+    build_rule_set = rule_snapshot.build_rule_set
+
+    def counting_build(raw):
+        builds.append(raw)
+        return build_rule_set(raw)
+
+    monkeypatch.setattr(rule_snapshot, 'build_rule_set', counting_build)
+    return builds
+
+
+def test_snapshot_outside_source_tree(rules_file, tmp_path, monkeypatch):
+    assert rule_snapshot.snapshot_path(rules_file).startswith(str(tmp_path / 'snapshots'))
+
+    # Không đặt HFMD_SNAPSHOT_DIR: thư mục cache của user
+    monkeypatch.delenv('HFMD_SNAPSHOT_DIR')
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    path = rule_snapshot.snapshot_path(os.path.join(DATA_DIR, 'diagnosis_rules.json'))
+    assert path.startswith(str(tmp_path / 'cache' / 'hfmd' / 'snapshots'))
+    assert not path.startswith(BASE_DIR)
+
+
+def test_snapshot_reused_until_rules_change(rules_file, monkeypatch):
+    builds = count_builds(monkeypatch)
+
+    first = rule_snapshot.load_rule_set(rules_file)
+    assert os.path.exists(rule_snapshot.snapshot_path(rules_file))
+    assert rule_snapshot.load_rule_set(rules_file) == first
+    assert len(builds) == 1
+
+    # Sửa file rules: bỏ rule cuối → snapshot cũ không khớp digest, phải dựng lại
+    with open(rules_file, encoding='utf-8') as f:
+        data = json.load(f)
+    removed = data['conclusion_rules'].pop()
+    with open(rules_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+    changed = rule_snapshot.load_rule_set(rules_file)
+    assert len(builds) == 2
+    assert len(changed['rules']) == len(first['rules']) - 1
+    assert removed['id'] not in [rule['id'] for rule in changed['rules']]
+    assert rule_snapshot.load_rule_set(rules_file) == changed
+    assert len(builds) == 2
+
+
+def test_corrupt_snapshot_rebuilt(rules_file, monkeypatch):
+    builds = count_builds(monkeypatch)
+    expected = rule_snapshot.load_rule_set(rules_file)
+    with open(rule_snapshot.snapshot_path(rules_file), 'r+b') as f:
+        f.truncate(20)
+
+    assert rule_snapshot.load_rule_set(rules_file) == expected
+    assert len(builds) == 2
+
+
+def test_engine_sees_changed_rules(rules_file):
+    """Engine dựng lại từ snapshot cho kết quả như khi parse JSON trực tiếp"""
+    case = {'mouth_ulcer': True}
+    assert SimpleInferenceEngine(rules_file).diagnose(case) == \
+        SimpleInferenceEngine(rules_file, use_snapshot=False).diagnose(case)
+
+    with open(rules_file, encoding='utf-8') as f:
+        data = json.load(f)
+    data['conclusion_rules'] = [rule for rule in data['conclusion_rules'] if rule['id'] != 'R1-1']
+    with open(rules_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+    engine = SimpleInferenceEngine(rules_file)
+    assert 'R1-1' not in [rule['id'] for rule in engine.rules]
+    assert engine.diagnose(case) == SimpleInferenceEngine(rules_file, use_snapshot=False).diagnose(case)
@@ -0,0 +1,97 @@
+"""
+Các evaluation_mode, diagnose_batch và result cache của SimpleInferenceEngine phải
+cho kết quả giống chế độ 'sequential' (đánh giá lần lượt từng rule) trên cả hai tập luật
+"""
+
+import json
+import os
+import random
+
+import pytest
+
+from conftest import DATA_DIR
+from simple_inference import SimpleInferenceEngine
+
+RULE_FILES = ('diagnosis_rules.json', 'classification_level_rules.json')
+FAST_MODES = ('severity', 'tree', 'bitset')
+
+# Giá trị quanh các ngưỡng trong rules, kèm giá trị khác kiểu / thiếu
+VALUES = (
+    True, False, None, 0, 1, 1.0, '1', 'abc', '39.5', 2, 3, 0.5, 9, 10, 11, 12, 16, 17,
+    23, 24, 25, 26, 39, 39.1, 40, 41, 50, 51, 59, 60, 88, 92, 93.9, 94, 100, 110, 115,
+    130, 131, 150, 151, 161, 170, 171, 400, 401, [1], float('nan'),
+    'mild_fever', 'high_fever', 'no_fever', 'A', 'V', 'P', 'U',
+)
+
+
+def rule_fields(rules_file):
+    fields = set()
+
+    def walk(condition):
+        if 'type' in condition:
+            for sub in condition.get('conditions', []):
+                walk(sub)
+        else:
+            fields.add(condition['field'])
+
+    with open(rules_file, encoding='utf-8') as f:
+        for rule in json.load(f)['conclusion_rules']:
+            for condition in rule['conditions']:
+                walk(condition)
+    return sorted(fields)
+
+
+def make_cases(rules_file, count=2000, seed=1234):
+    """Bệnh nhân ngẫu nhiên trên các field của tập luật (kèm field lạ)"""
+    fields = rule_fields(rules_file) + ['extra_a', 'extra_b']
+    rnd = random.Random(seed)
+    cases = [{}, {'mouth_ulcer': True}, {'rash_hand_foot_mouth': True}, {'spo2': 88}]
+    for _ in range(count):
+        chosen = rnd.sample(fields, min(rnd.choice((1, 2, 3, 5, 8, 12, 20)), len(fields)))
+        cases.append({field: rnd.choice(VALUES) for field in chosen})
+    return cases
+
+
+def dump(result):
+    """So sánh qua JSON: NaN trong input_facts không bằng chính nó khi so dict"""
+    return json.dumps(result, sort_keys=True, ensure_ascii=False, default=repr)
+
+
+@pytest.fixture(scope='module', params=RULE_FILES)
+def rule_set(request):
+    """(file rules, bệnh nhân, kết quả của chế độ 'sequential')"""
+    rules_file = os.path.join(DATA_DIR, request.param)
+    cases = make_cases(rules_file)
+    engine = SimpleInferenceEngine(rules_file)
+    assert engine.rules
+    return rules_file, cases, [dump(engine.diagnose(dict(case))) for case in cases]
+
+
+@pytest.mark.parametrize('mode', FAST_MODES)
+def test_mode_matches_sequential(rule_set, mode):
+    rules_file, cases, expected = rule_set
+    engine = SimpleInferenceEngine(rules_file, evaluation_mode=mode)
+    assert [dump(engine.diagnose(dict(case))) for case in cases] == expected
+
+
+def test_tree_fallback_matches_sequential(rule_set):
+    """Sơ đồ quyết định vượt giới hạn nút: chế độ 'tree' đánh giá theo 'severity'"""
+    rules_file, cases, expected = rule_set
+    engine = SimpleInferenceEngine(rules_file, evaluation_mode='tree', max_tree_nodes=1)
+    assert [dump(engine.diagnose(dict(case))) for case in cases] == expected
+
+
+@pytest.mark.parametrize('mode', ('sequential',) + FAST_MODES)
+def test_batch_matches_sequential(rule_set, mode):
+    rules_file, cases, expected = rule_set
+    engine = SimpleInferenceEngine(rules_file, evaluation_mode=mode)
+    results = engine.diagnose_batch([dict(case) for case in cases])
+    assert [dump(result) for result in results] == expected
+
+
+def test_cached_matches_sequential(rule_set):
+    rules_file, cases, expected = rule_set
+    engine = SimpleInferenceEngine(rules_file, evaluation_mode='severity', cache_size=256)
+    for _ in range(2):  # Lần 2: phần lớn kết quả lấy từ cache
+        assert [dump(engine.diagnose(dict(case))) for case in cases] == expected
+    assert engine.get_cache_stats()['hits'] > 0
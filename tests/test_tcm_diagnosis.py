@@ -0,0 +1,33 @@
+"""
+TCMDiagnosisSystem giữ knowledge base riêng, thêm rules được;
+quick_diagnose dùng knowledge base dùng chung (đã freeze)
+"""
+
+import pytest
+
+from knowledge_base import Condition, Rule
+from shared_engine import get_shared_knowledge_base
+from tcm_diagnosis import TCMDiagnosisSystem, quick_diagnose
+
+CASE = {'age_months': 30, 'mouth_ulcer': True, 'test_marker': 7}
+
+
+def test_system_knowledge_base_is_mutable():
+    system = TCMDiagnosisSystem(show_banner=False)
+    assert system.kb is not get_shared_knowledge_base()
+
+    system.kb.add_rule(Rule('TEST-1', '4', 1000, [Condition('test_marker', '==', 7)],
+                            description='Rule thêm khi chạy'))
+    result = system.diagnose_from_dict(dict(CASE))
+    assert result['primary_rule']['rule_id'] == 'TEST-1'
+    assert result['degree'] == '4'
+
+    # KB dùng chung và quick_diagnose không bị ảnh hưởng
+    assert 'TEST-1' not in [rule.rule_id for rule in get_shared_knowledge_base().rules]
+    shared_result = quick_diagnose(dict(CASE), print_result=False)
+    assert 'TEST-1' not in [rule['rule_id'] for rule in shared_result['all_matched_rules']]
+
+
+def test_shared_knowledge_base_is_frozen():
+    with pytest.raises(TypeError):
+        get_shared_knowledge_base().add_rule(Rule('TEST-2', '1', 0, [Condition('x', '==', 1)]))